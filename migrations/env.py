@@ -1,3 +1,4 @@
+import os
 from logging.config import fileConfig
 
 from sqlalchemy import engine_from_config
@@ -7,6 +8,7 @@ from alembic import context
 
 # Adjust the import path to match the location of your models.py file
 from veterinary.models import Base
+from veterinary.db import DATABASE_URL
 
 # Alembic Config object provides access to values within the .ini file
 config = context.config
@@ -15,9 +17,25 @@ config = context.config
 if config.config_file_name is not None:
     fileConfig(config.config_file_name)
 
+# Let VETERINARY_DATABASE_URL or VETERINARY_CLINIC point migrations at the
+# same database as the CLI
+if os.environ.get("VETERINARY_DATABASE_URL") or os.environ.get("VETERINARY_CLINIC"):
+    config.set_main_option("sqlalchemy.url", DATABASE_URL)
+
 # Add your model's MetaData object here for 'autogenerate' support
 target_metadata = Base.metadata
 
+# Tables managed outside the models (the FTS5 search tables and their shadow
+# tables, the daily summary tables, the change log and sync state, and the
+# yearly archive tables made by `archive`) are left alone by autogenerate.
+UNMANAGED_TABLE_PREFIXES = ("search_index", "search_trigrams", "appointment_daily_stats", "prescription_daily_stats",
+                            "change_log", "sync_state")
+
+def include_name(name, type_, parent_names):
+    if type_ == "table":
+        return not name.startswith(UNMANAGED_TABLE_PREFIXES) and "_archive_" not in name
+    return True
+
 def run_migrations_offline() -> None:
     """Run migrations in 'offline' mode.
 
@@ -30,6 +48,7 @@ def run_migrations_offline() -> None:
         target_metadata=target_metadata,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
+        include_name=include_name,
     )
 
     with context.begin_transaction():
@@ -48,7 +67,8 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection, target_metadata=target_metadata,
+            include_name=include_name,
         )
 
         with context.begin_transaction():
@@ -0,0 +1,123 @@
+"""Add reminder jobs
+
+Revision ID: 0358d17822b7
+Revises: 83a0a5824bce
+Create Date: 2026-10-18 11:54:56.119422
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0358d17822b7'
+down_revision: Union[str, None] = '83a0a5824bce'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# The triggers and backfill are written out as they stood at this revision
+# rather than taken from veterinary.reminders, so later changes there don't
+# change this migration. Records older than 26 days have no jobs left to
+# come, so the backfill skips them.
+TRIGGERS = [
+    "CREATE TRIGGER IF NOT EXISTS appointments_reminders_insert AFTER INSERT ON appointments BEGIN "
+    "INSERT OR IGNORE INTO reminder_jobs (kind, due_at, status, attempts, appointment_id) "
+    "SELECT 'appointment-reminder', "
+    "max(strftime('%Y-%m-%d %H:%M:%S.000000', new.date || ' ' || coalesce(substr(new.start_time, 1, 8), '09:00:00'), '-24 hours'), "
+    "strftime('%Y-%m-%d %H:%M:%S.000000', 'now', 'localtime')), 'pending', 0, new.id WHERE "
+    "strftime('%Y-%m-%d %H:%M:%S.000000', new.date || ' ' || coalesce(substr(new.start_time, 1, 8), '09:00:00')) > "
+    "strftime('%Y-%m-%d %H:%M:%S.000000', 'now', 'localtime'); "
+    "INSERT OR IGNORE INTO reminder_jobs (kind, due_at, status, attempts, appointment_id) SELECT 'follow-up', "
+    "max(strftime('%Y-%m-%d %H:%M:%S.000000', new.date || ' 10:00:00', '+3 days'), "
+    "strftime('%Y-%m-%d %H:%M:%S.000000', 'now', 'localtime')), 'pending', 0, new.id WHERE "
+    "strftime('%Y-%m-%d %H:%M:%S.000000', new.date || ' 10:00:00', '+3 days') > "
+    "strftime('%Y-%m-%d %H:%M:%S.000000', 'now', 'localtime'); END",
+    "CREATE TRIGGER IF NOT EXISTS appointments_reminders_update AFTER UPDATE OF date, start_time "
+    "ON appointments BEGIN "
+    "DELETE FROM reminder_jobs WHERE appointment_id = new.id AND +status = 'pending'; "
+    "INSERT OR IGNORE INTO reminder_jobs (kind, due_at, status, attempts, appointment_id) "
+    "SELECT 'appointment-reminder', "
+    "max(strftime('%Y-%m-%d %H:%M:%S.000000', new.date || ' ' || coalesce(substr(new.start_time, 1, 8), '09:00:00'), '-24 hours'), "
+    "strftime('%Y-%m-%d %H:%M:%S.000000', 'now', 'localtime')), 'pending', 0, new.id WHERE "
+    "strftime('%Y-%m-%d %H:%M:%S.000000', new.date || ' ' || coalesce(substr(new.start_time, 1, 8), '09:00:00')) > "
+    "strftime('%Y-%m-%d %H:%M:%S.000000', 'now', 'localtime'); "
+    "INSERT OR IGNORE INTO reminder_jobs (kind, due_at, status, attempts, appointment_id) SELECT 'follow-up', "
+    "max(strftime('%Y-%m-%d %H:%M:%S.000000', new.date || ' 10:00:00', '+3 days'), "
+    "strftime('%Y-%m-%d %H:%M:%S.000000', 'now', 'localtime')), 'pending', 0, new.id WHERE "
+    "strftime('%Y-%m-%d %H:%M:%S.000000', new.date || ' 10:00:00', '+3 days') > "
+    "strftime('%Y-%m-%d %H:%M:%S.000000', 'now', 'localtime'); END",
+    "CREATE TRIGGER IF NOT EXISTS prescriptions_reminders_insert AFTER INSERT ON prescriptions BEGIN "
+    "INSERT OR IGNORE INTO reminder_jobs (kind, due_at, status, attempts, prescription_id) SELECT 'refill', "
+    "max(strftime('%Y-%m-%d %H:%M:%S.000000', new.date || ' 09:00:00', '+25 days'), "
+    "strftime('%Y-%m-%d %H:%M:%S.000000', 'now', 'localtime')), 'pending', 0, new.id WHERE "
+    "strftime('%Y-%m-%d %H:%M:%S.000000', new.date || ' 09:00:00', '+25 days') > "
+    "strftime('%Y-%m-%d %H:%M:%S.000000', 'now', 'localtime'); END",
+    "CREATE TRIGGER IF NOT EXISTS prescriptions_reminders_update AFTER UPDATE OF date ON prescriptions BEGIN "
+    "DELETE FROM reminder_jobs WHERE prescription_id = new.id AND +status = 'pending'; "
+    "INSERT OR IGNORE INTO reminder_jobs (kind, due_at, status, attempts, prescription_id) SELECT 'refill', "
+    "max(strftime('%Y-%m-%d %H:%M:%S.000000', new.date || ' 09:00:00', '+25 days'), "
+    "strftime('%Y-%m-%d %H:%M:%S.000000', 'now', 'localtime')), 'pending', 0, new.id WHERE "
+    "strftime('%Y-%m-%d %H:%M:%S.000000', new.date || ' 09:00:00', '+25 days') > "
+    "strftime('%Y-%m-%d %H:%M:%S.000000', 'now', 'localtime'); END",
+]
+
+BACKFILL = [
+    "INSERT OR IGNORE INTO reminder_jobs (kind, due_at, status, attempts, appointment_id) "
+    "SELECT 'appointment-reminder', "
+    "max(strftime('%Y-%m-%d %H:%M:%S.000000', t.date || ' ' || coalesce(substr(t.start_time, 1, 8), '09:00:00'), '-24 hours'), "
+    "strftime('%Y-%m-%d %H:%M:%S.000000', 'now', 'localtime')), 'pending', 0, t.id FROM appointments AS t "
+    "WHERE t.date >= date('now', 'localtime', '-26 days') AND "
+    "strftime('%Y-%m-%d %H:%M:%S.000000', t.date || ' ' || coalesce(substr(t.start_time, 1, 8), '09:00:00')) > "
+    "strftime('%Y-%m-%d %H:%M:%S.000000', 'now', 'localtime')",
+    "INSERT OR IGNORE INTO reminder_jobs (kind, due_at, status, attempts, appointment_id) SELECT 'follow-up', "
+    "max(strftime('%Y-%m-%d %H:%M:%S.000000', t.date || ' 10:00:00', '+3 days'), "
+    "strftime('%Y-%m-%d %H:%M:%S.000000', 'now', 'localtime')), 'pending', 0, t.id FROM appointments AS t "
+    "WHERE t.date >= date('now', 'localtime', '-26 days') AND "
+    "strftime('%Y-%m-%d %H:%M:%S.000000', t.date || ' 10:00:00', '+3 days') > "
+    "strftime('%Y-%m-%d %H:%M:%S.000000', 'now', 'localtime')",
+    "INSERT OR IGNORE INTO reminder_jobs (kind, due_at, status, attempts, prescription_id) SELECT 'refill', "
+    "max(strftime('%Y-%m-%d %H:%M:%S.000000', t.date || ' 09:00:00', '+25 days'), "
+    "strftime('%Y-%m-%d %H:%M:%S.000000', 'now', 'localtime')), 'pending', 0, t.id FROM prescriptions AS t "
+    "WHERE t.date >= date('now', 'localtime', '-26 days') AND "
+    "strftime('%Y-%m-%d %H:%M:%S.000000', t.date || ' 09:00:00', '+25 days') > "
+    "strftime('%Y-%m-%d %H:%M:%S.000000', 'now', 'localtime')",
+]
+
+
+def upgrade() -> None:
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.create_table('reminder_jobs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(), nullable=False),
+    sa.Column('due_at', sa.DateTime(), nullable=False),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('appointment_id', sa.Integer(), nullable=True),
+    sa.Column('prescription_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['appointment_id'], ['appointments.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['prescription_id'], ['prescriptions.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_reminder_jobs_appointment_id_kind', 'reminder_jobs', ['appointment_id', 'kind'], unique=True)
+    op.create_index('ix_reminder_jobs_prescription_id_kind', 'reminder_jobs', ['prescription_id', 'kind'], unique=True)
+    op.create_index('ix_reminder_jobs_status_due_at', 'reminder_jobs', ['status', 'due_at'], unique=False)
+    # ### end Alembic commands ###
+    # Triggers queueing jobs for new appointments and prescriptions, and the
+    # jobs still to come for existing ones.
+    for statement in TRIGGERS + BACKFILL:
+        op.execute(statement)
+
+
+def downgrade() -> None:
+    for table in ('appointments', 'prescriptions'):
+        for event in ('insert', 'update'):
+            op.execute(f"DROP TRIGGER IF EXISTS {table}_reminders_{event}")
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.drop_index('ix_reminder_jobs_status_due_at', table_name='reminder_jobs')
+    op.drop_index('ix_reminder_jobs_prescription_id_kind', table_name='reminder_jobs')
+    op.drop_index('ix_reminder_jobs_appointment_id_kind', table_name='reminder_jobs')
+    op.drop_table('reminder_jobs')
+    # ### end Alembic commands ###
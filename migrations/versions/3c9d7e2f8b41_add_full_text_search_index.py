@@ -0,0 +1,77 @@
+"""Add full-text search index
+
+Revision ID: 3c9d7e2f8b41
+Revises: 75c88824f4f5
+Create Date: 2026-10-18 11:42:10.218374
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c9d7e2f8b41'
+down_revision: Union[str, None] = '75c88824f4f5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# The DDL is written out as it stood at this revision rather than taken from
+# veterinary.search, so later changes there don't change this migration.
+# Each row's rowid in the FTS tables is its id * 4 + 1 (client), 2 (animal)
+# or 3 (appointment).
+TABLES = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(title, body, tokenize='unicode61 remove_diacritics 2')",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS search_trigrams USING fts5(name, tokenize='trigram')",
+]
+
+TRIGGERS = [
+    "CREATE TRIGGER IF NOT EXISTS clients_search_insert AFTER INSERT ON clients BEGIN "
+    "INSERT INTO search_index (rowid, title, body) VALUES (new.id * 4 + 1, new.name, new.email || ' ' || new.phone); "
+    "INSERT INTO search_trigrams (rowid, name) VALUES (new.id * 4 + 1, new.name); END",
+    "CREATE TRIGGER IF NOT EXISTS clients_search_update AFTER UPDATE ON clients BEGIN "
+    "DELETE FROM search_index WHERE rowid = old.id * 4 + 1; DELETE FROM search_trigrams WHERE rowid = old.id * 4 + 1; "
+    "INSERT INTO search_index (rowid, title, body) VALUES (new.id * 4 + 1, new.name, new.email || ' ' || new.phone); "
+    "INSERT INTO search_trigrams (rowid, name) VALUES (new.id * 4 + 1, new.name); END",
+    "CREATE TRIGGER IF NOT EXISTS clients_search_delete AFTER DELETE ON clients BEGIN "
+    "DELETE FROM search_index WHERE rowid = old.id * 4 + 1; DELETE FROM search_trigrams WHERE rowid = old.id * 4 + 1; END",
+    "CREATE TRIGGER IF NOT EXISTS animals_search_insert AFTER INSERT ON animals BEGIN "
+    "INSERT INTO search_index (rowid, title, body) VALUES (new.id * 4 + 2, new.name, new.species || ' ' || coalesce(new.breed, '')); "
+    "INSERT INTO search_trigrams (rowid, name) VALUES (new.id * 4 + 2, new.name); END",
+    "CREATE TRIGGER IF NOT EXISTS animals_search_update AFTER UPDATE ON animals BEGIN "
+    "DELETE FROM search_index WHERE rowid = old.id * 4 + 2; DELETE FROM search_trigrams WHERE rowid = old.id * 4 + 2; "
+    "INSERT INTO search_index (rowid, title, body) VALUES (new.id * 4 + 2, new.name, new.species || ' ' || coalesce(new.breed, '')); "
+    "INSERT INTO search_trigrams (rowid, name) VALUES (new.id * 4 + 2, new.name); END",
+    "CREATE TRIGGER IF NOT EXISTS animals_search_delete AFTER DELETE ON animals BEGIN "
+    "DELETE FROM search_index WHERE rowid = old.id * 4 + 2; DELETE FROM search_trigrams WHERE rowid = old.id * 4 + 2; END",
+    "CREATE TRIGGER IF NOT EXISTS appointments_search_insert AFTER INSERT ON appointments BEGIN "
+    "INSERT INTO search_index (rowid, title, body) VALUES (new.id * 4 + 3, new.reason, ''); END",
+    "CREATE TRIGGER IF NOT EXISTS appointments_search_update AFTER UPDATE ON appointments BEGIN "
+    "DELETE FROM search_index WHERE rowid = old.id * 4 + 3; "
+    "INSERT INTO search_index (rowid, title, body) VALUES (new.id * 4 + 3, new.reason, ''); END",
+    "CREATE TRIGGER IF NOT EXISTS appointments_search_delete AFTER DELETE ON appointments BEGIN "
+    "DELETE FROM search_index WHERE rowid = old.id * 4 + 3; END",
+]
+
+BACKFILL = [
+    "INSERT INTO search_index (rowid, title, body) SELECT t.id * 4 + 1, t.name, t.email || ' ' || t.phone FROM clients AS t",
+    "INSERT INTO search_trigrams (rowid, name) SELECT t.id * 4 + 1, t.name FROM clients AS t",
+    "INSERT INTO search_index (rowid, title, body) SELECT t.id * 4 + 2, t.name, t.species || ' ' || coalesce(t.breed, '') FROM animals AS t",
+    "INSERT INTO search_trigrams (rowid, name) SELECT t.id * 4 + 2, t.name FROM animals AS t",
+    "INSERT INTO search_index (rowid, title, body) SELECT t.id * 4 + 3, t.reason, '' FROM appointments AS t",
+]
+
+
+def upgrade() -> None:
+    # FTS5 virtual tables and their sync triggers, backfilled from the
+    # existing rows.
+    for statement in TABLES + TRIGGERS + BACKFILL:
+        op.execute(statement)
+
+
+def downgrade() -> None:
+    for table in ('clients', 'animals', 'appointments'):
+        for event in ('insert', 'update', 'delete'):
+            op.execute(f"DROP TRIGGER IF EXISTS {table}_search_{event}")
+    op.execute("DROP TABLE IF EXISTS search_trigrams")
+    op.execute("DROP TABLE IF EXISTS search_index")
@@ -0,0 +1,80 @@
+"""Cascade deletes on foreign keys
+
+Revision ID: 5b8e1f0c9a27
+Revises: 3c9d7e2f8b41
+Create Date: 2026-10-18 12:31:05.402117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b8e1f0c9a27'
+down_revision: Union[str, None] = '3c9d7e2f8b41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# SQLite can't alter a constraint in place, so each table is rebuilt in batch
+# mode. Its foreign keys were created without names; the naming convention
+# gives the reflected ones names so they can be dropped.
+NAMING_CONVENTION = {"fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s"}
+
+# (table, column, referred table, ON DELETE action)
+FOREIGN_KEYS = [
+    ('animals', 'owner_id', 'clients', 'CASCADE'),
+    ('appointments', 'client_id', 'clients', 'CASCADE'),
+    ('appointments', 'animal_id', 'animals', 'CASCADE'),
+    ('appointments', 'veterinarian_id', 'veterinarians', 'SET NULL'),
+    ('prescriptions', 'animal_id', 'animals', 'CASCADE'),
+    ('veterinarian_specialization', 'veterinarian_id', 'veterinarians', 'CASCADE'),
+    ('veterinarian_specialization', 'specialization_id', 'specializations', 'CASCADE'),
+]
+
+
+# The search index triggers on the rebuilt tables, as created by revision
+# 3c9d7e2f8b41.
+SEARCH_TRIGGERS = [
+    "CREATE TRIGGER IF NOT EXISTS animals_search_insert AFTER INSERT ON animals BEGIN "
+    "INSERT INTO search_index (rowid, title, body) VALUES (new.id * 4 + 2, new.name, new.species || ' ' || coalesce(new.breed, '')); "
+    "INSERT INTO search_trigrams (rowid, name) VALUES (new.id * 4 + 2, new.name); END",
+    "CREATE TRIGGER IF NOT EXISTS animals_search_update AFTER UPDATE ON animals BEGIN "
+    "DELETE FROM search_index WHERE rowid = old.id * 4 + 2; DELETE FROM search_trigrams WHERE rowid = old.id * 4 + 2; "
+    "INSERT INTO search_index (rowid, title, body) VALUES (new.id * 4 + 2, new.name, new.species || ' ' || coalesce(new.breed, '')); "
+    "INSERT INTO search_trigrams (rowid, name) VALUES (new.id * 4 + 2, new.name); END",
+    "CREATE TRIGGER IF NOT EXISTS animals_search_delete AFTER DELETE ON animals BEGIN "
+    "DELETE FROM search_index WHERE rowid = old.id * 4 + 2; DELETE FROM search_trigrams WHERE rowid = old.id * 4 + 2; END",
+    "CREATE TRIGGER IF NOT EXISTS appointments_search_insert AFTER INSERT ON appointments BEGIN "
+    "INSERT INTO search_index (rowid, title, body) VALUES (new.id * 4 + 3, new.reason, ''); END",
+    "CREATE TRIGGER IF NOT EXISTS appointments_search_update AFTER UPDATE ON appointments BEGIN "
+    "DELETE FROM search_index WHERE rowid = old.id * 4 + 3; "
+    "INSERT INTO search_index (rowid, title, body) VALUES (new.id * 4 + 3, new.reason, ''); END",
+    "CREATE TRIGGER IF NOT EXISTS appointments_search_delete AFTER DELETE ON appointments BEGIN "
+    "DELETE FROM search_index WHERE rowid = old.id * 4 + 3; END",
+]
+
+
+def _replace_foreign_keys(with_ondelete):
+    tables = {}
+    for table, column, referred, ondelete in FOREIGN_KEYS:
+        tables.setdefault(table, []).append((column, referred, ondelete))
+    for table, keys in tables.items():
+        with op.batch_alter_table(table, naming_convention=NAMING_CONVENTION, recreate='always') as batch_op:
+            for column, referred, ondelete in keys:
+                name = f"fk_{table}_{column}_{referred}"
+                batch_op.drop_constraint(name, type_='foreignkey')
+                batch_op.create_foreign_key(name, referred, [column], ['id'],
+                                            ondelete=ondelete if with_ondelete else None)
+    # Rebuilding a table drops its triggers, including the search index's.
+    if op.get_bind().dialect.name == 'sqlite':
+        for statement in SEARCH_TRIGGERS:
+            op.execute(statement)
+
+
+def upgrade() -> None:
+    _replace_foreign_keys(with_ondelete=True)
+
+
+def downgrade() -> None:
+    _replace_foreign_keys(with_ondelete=False)
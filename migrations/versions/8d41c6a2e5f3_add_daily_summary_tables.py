@@ -0,0 +1,122 @@
+"""Add daily summary tables
+
+Revision ID: 8d41c6a2e5f3
+Revises: 75fbb71c520e
+Create Date: 2026-10-18 13:05:41.662310
+
+"""
+import re
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d41c6a2e5f3'
+down_revision: Union[str, None] = '75fbb71c520e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# The DDL is written out as it stood at this revision rather than taken from
+# veterinary.stats, so later changes there don't change this migration.
+# {table} is the live table or one of its yearly archive tables.
+TABLES = [
+    "CREATE TABLE IF NOT EXISTS appointment_daily_stats (day VARCHAR NOT NULL, veterinarian_id INTEGER NOT NULL, "
+    "appointments INTEGER NOT NULL, minutes INTEGER NOT NULL, PRIMARY KEY (day, veterinarian_id))",
+    "CREATE TABLE IF NOT EXISTS prescription_daily_stats (day VARCHAR NOT NULL, medication VARCHAR NOT NULL, "
+    "prescriptions INTEGER NOT NULL, PRIMARY KEY (day, medication))",
+]
+
+APPOINTMENT_TRIGGERS = [
+    "CREATE TRIGGER IF NOT EXISTS {table}_stats_insert AFTER INSERT ON {table} BEGIN "
+    "INSERT INTO appointment_daily_stats (day, veterinarian_id, appointments, minutes) "
+    "VALUES (new.date, coalesce(new.veterinarian_id, 0), 1, "
+    "coalesce(round((julianday(new.end_time) - julianday(new.start_time)) * 1440), 0)) "
+    "ON CONFLICT (day, veterinarian_id) DO UPDATE SET appointments = appointments + 1, "
+    "minutes = minutes + excluded.minutes; END",
+    "CREATE TRIGGER IF NOT EXISTS {table}_stats_delete AFTER DELETE ON {table} BEGIN "
+    "UPDATE appointment_daily_stats SET appointments = appointments - 1, minutes = minutes - "
+    "coalesce(round((julianday(old.end_time) - julianday(old.start_time)) * 1440), 0) WHERE day = old.date "
+    "AND veterinarian_id = coalesce(old.veterinarian_id, 0); "
+    "DELETE FROM appointment_daily_stats WHERE day = old.date AND veterinarian_id = coalesce(old.veterinarian_id, 0) "
+    "AND appointments <= 0; END",
+    "CREATE TRIGGER IF NOT EXISTS {table}_stats_update AFTER UPDATE OF date, veterinarian_id, start_time, end_time "
+    "ON {table} BEGIN "
+    "UPDATE appointment_daily_stats SET appointments = appointments - 1, minutes = minutes - "
+    "coalesce(round((julianday(old.end_time) - julianday(old.start_time)) * 1440), 0) WHERE day = old.date "
+    "AND veterinarian_id = coalesce(old.veterinarian_id, 0); "
+    "DELETE FROM appointment_daily_stats WHERE day = old.date AND veterinarian_id = coalesce(old.veterinarian_id, 0) "
+    "AND appointments <= 0; "
+    "INSERT INTO appointment_daily_stats (day, veterinarian_id, appointments, minutes) "
+    "VALUES (new.date, coalesce(new.veterinarian_id, 0), 1, "
+    "coalesce(round((julianday(new.end_time) - julianday(new.start_time)) * 1440), 0)) "
+    "ON CONFLICT (day, veterinarian_id) DO UPDATE SET appointments = appointments + 1, "
+    "minutes = minutes + excluded.minutes; END",
+]
+
+PRESCRIPTION_TRIGGERS = [
+    "CREATE TRIGGER IF NOT EXISTS {table}_stats_insert AFTER INSERT ON {table} BEGIN "
+    "INSERT INTO prescription_daily_stats (day, medication, prescriptions) "
+    "VALUES (coalesce(new.date, ''), new.medication, 1) ON CONFLICT (day, medication) "
+    "DO UPDATE SET prescriptions = prescriptions + 1; END",
+    "CREATE TRIGGER IF NOT EXISTS {table}_stats_delete AFTER DELETE ON {table} BEGIN "
+    "UPDATE prescription_daily_stats SET prescriptions = prescriptions - 1 WHERE day = coalesce(old.date, '') "
+    "AND medication = old.medication; "
+    "DELETE FROM prescription_daily_stats WHERE day = coalesce(old.date, '') AND medication = old.medication "
+    "AND prescriptions <= 0; END",
+    "CREATE TRIGGER IF NOT EXISTS {table}_stats_update AFTER UPDATE OF date, medication ON {table} BEGIN "
+    "UPDATE prescription_daily_stats SET prescriptions = prescriptions - 1 WHERE day = coalesce(old.date, '') "
+    "AND medication = old.medication; "
+    "DELETE FROM prescription_daily_stats WHERE day = coalesce(old.date, '') AND medication = old.medication "
+    "AND prescriptions <= 0; "
+    "INSERT INTO prescription_daily_stats (day, medication, prescriptions) "
+    "VALUES (coalesce(new.date, ''), new.medication, 1) ON CONFLICT (day, medication) "
+    "DO UPDATE SET prescriptions = prescriptions + 1; END",
+]
+
+TRIGGERS = {'appointments': APPOINTMENT_TRIGGERS, 'prescriptions': PRESCRIPTION_TRIGGERS}
+
+BACKFILL = {
+    'appointments':
+        "INSERT INTO appointment_daily_stats (day, veterinarian_id, appointments, minutes) "
+        "SELECT t.date, coalesce(t.veterinarian_id, 0), count(*), "
+        "sum(coalesce(round((julianday(t.end_time) - julianday(t.start_time)) * 1440), 0)) "
+        "FROM {table} AS t GROUP BY 1, 2 ON CONFLICT (day, veterinarian_id) "
+        "DO UPDATE SET appointments = appointments + excluded.appointments, minutes = minutes + excluded.minutes",
+    'prescriptions':
+        "INSERT INTO prescription_daily_stats (day, medication, prescriptions) "
+        "SELECT coalesce(t.date, ''), t.medication, count(*) FROM {table} AS t GROUP BY 1, 2 "
+        "ON CONFLICT (day, medication) DO UPDATE SET prescriptions = prescriptions + excluded.prescriptions",
+}
+
+
+def _source_tables(connection):
+    """(table, kind) for the live tables and any archive tables made before this revision."""
+    names = connection.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name").scalars()
+    archives = [name for name in names if re.fullmatch(r"(appointments|prescriptions)_archive_\d{4}", name)]
+    for kind in TRIGGERS:
+        yield kind, kind
+        for name in archives:
+            if name.startswith(kind + '_'):
+                yield name, kind
+
+
+def upgrade() -> None:
+    # Summary tables and the triggers that maintain them, backfilled from the
+    # existing rows (archive tables included).
+    connection = op.get_bind()
+    for statement in TABLES:
+        op.execute(statement)
+    for table, kind in _source_tables(connection):
+        for statement in TRIGGERS[kind]:
+            op.execute(statement.format(table=table))
+    for table, kind in _source_tables(connection):
+        op.execute(BACKFILL[kind].format(table=table))
+
+
+def downgrade() -> None:
+    for table, _ in _source_tables(op.get_bind()):
+        for event in ('insert', 'delete', 'update'):
+            op.execute(f"DROP TRIGGER IF EXISTS {table}_stats_{event}")
+    op.execute("DROP TABLE IF EXISTS prescription_daily_stats")
+    op.execute("DROP TABLE IF EXISTS appointment_daily_stats")
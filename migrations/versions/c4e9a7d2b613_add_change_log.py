@@ -0,0 +1,183 @@
+"""Add change log
+
+Revision ID: c4e9a7d2b613
+Revises: 0358d17822b7
+Create Date: 2026-10-18 14:20:37.518204
+
+"""
+import re
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e9a7d2b613'
+down_revision: Union[str, None] = '0358d17822b7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# The DDL is written out as it stood at this revision rather than taken from
+# veterinary.changes, so later changes there don't change this migration.
+TABLES = [
+    "CREATE TABLE IF NOT EXISTS change_log (id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT, "
+    "table_name VARCHAR NOT NULL, operation VARCHAR NOT NULL, data TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS sync_state (source VARCHAR NOT NULL, last_change_id INTEGER NOT NULL, "
+    "synced_at DATETIME NOT NULL, PRIMARY KEY (source))",
+]
+
+# Per logged table, parents first: its three triggers and the statement
+# logging its existing rows. {table} is the table, or for appointments and
+# prescriptions one of their yearly archive tables.
+STATEMENTS = {
+    'clients': [
+        "CREATE TRIGGER IF NOT EXISTS {table}_changes_insert AFTER INSERT ON {table} BEGIN "
+        "INSERT INTO change_log (table_name, operation, data) VALUES ('{table}', 'insert', json_object('id', new.id, "
+        "'name', new.name, 'email', new.email, 'phone', new.phone)); END",
+        "CREATE TRIGGER IF NOT EXISTS {table}_changes_delete AFTER DELETE ON {table} BEGIN "
+        "INSERT INTO change_log (table_name, operation, data) VALUES ('{table}', 'delete', json_object('id', old.id)); "
+        "END",
+        "CREATE TRIGGER IF NOT EXISTS {table}_changes_update AFTER UPDATE ON {table} BEGIN "
+        "INSERT INTO change_log (table_name, operation, data) SELECT '{table}', 'delete', json_object('id', old.id) "
+        "WHERE old.id IS NOT new.id; "
+        "INSERT INTO change_log (table_name, operation, data) VALUES ('{table}', 'update', json_object('id', new.id, "
+        "'name', new.name, 'email', new.email, 'phone', new.phone)); END",
+        "INSERT INTO change_log (table_name, operation, data) SELECT '{table}', 'insert', json_object('id', t.id, "
+        "'name', t.name, 'email', t.email, 'phone', t.phone) FROM {table} AS t ORDER BY t.rowid",
+    ],
+    'specializations': [
+        "CREATE TRIGGER IF NOT EXISTS {table}_changes_insert AFTER INSERT ON {table} BEGIN "
+        "INSERT INTO change_log (table_name, operation, data) VALUES ('{table}', 'insert', json_object('id', new.id, "
+        "'name', new.name)); END",
+        "CREATE TRIGGER IF NOT EXISTS {table}_changes_delete AFTER DELETE ON {table} BEGIN "
+        "INSERT INTO change_log (table_name, operation, data) VALUES ('{table}', 'delete', json_object('id', old.id)); "
+        "END",
+        "CREATE TRIGGER IF NOT EXISTS {table}_changes_update AFTER UPDATE ON {table} BEGIN "
+        "INSERT INTO change_log (table_name, operation, data) SELECT '{table}', 'delete', json_object('id', old.id) "
+        "WHERE old.id IS NOT new.id; "
+        "INSERT INTO change_log (table_name, operation, data) VALUES ('{table}', 'update', json_object('id', new.id, "
+        "'name', new.name)); END",
+        "INSERT INTO change_log (table_name, operation, data) SELECT '{table}', 'insert', json_object('id', t.id, "
+        "'name', t.name) FROM {table} AS t ORDER BY t.rowid",
+    ],
+    'veterinarians': [
+        "CREATE TRIGGER IF NOT EXISTS {table}_changes_insert AFTER INSERT ON {table} BEGIN "
+        "INSERT INTO change_log (table_name, operation, data) VALUES ('{table}', 'insert', json_object('id', new.id, "
+        "'name', new.name)); END",
+        "CREATE TRIGGER IF NOT EXISTS {table}_changes_delete AFTER DELETE ON {table} BEGIN "
+        "INSERT INTO change_log (table_name, operation, data) VALUES ('{table}', 'delete', json_object('id', old.id)); "
+        "END",
+        "CREATE TRIGGER IF NOT EXISTS {table}_changes_update AFTER UPDATE ON {table} BEGIN "
+        "INSERT INTO change_log (table_name, operation, data) SELECT '{table}', 'delete', json_object('id', old.id) "
+        "WHERE old.id IS NOT new.id; "
+        "INSERT INTO change_log (table_name, operation, data) VALUES ('{table}', 'update', json_object('id', new.id, "
+        "'name', new.name)); END",
+        "INSERT INTO change_log (table_name, operation, data) SELECT '{table}', 'insert', json_object('id', t.id, "
+        "'name', t.name) FROM {table} AS t ORDER BY t.rowid",
+    ],
+    'animals': [
+        "CREATE TRIGGER IF NOT EXISTS {table}_changes_insert AFTER INSERT ON {table} BEGIN "
+        "INSERT INTO change_log (table_name, operation, data) VALUES ('{table}', 'insert', json_object('id', new.id, "
+        "'name', new.name, 'species', new.species, 'breed', new.breed, 'age', new.age, 'weight', new.weight, "
+        "'owner_id', new.owner_id)); END",
+        "CREATE TRIGGER IF NOT EXISTS {table}_changes_delete AFTER DELETE ON {table} BEGIN "
+        "INSERT INTO change_log (table_name, operation, data) VALUES ('{table}', 'delete', json_object('id', old.id)); "
+        "END",
+        "CREATE TRIGGER IF NOT EXISTS {table}_changes_update AFTER UPDATE ON {table} BEGIN "
+        "INSERT INTO change_log (table_name, operation, data) SELECT '{table}', 'delete', json_object('id', old.id) "
+        "WHERE old.id IS NOT new.id; "
+        "INSERT INTO change_log (table_name, operation, data) VALUES ('{table}', 'update', json_object('id', new.id, "
+        "'name', new.name, 'species', new.species, 'breed', new.breed, 'age', new.age, 'weight', new.weight, "
+        "'owner_id', new.owner_id)); END",
+        "INSERT INTO change_log (table_name, operation, data) SELECT '{table}', 'insert', json_object('id', t.id, "
+        "'name', t.name, 'species', t.species, 'breed', t.breed, 'age', t.age, 'weight', t.weight, "
+        "'owner_id', t.owner_id) FROM {table} AS t ORDER BY t.rowid",
+    ],
+    'veterinarian_specialization': [
+        "CREATE TRIGGER IF NOT EXISTS {table}_changes_insert AFTER INSERT ON {table} BEGIN "
+        "INSERT INTO change_log (table_name, operation, data) "
+        "VALUES ('{table}', 'insert', json_object('veterinarian_id', new.veterinarian_id, "
+        "'specialization_id', new.specialization_id)); END",
+        "CREATE TRIGGER IF NOT EXISTS {table}_changes_delete AFTER DELETE ON {table} BEGIN "
+        "INSERT INTO change_log (table_name, operation, data) "
+        "VALUES ('{table}', 'delete', json_object('veterinarian_id', old.veterinarian_id, "
+        "'specialization_id', old.specialization_id)); END",
+        "CREATE TRIGGER IF NOT EXISTS {table}_changes_update AFTER UPDATE ON {table} BEGIN "
+        "INSERT INTO change_log (table_name, operation, data) "
+        "SELECT '{table}', 'delete', json_object('veterinarian_id', old.veterinarian_id, "
+        "'specialization_id', old.specialization_id) "
+        "WHERE old.veterinarian_id IS NOT new.veterinarian_id OR old.specialization_id IS NOT new.specialization_id; "
+        "INSERT INTO change_log (table_name, operation, data) "
+        "VALUES ('{table}', 'update', json_object('veterinarian_id', new.veterinarian_id, "
+        "'specialization_id', new.specialization_id)); END",
+        "INSERT INTO change_log (table_name, operation, data) "
+        "SELECT '{table}', 'insert', json_object('veterinarian_id', t.veterinarian_id, "
+        "'specialization_id', t.specialization_id) FROM {table} AS t ORDER BY t.rowid",
+    ],
+    'appointments': [
+        "CREATE TRIGGER IF NOT EXISTS {table}_changes_insert AFTER INSERT ON {table} BEGIN "
+        "INSERT INTO change_log (table_name, operation, data) VALUES ('{table}', 'insert', json_object('id', new.id, "
+        "'date', new.date, 'start_time', new.start_time, 'end_time', new.end_time, 'reason', new.reason, "
+        "'client_id', new.client_id, 'animal_id', new.animal_id, 'veterinarian_id', new.veterinarian_id)); END",
+        "CREATE TRIGGER IF NOT EXISTS {table}_changes_delete AFTER DELETE ON {table} BEGIN "
+        "INSERT INTO change_log (table_name, operation, data) VALUES ('{table}', 'delete', json_object('id', old.id)); "
+        "END",
+        "CREATE TRIGGER IF NOT EXISTS {table}_changes_update AFTER UPDATE ON {table} BEGIN "
+        "INSERT INTO change_log (table_name, operation, data) SELECT '{table}', 'delete', json_object('id', old.id) "
+        "WHERE old.id IS NOT new.id; "
+        "INSERT INTO change_log (table_name, operation, data) VALUES ('{table}', 'update', json_object('id', new.id, "
+        "'date', new.date, 'start_time', new.start_time, 'end_time', new.end_time, 'reason', new.reason, "
+        "'client_id', new.client_id, 'animal_id', new.animal_id, 'veterinarian_id', new.veterinarian_id)); END",
+        "INSERT INTO change_log (table_name, operation, data) SELECT '{table}', 'insert', json_object('id', t.id, "
+        "'date', t.date, 'start_time', t.start_time, 'end_time', t.end_time, 'reason', t.reason, "
+        "'client_id', t.client_id, 'animal_id', t.animal_id, 'veterinarian_id', t.veterinarian_id) "
+        "FROM {table} AS t ORDER BY t.rowid",
+    ],
+    'prescriptions': [
+        "CREATE TRIGGER IF NOT EXISTS {table}_changes_insert AFTER INSERT ON {table} BEGIN "
+        "INSERT INTO change_log (table_name, operation, data) VALUES ('{table}', 'insert', json_object('id', new.id, "
+        "'medication', new.medication, 'dosage', new.dosage, 'date', new.date, 'animal_id', new.animal_id)); END",
+        "CREATE TRIGGER IF NOT EXISTS {table}_changes_delete AFTER DELETE ON {table} BEGIN "
+        "INSERT INTO change_log (table_name, operation, data) VALUES ('{table}', 'delete', json_object('id', old.id)); "
+        "END",
+        "CREATE TRIGGER IF NOT EXISTS {table}_changes_update AFTER UPDATE ON {table} BEGIN "
+        "INSERT INTO change_log (table_name, operation, data) SELECT '{table}', 'delete', json_object('id', old.id) "
+        "WHERE old.id IS NOT new.id; "
+        "INSERT INTO change_log (table_name, operation, data) VALUES ('{table}', 'update', json_object('id', new.id, "
+        "'medication', new.medication, 'dosage', new.dosage, 'date', new.date, 'animal_id', new.animal_id)); END",
+        "INSERT INTO change_log (table_name, operation, data) SELECT '{table}', 'insert', json_object('id', t.id, "
+        "'medication', t.medication, 'dosage', t.dosage, 'date', t.date, 'animal_id', t.animal_id) "
+        "FROM {table} AS t ORDER BY t.rowid",
+    ],
+}
+
+
+def _logged_tables(connection):
+    """(table, kind) for the logged tables and any archive tables made before this revision."""
+    names = connection.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name").scalars()
+    archives = [name for name in names if re.fullmatch(r"(appointments|prescriptions)_archive_\d{4}", name)]
+    for kind in STATEMENTS:
+        yield kind, kind
+    for kind in ('appointments', 'prescriptions'):
+        for name in archives:
+            if name.startswith(kind + '_'):
+                yield name, kind
+
+
+def upgrade() -> None:
+    # The change log and sync state tables and the logging triggers. The
+    # existing rows (archive tables included) are logged as inserts, so a
+    # new, empty database can be brought up to date with `sync`.
+    for statement in TABLES:
+        op.execute(statement)
+    for table, kind in _logged_tables(op.get_bind()):
+        for statement in STATEMENTS[kind]:
+            op.execute(statement.format(table=table))
+
+
+def downgrade() -> None:
+    for table, _ in _logged_tables(op.get_bind()):
+        for event in ('insert', 'update', 'delete'):
+            op.execute(f"DROP TRIGGER IF EXISTS {table}_changes_{event}")
+    op.execute("DROP TABLE IF EXISTS sync_state")
+    op.execute("DROP TABLE IF EXISTS change_log")
@@ -0,0 +1,187 @@
+"""Never reuse appointment and prescription IDs
+
+Revision ID: ecddce5350f8
+Revises: c4e9a7d2b613
+Create Date: 2026-10-18 16:05:12.331907
+
+"""
+import re
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'ecddce5350f8'
+down_revision: Union[str, None] = 'c4e9a7d2b613'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Archived rows keep their IDs, but SQLite gives a new row the highest ID in
+# the table plus one, so once the newest rows had been archived their IDs
+# were handed out again and a later archive run hit duplicate keys. With
+# AUTOINCREMENT, SQLite records the highest ID ever used in sqlite_sequence
+# and never goes below it; the rebuilt tables start from the highest ID in
+# the live and archive tables.
+TABLES = ('appointments', 'prescriptions')
+
+# Rebuilding a table drops its triggers. These are the search index,
+# summary, reminder and change log triggers on the two tables at this
+# revision.
+APPOINTMENT_TRIGGERS = [
+    "CREATE TRIGGER IF NOT EXISTS appointments_search_insert AFTER INSERT ON appointments BEGIN "
+    "INSERT INTO search_index (rowid, title, body) VALUES (new.id * 4 + 3, new.reason, ''); END",
+    "CREATE TRIGGER IF NOT EXISTS appointments_search_update AFTER UPDATE ON appointments BEGIN "
+    "DELETE FROM search_index WHERE rowid = old.id * 4 + 3; "
+    "INSERT INTO search_index (rowid, title, body) VALUES (new.id * 4 + 3, new.reason, ''); END",
+    "CREATE TRIGGER IF NOT EXISTS appointments_search_delete AFTER DELETE ON appointments BEGIN "
+    "DELETE FROM search_index WHERE rowid = old.id * 4 + 3; END",
+    "CREATE TRIGGER IF NOT EXISTS appointments_stats_insert AFTER INSERT ON appointments BEGIN "
+    "INSERT INTO appointment_daily_stats (day, veterinarian_id, appointments, minutes) "
+    "VALUES (new.date, coalesce(new.veterinarian_id, 0), 1, "
+    "coalesce(round((julianday(new.end_time) - julianday(new.start_time)) * 1440), 0)) "
+    "ON CONFLICT (day, veterinarian_id) DO UPDATE SET appointments = appointments + 1, "
+    "minutes = minutes + excluded.minutes; END",
+    "CREATE TRIGGER IF NOT EXISTS appointments_stats_delete AFTER DELETE ON appointments BEGIN "
+    "UPDATE appointment_daily_stats SET appointments = appointments - 1, minutes = minutes - "
+    "coalesce(round((julianday(old.end_time) - julianday(old.start_time)) * 1440), 0) WHERE day = old.date "
+    "AND veterinarian_id = coalesce(old.veterinarian_id, 0); "
+    "DELETE FROM appointment_daily_stats WHERE day = old.date AND veterinarian_id = coalesce(old.veterinarian_id, 0) "
+    "AND appointments <= 0; END",
+    "CREATE TRIGGER IF NOT EXISTS appointments_stats_update AFTER UPDATE OF date, veterinarian_id, start_time, end_time "
+    "ON appointments BEGIN "
+    "UPDATE appointment_daily_stats SET appointments = appointments - 1, minutes = minutes - "
+    "coalesce(round((julianday(old.end_time) - julianday(old.start_time)) * 1440), 0) WHERE day = old.date "
+    "AND veterinarian_id = coalesce(old.veterinarian_id, 0); "
+    "DELETE FROM appointment_daily_stats WHERE day = old.date AND veterinarian_id = coalesce(old.veterinarian_id, 0) "
+    "AND appointments <= 0; "
+    "INSERT INTO appointment_daily_stats (day, veterinarian_id, appointments, minutes) "
+    "VALUES (new.date, coalesce(new.veterinarian_id, 0), 1, "
+    "coalesce(round((julianday(new.end_time) - julianday(new.start_time)) * 1440), 0)) "
+    "ON CONFLICT (day, veterinarian_id) DO UPDATE SET appointments = appointments + 1, "
+    "minutes = minutes + excluded.minutes; END",
+    "CREATE TRIGGER IF NOT EXISTS appointments_reminders_insert AFTER INSERT ON appointments BEGIN "
+    "INSERT OR IGNORE INTO reminder_jobs (kind, due_at, status, attempts, appointment_id) "
+    "SELECT 'appointment-reminder', "
+    "max(strftime('%Y-%m-%d %H:%M:%S.000000', new.date || ' ' || coalesce(substr(new.start_time, 1, 8), '09:00:00'), '-24 hours'), "
+    "strftime('%Y-%m-%d %H:%M:%S.000000', 'now', 'localtime')), 'pending', 0, new.id WHERE "
+    "strftime('%Y-%m-%d %H:%M:%S.000000', new.date || ' ' || coalesce(substr(new.start_time, 1, 8), '09:00:00')) > "
+    "strftime('%Y-%m-%d %H:%M:%S.000000', 'now', 'localtime'); "
+    "INSERT OR IGNORE INTO reminder_jobs (kind, due_at, status, attempts, appointment_id) SELECT 'follow-up', "
+    "max(strftime('%Y-%m-%d %H:%M:%S.000000', new.date || ' 10:00:00', '+3 days'), "
+    "strftime('%Y-%m-%d %H:%M:%S.000000', 'now', 'localtime')), 'pending', 0, new.id WHERE "
+    "strftime('%Y-%m-%d %H:%M:%S.000000', new.date || ' 10:00:00', '+3 days') > "
+    "strftime('%Y-%m-%d %H:%M:%S.000000', 'now', 'localtime'); END",
+    "CREATE TRIGGER IF NOT EXISTS appointments_reminders_update AFTER UPDATE OF date, start_time "
+    "ON appointments BEGIN "
+    "DELETE FROM reminder_jobs WHERE appointment_id = new.id AND +status = 'pending'; "
+    "INSERT OR IGNORE INTO reminder_jobs (kind, due_at, status, attempts, appointment_id) "
+    "SELECT 'appointment-reminder', "
+    "max(strftime('%Y-%m-%d %H:%M:%S.000000', new.date || ' ' || coalesce(substr(new.start_time, 1, 8), '09:00:00'), '-24 hours'), "
+    "strftime('%Y-%m-%d %H:%M:%S.000000', 'now', 'localtime')), 'pending', 0, new.id WHERE "
+    "strftime('%Y-%m-%d %H:%M:%S.000000', new.date || ' ' || coalesce(substr(new.start_time, 1, 8), '09:00:00')) > "
+    "strftime('%Y-%m-%d %H:%M:%S.000000', 'now', 'localtime'); "
+    "INSERT OR IGNORE INTO reminder_jobs (kind, due_at, status, attempts, appointment_id) SELECT 'follow-up', "
+    "max(strftime('%Y-%m-%d %H:%M:%S.000000', new.date || ' 10:00:00', '+3 days'), "
+    "strftime('%Y-%m-%d %H:%M:%S.000000', 'now', 'localtime')), 'pending', 0, new.id WHERE "
+    "strftime('%Y-%m-%d %H:%M:%S.000000', new.date || ' 10:00:00', '+3 days') > "
+    "strftime('%Y-%m-%d %H:%M:%S.000000', 'now', 'localtime'); END",
+    "CREATE TRIGGER IF NOT EXISTS appointments_changes_insert AFTER INSERT ON appointments BEGIN "
+    "INSERT INTO change_log (table_name, operation, data) "
+    "VALUES ('appointments', 'insert', json_object('id', new.id, 'date', new.date, 'start_time', new.start_time, "
+    "'end_time', new.end_time, 'reason', new.reason, 'client_id', new.client_id, 'animal_id', new.animal_id, "
+    "'veterinarian_id', new.veterinarian_id)); END",
+    "CREATE TRIGGER IF NOT EXISTS appointments_changes_delete AFTER DELETE ON appointments BEGIN "
+    "INSERT INTO change_log (table_name, operation, data) "
+    "VALUES ('appointments', 'delete', json_object('id', old.id)); END",
+    "CREATE TRIGGER IF NOT EXISTS appointments_changes_update AFTER UPDATE ON appointments BEGIN "
+    "INSERT INTO change_log (table_name, operation, data) SELECT 'appointments', 'delete', json_object('id', old.id) "
+    "WHERE old.id IS NOT new.id; "
+    "INSERT INTO change_log (table_name, operation, data) "
+    "VALUES ('appointments', 'update', json_object('id', new.id, 'date', new.date, 'start_time', new.start_time, "
+    "'end_time', new.end_time, 'reason', new.reason, 'client_id', new.client_id, 'animal_id', new.animal_id, "
+    "'veterinarian_id', new.veterinarian_id)); END",
+]
+
+PRESCRIPTION_TRIGGERS = [
+    "CREATE TRIGGER IF NOT EXISTS prescriptions_stats_insert AFTER INSERT ON prescriptions BEGIN "
+    "INSERT INTO prescription_daily_stats (day, medication, prescriptions) "
+    "VALUES (coalesce(new.date, ''), new.medication, 1) ON CONFLICT (day, medication) "
+    "DO UPDATE SET prescriptions = prescriptions + 1; END",
+    "CREATE TRIGGER IF NOT EXISTS prescriptions_stats_delete AFTER DELETE ON prescriptions BEGIN "
+    "UPDATE prescription_daily_stats SET prescriptions = prescriptions - 1 WHERE day = coalesce(old.date, '') "
+    "AND medication = old.medication; "
+    "DELETE FROM prescription_daily_stats WHERE day = coalesce(old.date, '') AND medication = old.medication "
+    "AND prescriptions <= 0; END",
+    "CREATE TRIGGER IF NOT EXISTS prescriptions_stats_update AFTER UPDATE OF date, medication ON prescriptions BEGIN "
+    "UPDATE prescription_daily_stats SET prescriptions = prescriptions - 1 WHERE day = coalesce(old.date, '') "
+    "AND medication = old.medication; "
+    "DELETE FROM prescription_daily_stats WHERE day = coalesce(old.date, '') AND medication = old.medication "
+    "AND prescriptions <= 0; "
+    "INSERT INTO prescription_daily_stats (day, medication, prescriptions) "
+    "VALUES (coalesce(new.date, ''), new.medication, 1) ON CONFLICT (day, medication) "
+    "DO UPDATE SET prescriptions = prescriptions + 1; END",
+    "CREATE TRIGGER IF NOT EXISTS prescriptions_reminders_insert AFTER INSERT ON prescriptions BEGIN "
+    "INSERT OR IGNORE INTO reminder_jobs (kind, due_at, status, attempts, prescription_id) SELECT 'refill', "
+    "max(strftime('%Y-%m-%d %H:%M:%S.000000', new.date || ' 09:00:00', '+25 days'), "
+    "strftime('%Y-%m-%d %H:%M:%S.000000', 'now', 'localtime')), 'pending', 0, new.id WHERE "
+    "strftime('%Y-%m-%d %H:%M:%S.000000', new.date || ' 09:00:00', '+25 days') > "
+    "strftime('%Y-%m-%d %H:%M:%S.000000', 'now', 'localtime'); END",
+    "CREATE TRIGGER IF NOT EXISTS prescriptions_reminders_update AFTER UPDATE OF date ON prescriptions BEGIN "
+    "DELETE FROM reminder_jobs WHERE prescription_id = new.id AND +status = 'pending'; "
+    "INSERT OR IGNORE INTO reminder_jobs (kind, due_at, status, attempts, prescription_id) SELECT 'refill', "
+    "max(strftime('%Y-%m-%d %H:%M:%S.000000', new.date || ' 09:00:00', '+25 days'), "
+    "strftime('%Y-%m-%d %H:%M:%S.000000', 'now', 'localtime')), 'pending', 0, new.id WHERE "
+    "strftime('%Y-%m-%d %H:%M:%S.000000', new.date || ' 09:00:00', '+25 days') > "
+    "strftime('%Y-%m-%d %H:%M:%S.000000', 'now', 'localtime'); END",
+    "CREATE TRIGGER IF NOT EXISTS prescriptions_changes_insert AFTER INSERT ON prescriptions BEGIN "
+    "INSERT INTO change_log (table_name, operation, data) "
+    "VALUES ('prescriptions', 'insert', json_object('id', new.id, 'medication', new.medication, "
+    "'dosage', new.dosage, 'date', new.date, 'animal_id', new.animal_id)); END",
+    "CREATE TRIGGER IF NOT EXISTS prescriptions_changes_delete AFTER DELETE ON prescriptions BEGIN "
+    "INSERT INTO change_log (table_name, operation, data) "
+    "VALUES ('prescriptions', 'delete', json_object('id', old.id)); END",
+    "CREATE TRIGGER IF NOT EXISTS prescriptions_changes_update AFTER UPDATE ON prescriptions BEGIN "
+    "INSERT INTO change_log (table_name, operation, data) "
+    "SELECT 'prescriptions', 'delete', json_object('id', old.id) WHERE old.id IS NOT new.id; "
+    "INSERT INTO change_log (table_name, operation, data) "
+    "VALUES ('prescriptions', 'update', json_object('id', new.id, 'medication', new.medication, "
+    "'dosage', new.dosage, 'date', new.date, 'animal_id', new.animal_id)); END",
+]
+
+TRIGGERS = {'appointments': APPOINTMENT_TRIGGERS, 'prescriptions': PRESCRIPTION_TRIGGERS}
+
+
+def _highest_id(connection, table):
+    archives = [name for name in sa.inspect(connection).get_table_names()
+                if re.fullmatch(rf"{table}_archive_\d{{4}}", name)]
+    return max(connection.execute(sa.text(f"SELECT coalesce(max(id), 0) FROM {name}")).scalar()
+               for name in [table, *archives])
+
+
+def _rebuild(autoincrement):
+    connection = op.get_bind()
+    for table in TABLES:
+        highest = _highest_id(connection, table)
+        with op.batch_alter_table(table, recreate='always', table_kwargs={'sqlite_autoincrement': autoincrement}):
+            pass
+        if connection.dialect.name != 'sqlite':
+            continue
+        for statement in TRIGGERS[table]:
+            op.execute(statement)
+        if autoincrement:
+            # The copy into the new table set the sequence to the highest live ID.
+            op.execute(sa.text("UPDATE sqlite_sequence SET seq = max(seq, :highest) WHERE name = :table")
+                       .bindparams(highest=highest, table=table))
+            op.execute(sa.text("INSERT INTO sqlite_sequence (name, seq) SELECT :table, :highest "
+                               "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = :table)")
+                       .bindparams(highest=highest, table=table))
+
+
+def upgrade() -> None:
+    _rebuild(autoincrement=True)
+
+
+def downgrade() -> None:
+    _rebuild(autoincrement=False)
@@ -0,0 +1,47 @@
+import os
+import tempfile
+
+# Point the package at a scratch database before anything imports it:
+# veterinary.db reads the URL once, at import time.
+SCRATCH = tempfile.mkdtemp(prefix="veterinary-tests-")
+os.environ["VETERINARY_DATABASE_URL"] = f"sqlite:///{os.path.join(SCRATCH, 'veterinary.db')}"
+for name in ("VETERINARY_CLINIC", "VETERINARY_METRICS_FILE", "VETERINARY_CACHE_FILE", "VETERINARY_REMINDER_SINK"):
+    os.environ.pop(name, None)
+
+import pytest
+from alembic import command
+from alembic.config import Config
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def migrate(url):
+    """Run every migration on the database at `url`."""
+    from veterinary import db
+    config = Config(os.path.join(ROOT, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(ROOT, "migrations"))
+    # migrations/env.py takes the URL from veterinary.db.
+    default, db.DATABASE_URL = db.DATABASE_URL, url
+    try:
+        command.upgrade(config, "head")
+    finally:
+        db.DATABASE_URL = default
+
+@pytest.fixture(scope="session")
+def seeded():
+    """The shared engine, on a migrated database filled by the seeder."""
+    from veterinary.db import DATABASE_URL, get_engine
+    from veterinary.seed import seed_database
+    migrate(DATABASE_URL)
+    engine = get_engine()
+    seed_database(engine, appointments=600)
+    return engine
+
+@pytest.fixture
+def empty_engine(tmp_path):
+    """An engine on a new migrated database with no rows."""
+    from veterinary.db import create_db_engine
+    url = f"sqlite:///{tmp_path / 'veterinary.db'}"
+    migrate(url)
+    engine = create_db_engine(url)
+    yield engine
+    engine.dispose()
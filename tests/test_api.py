@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiosqlite")
+
+from veterinary.api import MAX_PAGE_SIZE, Api, HTTPError, create_async_db_engine
+from veterinary.loadtest import _max_id
+from veterinary.models import Client
+
+def add_clients(engine, count):
+    with engine.begin() as connection:
+        connection.execute(Client.__table__.insert(), [
+            {'name': f"Client {i}", 'email': f"client{i}@example.com", 'phone': f"phone-{i}"} for i in range(count)])
+
+def with_api(engine, work):
+    async def main():
+        async_engine = create_async_db_engine(engine.url.render_as_string(hide_password=False))
+        try:
+            return await work(Api(async_engine))
+        finally:
+            await async_engine.dispose()
+    return asyncio.run(main())
+
+def test_list_page_size_is_bounded(empty_engine):
+    add_clients(empty_engine, MAX_PAGE_SIZE + 5)
+
+    async def work(api):
+        _, first = await api.dispatch('GET', '/clients?limit=1', b'')
+        _, largest = await api.dispatch('GET', f'/clients?limit={MAX_PAGE_SIZE + 1}', b'')
+        errors = []
+        for query in ('limit=0', 'limit=-1', 'limit=ten', 'after_id=1.5'):
+            with pytest.raises(HTTPError) as raised:
+                await api.dispatch('GET', f'/clients?{query}', b'')
+            errors.append(raised.value.status)
+        return first, largest, errors
+
+    first, largest, errors = with_api(empty_engine, work)
+    assert len(first['items']) == 1 and first['next_after_id'] == first['items'][0]['id']
+    assert len(largest['items']) == MAX_PAGE_SIZE
+    assert errors == [400] * 4
+
+def test_load_test_finds_ids_past_the_first_page(empty_engine):
+    add_clients(empty_engine, MAX_PAGE_SIZE + 5)
+
+    async def work(api):
+        server = await asyncio.start_server(api.handle_connection, '127.0.0.1', 0)
+        async with server:
+            port = server.sockets[0].getsockname()[1]
+            return await _max_id('127.0.0.1', port, '/clients')
+
+    assert with_api(empty_engine, work) == MAX_PAGE_SIZE + 5
@@ -0,0 +1,63 @@
+from datetime import date
+
+from sqlalchemy import func, select
+
+from veterinary.archive import archive_before, archive_table
+from veterinary.exporter import export_tables
+from veterinary.models import Animal, Appointment, Client, Prescription
+from veterinary.purge import purge_appointments_before
+
+def add_rows(engine, day):
+    with engine.begin() as connection:
+        animal_id = connection.execute(select(Animal.id)).scalar()
+        connection.execute(Appointment.__table__.insert(), [
+            {'date': day, 'reason': 'Checkup', 'client_id': 1, 'animal_id': animal_id} for _ in range(3)])
+        connection.execute(Prescription.__table__.insert(), [
+            {'medication': 'Amoxicillin', 'dosage': '50 mg', 'date': day, 'animal_id': animal_id} for _ in range(3)])
+
+def add_owner(engine):
+    with engine.begin() as connection:
+        connection.execute(Client.__table__.insert(), {'id': 1, 'name': 'Archive', 'email': 'archive@example.com',
+                                                       'phone': 'archive-1'})
+        connection.execute(Animal.__table__.insert(), {'name': 'Bella', 'species': 'Dog', 'breed': 'Beagle',
+                                                       'age': 3, 'owner_id': 1})
+
+def test_archived_ids_are_not_reused(empty_engine):
+    add_owner(empty_engine)
+    cutoff = date(2021, 1, 1)
+    add_rows(empty_engine, date(2020, 5, 1))
+    archive_before(empty_engine, 'appointments', cutoff)
+    archive_before(empty_engine, 'prescriptions', cutoff)
+
+    add_rows(empty_engine, date(2020, 6, 1))
+    with empty_engine.connect() as connection:
+        for model in (Appointment, Prescription):
+            archived = archive_table(model.__tablename__, 2020)
+            assert (connection.execute(select(func.min(model.id))).scalar()
+                    > connection.execute(select(func.max(archived.c.id))).scalar())
+
+    assert archive_before(empty_engine, 'appointments', cutoff) == {'appointments_archive_2020': 3}
+    assert archive_before(empty_engine, 'prescriptions', cutoff) == {'prescriptions_archive_2020': 3}
+
+def test_export_includes_archived_rows(empty_engine, tmp_path):
+    add_owner(empty_engine)
+    add_rows(empty_engine, date(2020, 5, 1))
+    add_rows(empty_engine, date(2024, 5, 1))
+    archive_before(empty_engine, 'appointments', date(2021, 1, 1))
+    archive_before(empty_engine, 'prescriptions', date(2021, 1, 1))
+
+    exported = export_tables(empty_engine, ['appointments', 'prescriptions'], tmp_path)
+    assert [count for _, count in exported] == [6, 6]
+    exported = export_tables(empty_engine, ['appointments', 'prescriptions'], tmp_path, since=date(2024, 1, 1))
+    assert [count for _, count in exported] == [3, 6]
+
+def test_purge_reaches_archived_appointments(empty_engine):
+    add_owner(empty_engine)
+    add_rows(empty_engine, date(2020, 5, 1))
+    add_rows(empty_engine, date(2024, 5, 1))
+    archive_before(empty_engine, 'appointments', date(2021, 1, 1))
+
+    assert purge_appointments_before(empty_engine, date(2024, 1, 1)) == 3
+    with empty_engine.connect() as connection:
+        assert connection.execute(select(func.count()).select_from(archive_table('appointments', 2020))).scalar() == 0
+        assert connection.execute(select(func.count()).select_from(Appointment)).scalar() == 3
@@ -0,0 +1,53 @@
+from click.testing import CliRunner
+from sqlalchemy import func, select
+
+from veterinary import cli as cli_module, db, exporter, importer
+from veterinary.cli import cli
+from veterinary.models import Appointment, Client
+
+def count(engine, model):
+    with engine.connect() as connection:
+        return connection.execute(select(func.count()).select_from(model)).scalar()
+
+def first_ids(engine):
+    with engine.connect() as connection:
+        return connection.execute(select(Appointment.client_id, Appointment.animal_id, Appointment.veterinarian_id)
+                                  .where(Appointment.animal_id.is_not(None), Appointment.veterinarian_id.is_not(None))
+                                  .limit(1)).one()
+
+def test_choices_mirror_the_modules_they_stand_in_for():
+    assert sorted(cli_module.TABLES) == sorted(exporter.TABLES)
+    assert cli_module.ENTITIES == importer.ENTITIES
+    assert cli_module.FORMATS == exporter.FORMATS
+    assert cli_module.CLINIC_NAME.pattern == db.CLINIC_NAME.pattern
+
+def test_delete_of_a_missing_row_exits_non_zero(seeded):
+    result = CliRunner().invoke(cli, ['delete-client', '--id', '999999999'])
+    assert result.exit_code == 1
+    assert "Client not found." in result.output
+
+def test_booking_conflict_exits_non_zero(seeded):
+    client_id, animal_id, vet_id = first_ids(seeded)
+    book = ['add-appointment', '--date', '2999-03-01', '--start-time', '09:00', '--reason', 'Checkup', '--duration', '30',
+            '--client-id', str(client_id), '--animal-id', str(animal_id), '--veterinarian-id', str(vet_id)]
+    runner = CliRunner()
+    assert runner.invoke(cli, book).exit_code == 0
+    result = runner.invoke(cli, book)
+    assert result.exit_code == 1
+    assert "Appointment not added." in result.output
+
+def test_batch_rolls_back_and_stops_at_a_rejected_operation(seeded, tmp_path):
+    client_id, animal_id, vet_id = first_ids(seeded)
+    book = (f"add-appointment --date 2999-04-01 --start-time 10:00 --reason Checkup --duration 30 "
+            f"--client-id {client_id} --animal-id {animal_id} --veterinarian-id {vet_id}\n")
+    script = tmp_path / "script.txt"
+    script.write_text("add-client --name Batch --email batch@example.com --phone batch-1\n"
+                      + book + book +
+                      "add-client --name Never --email never@example.com --phone batch-2\n")
+    clients, appointments = count(seeded, Client), count(seeded, Appointment)
+
+    result = CliRunner().invoke(cli, ['batch', str(script)])
+    assert result.exit_code == 1
+    assert "Line 3: add-appointment failed: Appointment not added." in result.output
+    assert "Rolled back 2 uncommitted operation(s)." in result.output
+    assert (count(seeded, Client), count(seeded, Appointment)) == (clients, appointments)
@@ -0,0 +1,18 @@
+from datetime import datetime
+
+import pytest
+
+from veterinary.exporter import TABLES, export_tables
+from veterinary.models import ReminderJob
+
+def test_parquet_round_trips_every_table(empty_engine, tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    due_at = datetime(2030, 5, 1, 9, 30)
+    with empty_engine.begin() as connection:
+        connection.execute(ReminderJob.__table__.insert(), {'kind': 'refill', 'due_at': due_at, 'status': 'pending',
+                                                            'attempts': 0})
+
+    exported = dict(zip(TABLES, export_tables(empty_engine, TABLES, tmp_path, fmt='parquet')))
+    path, count = exported['reminder_jobs']
+    assert count == 1
+    assert pq.read_table(path).to_pylist()[0]['due_at'] == due_at
@@ -0,0 +1,93 @@
+import json
+from sqlalchemy import func, select, text
+from sqlalchemy.orm import Session
+
+from veterinary.importer import Importer, RejectWriter, read_rows
+from veterinary.models import Client
+from veterinary.search import search
+
+def triggers(engine):
+    with engine.connect() as connection:
+        return connection.execute(text("SELECT name, sql FROM sqlite_master WHERE type = 'trigger' ORDER BY name")).all()
+
+def import_file(engine, entity, path, reject=None):
+    with Session(engine) as session:
+        return Importer(session, entity, reject or (lambda row, reason: None)).run(read_rows(str(path)))
+
+def test_malformed_jsonl_lines_are_rejected_and_the_rest_imported(empty_engine, tmp_path):
+    path = tmp_path / "clients.jsonl"
+    path.write_text(
+        '{"name": "Ann", "email": "ann@example.com", "phone": "1"}\n'
+        '{"name": "Bob", "email": \n'
+        '\n'
+        '["not", "an", "object"]\n'
+        '{"name": "Cat", "email": "cat@example.com", "phone": "2"}\n'
+    )
+    reject = RejectWriter(str(tmp_path / "rejects.jsonl"))
+    with Session(empty_engine) as session:
+        inserted = Importer(session, 'clients', reject).run(read_rows(str(path)))
+        reject.close()
+        assert inserted == 2
+        assert session.execute(select(func.count()).select_from(Client)).scalar() == 2
+
+    rejects = [json.loads(line) for line in (tmp_path / "rejects.jsonl").read_text().splitlines()]
+    assert [record['row']['line'] for record in rejects] == [2, 4]
+    assert rejects[0]['row']['text'] == '{"name": "Bob", "email": '
+    assert rejects[0]['reason'].startswith("line 2: invalid JSON")
+    assert rejects[1]['reason'] == "line 4: not a JSON object"
+
+def test_bulk_import_keeps_the_search_index_summaries_reminders_and_change_log_current(empty_engine, tmp_path):
+    before = triggers(empty_engine)
+    clients = tmp_path / "clients.jsonl"
+    clients.write_text("".join(json.dumps({'name': f'Owner {i}', 'email': f'owner{i}@example.com', 'phone': str(i)}) + "\n"
+                               for i in range(3)))
+    animals = tmp_path / "animals.jsonl"
+    animals.write_text(json.dumps({'name': 'Scooby', 'species': 'dog', 'owner_email': 'owner1@example.com'}) + "\n")
+    appointments = tmp_path / "appointments.jsonl"
+    appointments.write_text("".join(json.dumps({'date': f'2999-05-0{day}', 'start_time': '09:00', 'end_time': '09:45',
+                                                'reason': 'Vaccination', 'client_email': 'owner1@example.com',
+                                                'animal_name': 'Scooby'}) + "\n" for day in (1, 1, 2)))
+    assert import_file(empty_engine, 'clients', clients) == 3
+    assert import_file(empty_engine, 'animals', animals) == 1
+    assert import_file(empty_engine, 'appointments', appointments) == 3
+
+    assert triggers(empty_engine) == before
+    with empty_engine.connect() as connection:
+        assert {kind for kind, _, _ in search(connection, 'owner')} == {'client'}
+        assert [kind for kind, _, _ in search(connection, 'vaccination')] == ['appointment'] * 3
+        assert connection.execute(text(
+            "SELECT day, appointments, minutes FROM appointment_daily_stats ORDER BY day")).all() == [
+            ('2999-05-01', 2, 90), ('2999-05-02', 1, 45)]
+        assert connection.execute(text(
+            "SELECT kind, count(*) FROM reminder_jobs GROUP BY kind ORDER BY kind")).all() == [
+            ('appointment-reminder', 3), ('follow-up', 3)]
+        assert connection.execute(text(
+            "SELECT table_name, count(*) FROM change_log WHERE operation = 'insert' GROUP BY 1 ORDER BY 1")).all() == [
+            ('animals', 1), ('appointments', 3), ('clients', 3)]
+
+def test_a_rejected_batch_is_retried_row_by_row_with_the_triggers_in_place(empty_engine, tmp_path):
+    before = triggers(empty_engine)
+    path = tmp_path / "clients.jsonl"
+    path.write_text('{"name": "Ann", "email": "ann@example.com", "phone": "1"}\n')
+    assert import_file(empty_engine, 'clients', path) == 1
+    with empty_engine.begin() as connection:
+        # A row the importer's lookup maps didn't see, so the batch hits the UNIQUE constraint.
+        connection.execute(text("INSERT INTO clients (name, email, phone) VALUES ('Bob', 'bob@example.com', '2')"))
+    path.write_text('{"name": "Cat", "email": "cat@example.com", "phone": "3"}\n'
+                    '{"name": "Bob", "email": "other@example.com", "phone": "2"}\n')
+    with Session(empty_engine) as session:
+        importer = Importer(session, 'clients', lambda row, reason: None)
+        importer.phones.discard('2')
+        assert importer.run(read_rows(str(path))) == 1
+
+    assert triggers(empty_engine) == before
+    with empty_engine.connect() as connection:
+        assert sorted(connection.execute(text("SELECT title FROM search_index")).scalars()) == ['Ann', 'Bob', 'Cat']
+
+def test_animal_ids_are_known_when_an_owner_has_two_animals_of_the_same_name(empty_engine, tmp_path):
+    with empty_engine.begin() as connection:
+        connection.execute(text("INSERT INTO clients (id, name, email, phone) VALUES (1, 'Ann', 'ann@example.com', '1')"))
+        connection.execute(text("INSERT INTO animals (id, name, species, owner_id) VALUES (1, 'Rex', 'dog', 1), (2, 'Rex', 'dog', 1)"))
+    path = tmp_path / "prescriptions.jsonl"
+    path.write_text("".join(json.dumps({'medication': 'Carprofen', 'dosage': '2 mg', 'animal_id': id}) + "\n" for id in (1, 2)))
+    assert import_file(empty_engine, 'prescriptions', path) == 2
@@ -0,0 +1,23 @@
+import pytest
+from click.testing import CliRunner
+from sqlalchemy import event
+
+from veterinary.cli import cli
+
+def count_statements(engine, args):
+    statements = []
+    listener = lambda conn, cursor, statement, *rest: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        result = CliRunner().invoke(cli, args)
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    assert result.exit_code == 0, result.output
+    return len(statements), result.output.count("ID: ")
+
+@pytest.mark.parametrize("command", ["list-animals", "list-appointments", "list-prescriptions"])
+def test_list_statement_count_does_not_grow_with_rows(seeded, command):
+    few, few_rows = count_statements(seeded, [command, "--limit", "5"])
+    many, many_rows = count_statements(seeded, [command, "--limit", "500"])
+    assert many_rows > few_rows
+    assert many == few
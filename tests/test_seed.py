@@ -0,0 +1,24 @@
+import pytest
+from sqlalchemy import text
+
+from veterinary.seed import Seeder, seed_database
+
+def schema(engine):
+    with engine.connect() as connection:
+        return connection.execute(text("SELECT type, name, sql FROM sqlite_master ORDER BY name")).all()
+
+def test_failed_seed_keeps_the_triggers_and_search_index(empty_engine, monkeypatch):
+    before = schema(empty_engine)
+    run = Seeder.run
+
+    def fail(self):
+        run(self)
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(Seeder, 'run', fail)
+    with pytest.raises(RuntimeError):
+        seed_database(empty_engine, appointments=50)
+    assert schema(empty_engine) == before
+    assert sum(row.type == 'trigger' for row in before) > 0
+    with empty_engine.connect() as connection:
+        assert connection.execute(text("SELECT count(*) FROM clients")).scalar() == 0
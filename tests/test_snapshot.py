@@ -0,0 +1,26 @@
+from datetime import date
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from sqlalchemy.orm import Session
+
+from veterinary.archive import archive_before
+from veterinary.seed import seed_database
+from veterinary.snapshot import load_snapshot, refresh_snapshot, summarize, summarize_with_orm
+
+def test_archived_rows_stay_in_the_snapshot(empty_engine, tmp_path):
+    seed_database(empty_engine, appointments=400, start_date=date(2020, 1, 1))
+    directory = tmp_path / "snapshot"
+    refresh_snapshot(empty_engine, directory)
+    before = summarize(load_snapshot(directory), top=None)
+
+    assert archive_before(empty_engine, 'appointments', date(2020, 6, 1))
+    assert archive_before(empty_engine, 'prescriptions', date(2020, 6, 1))
+    changes = refresh_snapshot(empty_engine, directory)
+    assert not any(rebuilt for _, rebuilt in changes.values())
+    after = summarize(load_snapshot(directory), top=None)
+    assert after == before
+    with Session(empty_engine) as session:
+        assert summarize_with_orm(session, top=None) == after
@@ -0,0 +1,32 @@
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HELP = """
+import runpy, sys
+sys.argv = ['veterinary.cli', '--help']
+try:
+    runpy.run_module('veterinary.cli', run_name='__main__', alter_sys=True)
+except SystemExit:
+    pass
+print(','.join(sorted(name for name in sys.modules if name.split('.')[0] in ('sqlalchemy', 'alembic'))))
+"""
+
+def run_python(code):
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return time.perf_counter() - started, result.stdout
+
+def test_help_does_not_import_sqlalchemy():
+    _, output = run_python(HELP)
+    assert "Usage:" in output
+    assert output.splitlines()[-1] == ""
+
+def test_help_starts_about_as_fast_as_bare_click():
+    # Best of several runs, to keep a busy machine from failing the test.
+    click_only = min(run_python("import click")[0] for _ in range(3))
+    cli_help = min(run_python(HELP)[0] for _ in range(3))
+    assert cli_help - click_only < 0.15
@@ -0,0 +1,200 @@
+import asyncio
+import json
+from datetime import date, time
+from urllib.parse import urlsplit, parse_qs
+from sqlalchemy import select, Date, Time
+from sqlalchemy.exc import IntegrityError
+from .db import DATABASE_URL, apply_sqlite_pragmas, engine_options
+from .models import Client, Veterinarian, Specialization, Animal, Appointment, Prescription
+from .scheduler import BookingConflict, book
+
+# A small HTTP/1.1 JSON service over the models, built on asyncio streams and
+# SQLAlchemy's async engine (aiosqlite for SQLite):
+#
+#   GET    /<resource>?limit=&after_id=   keyset-paginated list
+#   GET    /<resource>/<id>
+#   POST   /<resource>                    create from a JSON object
+#   DELETE /<resource>/<id>
+
+RESOURCES = {
+    'clients': Client.__table__,
+    'veterinarians': Veterinarian.__table__,
+    'specializations': Specialization.__table__,
+    'animals': Animal.__table__,
+    'appointments': Appointment.__table__,
+    'prescriptions': Prescription.__table__,
+}
+
+MAX_PAGE_SIZE = 1000
+
+REASONS = {200: 'OK', 201: 'Created', 204: 'No Content', 400: 'Bad Request', 404: 'Not Found',
+           405: 'Method Not Allowed', 409: 'Conflict', 500: 'Internal Server Error'}
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+def async_url(url):
+    """Swap a sync SQLite URL onto the aiosqlite driver."""
+    if url.startswith("sqlite:"):
+        return "sqlite+aiosqlite:" + url[len("sqlite:"):]
+    return url
+
+def create_async_db_engine(url=None, pool_size=None, **kwargs):
+    # Imported here so the sync CLI never needs aiosqlite installed.
+    from sqlalchemy.ext.asyncio import create_async_engine
+    engine = create_async_engine(async_url(url or DATABASE_URL), **engine_options(pool_size, **kwargs))
+    apply_sqlite_pragmas(engine.sync_engine)
+    return engine
+
+def _json_default(value):
+    if isinstance(value, (date, time)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def _coerce(table, data):
+    """Validate a JSON object against the table's columns and convert dates/times."""
+    if not isinstance(data, dict):
+        raise HTTPError(400, "Request body must be a JSON object.")
+    unknown = set(data) - {column.name for column in table.columns if column.name != 'id'}
+    if unknown:
+        raise HTTPError(400, f"Unknown fields: {', '.join(sorted(unknown))}.")
+    values = {}
+    for name, value in data.items():
+        column_type = table.c[name].type
+        try:
+            if value is not None and isinstance(column_type, Date):
+                value = date.fromisoformat(value)
+            elif value is not None and isinstance(column_type, Time):
+                value = time.fromisoformat(value)
+        except (TypeError, ValueError):
+            raise HTTPError(400, f"Invalid value for {name}: {value!r}.")
+        values[name] = value
+    return values
+
+class Api:
+    def __init__(self, engine):
+        self.engine = engine
+
+    async def list(self, table, params):
+        try:
+            limit = min(int(params.get('limit', 100)), MAX_PAGE_SIZE)
+            after_id = int(params.get('after_id', 0))
+        except ValueError:
+            raise HTTPError(400, "limit and after_id must be integers.")
+        # SQLite reads a negative LIMIT as no limit at all.
+        if limit < 1:
+            raise HTTPError(400, f"limit must be between 1 and {MAX_PAGE_SIZE}.")
+        query = select(table).where(table.c.id > after_id).order_by(table.c.id).limit(limit)
+        async with self.engine.connect() as connection:
+            items = [dict(row) for row in (await connection.execute(query)).mappings()]
+        next_after_id = items[-1]['id'] if len(items) == limit else None
+        return 200, {'items': items, 'next_after_id': next_after_id}
+
+    async def get(self, table, id):
+        async with self.engine.connect() as connection:
+            row = (await connection.execute(select(table).where(table.c.id == id))).mappings().first()
+        if row is None:
+            raise HTTPError(404, "Not found.")
+        return 200, dict(row)
+
+    async def create(self, table, body):
+        try:
+            values = _coerce(table, json.loads(body or b'null'))
+        except json.JSONDecodeError:
+            raise HTTPError(400, "Request body must be JSON.")
+        try:
+            async with self.engine.begin() as connection:
+                if table is Appointment.__table__ and values.get('start_time') and values.get('end_time'):
+                    id = await connection.run_sync(lambda sync_connection: book(sync_connection, **values))
+                else:
+                    id = (await connection.execute(table.insert().values(**values))).inserted_primary_key[0]
+        except BookingConflict as e:
+            raise HTTPError(409, str(e))
+        except IntegrityError as e:
+            raise HTTPError(409, str(e.orig))
+        except (TypeError, ValueError) as e:
+            raise HTTPError(400, str(e))
+        return 201, dict(values, id=id)
+
+    async def delete(self, table, id):
+        async with self.engine.begin() as connection:
+            result = await connection.execute(table.delete().where(table.c.id == id))
+        if result.rowcount == 0:
+            raise HTTPError(404, "Not found.")
+        return 204, None
+
+    async def dispatch(self, method, target, body):
+        url = urlsplit(target)
+        parts = [part for part in url.path.split('/') if part]
+        if not parts or parts[0] not in RESOURCES or len(parts) > 2:
+            raise HTTPError(404, "Unknown resource.")
+        table = RESOURCES[parts[0]]
+        if len(parts) == 1:
+            if method == 'GET':
+                params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+                return await self.list(table, params)
+            if method == 'POST':
+                return await self.create(table, body)
+        else:
+            try:
+                id = int(parts[1])
+            except ValueError:
+                raise HTTPError(404, "Not found.")
+            if method == 'GET':
+                return await self.get(table, id)
+            if method == 'DELETE':
+                return await self.delete(table, id)
+        raise HTTPError(405, "Method not allowed.")
+
+    async def handle_connection(self, reader, writer):
+        """Serve requests on one keep-alive connection until the client closes it."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, version = request_line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length', 0))
+                body = await reader.readexactly(length) if length else b''
+
+                try:
+                    status, payload = await self.dispatch(method, target, body)
+                except HTTPError as e:
+                    status, payload = e.status, {'error': str(e)}
+                except Exception as e:
+                    status, payload = 500, {'error': f"{type(e).__name__}: {e}"}
+
+                data = json.dumps(payload, default=_json_default).encode() if payload is not None else b''
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                writer.write(
+                    f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1') + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+async def serve(host='127.0.0.1', port=8000, url=None, pool_size=None):
+    engine = create_async_db_engine(url, pool_size)
+    api = Api(engine)
+    server = await asyncio.start_server(api.handle_connection, host, port, backlog=1024)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await engine.dispose()
@@ -0,0 +1,140 @@
+import re
+from datetime import date, timedelta
+from sqlalchemy import Column, Index, MetaData, Table, func, inspect, select, union_all
+from .models import Appointment, Prescription
+from .stats import create_stats_triggers, has_stats
+
+# Appointments and prescriptions older than a cutoff can be moved out of the
+# live tables into one archive table per table and year (for example
+# appointments_archive_2019), so the live tables only hold recent rows.
+# Archive tables have the live table's columns but no foreign keys: they are
+# history, kept even if the client or animal is later deleted.
+#
+# Readers go through source_for(), which adds an archive table to a query
+# only when the requested date range reaches into its year.
+
+ARCHIVED = {
+    'appointments': Appointment.__table__,
+    'prescriptions': Prescription.__table__,
+}
+
+archive_metadata = MetaData()
+
+def archive_table_name(name, year):
+    return f"{name}_archive_{year}"
+
+_ARCHIVE_NAME = re.compile(r"^(\w+)_archive_(\d{4})$")
+
+def archive_table(name, year):
+    """The Table for one year's archive of a live table."""
+    table_name = archive_table_name(name, year)
+    if table_name in archive_metadata.tables:
+        return archive_metadata.tables[table_name]
+    columns = [Column(column.name, column.type, primary_key=column.primary_key, nullable=column.nullable)
+               for column in ARCHIVED[name].columns]
+    return Table(table_name, archive_metadata, *columns, Index(f"ix_{table_name}_date", 'date'))
+
+def archived_years(connection, name):
+    """Years that have an archive table for `name`, oldest first."""
+    years = []
+    for table_name in inspect(connection).get_table_names():
+        match = _ARCHIVE_NAME.match(table_name)
+        if match and match.group(1) == name:
+            years.append(int(match.group(2)))
+    return sorted(years)
+
+def parse_archive_table_name(table_name):
+    """(live table name, year) for an archive table's name, or None."""
+    match = _ARCHIVE_NAME.match(table_name)
+    if match is None or match.group(1) not in ARCHIVED:
+        return None
+    return match.group(1), int(match.group(2))
+
+def create_archive_table(connection, name, year):
+    """Create one year's archive table of `name` if missing, with its triggers."""
+    from .changes import create_change_triggers, has_change_log
+    target = archive_table(name, year)
+    target.create(connection, checkfirst=True)
+    # Rows moved in are counted here as they are uncounted from the live
+    # table, so the daily summaries still include them, and logged so
+    # that synced copies keep them too.
+    if has_stats(connection):
+        create_stats_triggers(connection, target.name, name)
+    if has_change_log(connection):
+        create_change_triggers(connection, target)
+    return target
+
+def _move_chunks(engine, source, target, start, end, chunk_size, progress):
+    # The same ordered LIMIT subquery picks the rows to copy and then to
+    # delete, inside one transaction, so each chunk moves atomically.
+    chunk = (select(source.c.id)
+             .where(source.c.date >= start, source.c.date < end)
+             .order_by(source.c.id).limit(chunk_size))
+    columns = [column.name for column in source.columns]
+    moved = 0
+    while True:
+        with engine.begin() as connection:
+            connection.execute(target.insert().from_select(columns, select(source).where(source.c.id.in_(chunk))))
+            count = connection.execute(source.delete().where(source.c.id.in_(chunk))).rowcount
+        moved += count
+        if progress and count:
+            progress(target.name, moved)
+        if count < chunk_size:
+            return moved
+
+def archive_before(engine, name, cutoff, chunk_size=5000, progress=None):
+    """Move rows of `name` dated before `cutoff` into yearly archive tables.
+
+    Each chunk of `chunk_size` rows is copied and deleted in its own short
+    transaction. Rows without a date stay in the live table. Returns the
+    number of rows moved per archive table.
+    """
+    source = ARCHIVED[name]
+    with engine.connect() as connection:
+        first = connection.execute(select(func.min(source.c.date))).scalar()
+    if first is None or first >= cutoff:
+        return {}
+    moved = {}
+    for year in range(first.year, cutoff.year + 1):
+        start, end = date(year, 1, 1), min(date(year + 1, 1, 1), cutoff)
+        if start >= end:
+            continue
+        with engine.begin() as connection:
+            target = create_archive_table(connection, name, year)
+        count = _move_chunks(engine, source, target, start, end, chunk_size, progress)
+        if count:
+            moved[target.name] = count
+    return moved
+
+def tables_for(connection, name, start=None, end=None):
+    """The live table plus the archive tables overlapping [start, end)."""
+    tables = [ARCHIVED[name]]
+    for year in archived_years(connection, name):
+        if (start is None or start < date(year + 1, 1, 1)) and (end is None or end > date(year, 1, 1)):
+            tables.append(archive_table(name, year))
+    return tables
+
+def source_for(connection, name, start=None, end=None):
+    """A selectable with the live table's columns holding every row of `name` in [start, end).
+
+    Without archive tables in range (the usual case for recent dates) this is
+    the live table itself, or a filtered subquery of it, so its indexes are
+    used as before; otherwise it is a UNION ALL over the tables involved.
+    """
+    tables = tables_for(connection, name, start, end)
+    if len(tables) == 1 and start is None and end is None:
+        return tables[0]
+    selects = []
+    for table in tables:
+        query = select(*table.columns)
+        if start is not None:
+            query = query.where(table.c.date >= start)
+        if end is not None:
+            query = query.where(table.c.date < end)
+        selects.append(query)
+    combined = selects[0] if len(selects) == 1 else union_all(*selects)
+    return combined.subquery(name)
+
+def date_range(first=None, last=None):
+    """[start, end) bounds for an inclusive range of days; either may be None."""
+    return first, (last + timedelta(days=1) if last else None)
@@ -0,0 +1,446 @@
+import importlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+from datetime import date, datetime, timedelta, timezone
+from sqlalchemy import event, func, select, text
+
+# Benchmarks for the CLI's list-*, add-* and delete-* commands, run
+# in-process against the configured database. Each scenario is invoked
+# `repeat` times; the JSON report records latency, SQL statement count and
+# peak Python memory per scenario, along with the commit and row counts, so
+# reports from different commits can be compared with compare_reports().
+
+class StatementCounter:
+    """Counts statements executed on an engine while attached."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _count(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        self.count = 0
+        event.listen(self.engine, "before_cursor_execute", self._count)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(self.engine, "before_cursor_execute", self._count)
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _max_id(session, model):
+    return session.query(func.max(model.id)).scalar() or 0
+
+def _added_rows(session, stamp, after):
+    """{model: IDs} of the rows the add scenarios created, newest first.
+
+    Found by their values and by ID past `after` ({model: highest ID
+    before the run}), since new IDs needn't follow the old maximum.
+    """
+    from .models import Client, Veterinarian, Specialization, Animal, Appointment, Prescription
+    markers = {
+        Appointment: Appointment.reason == 'Benchmark',
+        Prescription: Prescription.medication == 'Benchmark',
+        Animal: Animal.name == 'Bench',
+        Client: Client.email.like(f'bench.{stamp}.%'),
+        Veterinarian: Veterinarian.name == 'Dr. Bench',
+        Specialization: Specialization.name.like(f'Bench {stamp} %'),
+    }
+    return {model: list(session.execute(select(model.id).where(model.id > after[model], marker)
+                                        .order_by(model.id.desc())).scalars())
+            for model, marker in markers.items()}
+
+def _remove_added_rows(session, stamp, after):
+    """Delete whatever the add scenarios created that is still there, dependents first."""
+    for model, ids in _added_rows(session, stamp, after).items():
+        if ids:
+            session.execute(model.__table__.delete().where(model.id.in_(ids)))
+    session.commit()
+
+def scenarios(session, repeat, stamp, after):
+    """(name, argument lists, stdin) for every benchmarked command.
+
+    Add scenarios create `repeat` new rows with unique values; the matching
+    delete scenarios then remove exactly those rows, so a run leaves the
+    database as it found it. Their argument lists are a function, called
+    once the adds have run, as the new IDs are only known then.
+    """
+    from .models import Client, Veterinarian, Specialization, Animal, Appointment, Prescription
+    client_id, animal_id, vet_id = (session.execute(select(model.id).limit(1)).scalar() or 1
+                                    for model in (Client, Animal, Veterinarian))
+    # Bookings far in the future so they never collide with existing ones,
+    # 20 half-hour slots to a day.
+    year = 2900 + stamp % 90
+    day = lambda i: (date(year, 1, 1) + timedelta(days=stamp % 28 + i // 20)).isoformat()
+
+    def each(make):
+        return [make(i) for i in range(repeat)]
+
+    def deletes(command, model):
+        return lambda: [[command, '--id', str(id)] for id in _added_rows(session, stamp, after)[model]]
+
+    result = [(f'list-{name}', each(lambda i: [f'list-{name}']), None)
+              for name in ('clients', 'veterinarians', 'specializations', 'animals', 'appointments', 'prescriptions')]
+    result += [
+        ('list-appointments --limit 100', each(lambda i: ['list-appointments', '--limit', '100']), None),
+        ('add-client', each(lambda i: ['add-client', '--name', 'Bench Client', '--email', f'bench.{stamp}.{i}@example.com',
+                                       '--phone', f'bench-{stamp}-{i}']), None),
+        ('add-specialization', each(lambda i: ['add-specialization', '--name', f'Bench {stamp} {i}']), None),
+        ('add-veterinarian', each(lambda i: ['add-veterinarian', '--name', 'Dr. Bench', '--specializations', '']), None),
+        ('add-animal', each(lambda i: ['add-animal', '--name', 'Bench', '--species', 'dog', '--age', '3',
+                                       '--breed', 'Beagle', '--owner-id', str(client_id)]), None),
+        # The same command choosing the owner from the pick list.
+        ('add-animal (pick list)', each(lambda i: ['add-animal', '--name', 'Bench', '--species', 'dog', '--age', '3',
+                                                   '--breed', 'Beagle']), f"{client_id}\n"),
+        ('add-appointment', each(lambda i: ['add-appointment', '--date', day(i), '--start-time', f'{8 + i // 2 % 10:02d}:{i % 2 * 30:02d}',
+                                            '--reason', 'Benchmark', '--duration', '30', '--client-id', str(client_id),
+                                            '--animal-id', str(animal_id), '--veterinarian-id', str(vet_id)]), None),
+        ('add-prescription', each(lambda i: ['add-prescription', '--medication', 'Benchmark', '--dosage', '1 mg',
+                                             '--animal-id', str(animal_id)]), None),
+    ]
+    result += [
+        ('delete-appointment', deletes('delete-appointment', Appointment), None),
+        ('delete-prescription', deletes('delete-prescription', Prescription), None),
+        ('delete-animal', deletes('delete-animal', Animal), None),
+        ('delete-client', deletes('delete-client', Client), None),
+        ('delete-veterinarian', deletes('delete-veterinarian', Veterinarian), None),
+        ('delete-specialization', deletes('delete-specialization', Specialization), None),
+    ]
+    return result
+
+def _invoke(args, stdin):
+    from .cli import cli
+    old_stdin = sys.stdin
+    sys.stdin = io.StringIO(stdin or "")
+    try:
+        cli.main(args, standalone_mode=False)
+    finally:
+        sys.stdin = old_stdin
+
+def run_benchmarks(repeat=5):
+    """Run every scenario and return the report as a dict."""
+    from .db import session, get_engine, DATABASE_URL
+    from .models import Client, Veterinarian, Specialization, Animal, Appointment, Prescription
+    engine = get_engine()
+    rows = {model.__tablename__: session.query(func.count(model.id)).scalar()
+            for model in (Client, Veterinarian, Specialization, Animal, Appointment, Prescription)}
+    stamp = int(time.time() * 1000)
+    after = {model: _max_id(session, model) for model in (Client, Veterinarian, Specialization, Animal, Appointment, Prescription)}
+    selected = scenarios(session, repeat, stamp, after)
+    session.remove()
+
+    results = {}
+    try:
+        with open(os.devnull, 'w') as devnull:
+            _run_scenarios(engine, selected, devnull, results)
+    finally:
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        # A scenario that failed part way would otherwise leave its rows behind.
+        _remove_added_rows(session, stamp, after)
+        session.remove()
+
+    return dict(new_report(), database=DATABASE_URL, rows=rows, scenarios=results)
+
+def _run_scenarios(engine, selected, devnull, results):
+    for name, runs, stdin in selected:
+        if callable(runs):
+            runs = runs()
+        if not runs:
+            continue
+        # The first run warms up imports and caches and is traced for
+        # memory; tracing slows Python down, so only later runs are timed
+        # and counted.
+        latencies, statements, peak = [], [], 0
+        for i, args in enumerate(runs):
+            with redirect_stdout(devnull), StatementCounter(engine) as counter:
+                if i == 0:
+                    tracemalloc.start()
+                started = time.perf_counter()
+                _invoke(args, stdin)
+                elapsed = time.perf_counter() - started
+                if i == 0:
+                    peak = tracemalloc.get_traced_memory()[1]
+                    tracemalloc.stop()
+            if i > 0 or len(runs) == 1:
+                latencies.append(elapsed)
+                statements.append(counter.count)
+        results[name] = {
+            'runs': len(runs),
+            'median_ms': statistics.median(latencies) * 1000,
+            'min_ms': min(latencies) * 1000,
+            'max_ms': max(latencies) * 1000,
+            'statements': max(statements),
+            'peak_memory_kb': peak / 1024,
+        }
+
+def new_report():
+    """The fields every report starts with."""
+    return {
+        'commit': _git_commit(),
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+    }
+
+# Smallest increase worth reporting for the noisy metrics. Statement counts
+# are deterministic, so any increase in those is reported.
+NOISE_FLOOR = {'median_ms': 5.0, 'peak_memory_kb': 64.0}
+
+def compare_reports(baseline, current, threshold=0.25):
+    """Scenarios that got slower, issued more statements or used more memory.
+
+    Returns (scenario, metric, before, after) tuples for every statement
+    count that went up, and every latency or memory figure that grew by more
+    than `threshold` (a fraction) and by more than its NOISE_FLOOR.
+    """
+    regressions = []
+    for name, after in current.get('scenarios', {}).items():
+        before = baseline.get('scenarios', {}).get(name)
+        if before is None:
+            continue
+        if after['statements'] > before['statements']:
+            regressions.append((name, 'statements', before['statements'], after['statements']))
+        for metric, floor in NOISE_FLOOR.items():
+            if after[metric] > before[metric] * (1 + threshold) and after[metric] - before[metric] > floor:
+                regressions.append((name, metric, before[metric], after[metric]))
+    return regressions
+
+# Separate scenarios, each run on scratch databases it creates itself.
+
+PAGINATE_SIZES = (10_000, 100_000, 1_000_000)
+
+def _fill_clients(engine, count):
+    with engine.begin() as connection:
+        connection.execute(text(
+            "INSERT INTO clients (name, email, phone) "
+            "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < :count) "
+            "SELECT 'Client ' || i, 'client' || i || '@example.com', 'phone-' || i FROM n"
+        ), {'count': count})
+
+def paginate_memory(sizes=PAGINATE_SIZES, batch_size=1000):
+    """Peak Python memory of streaming every client through paginate(), per table size.
+
+    A list command holds one batch of rows at a time, so the peak should
+    stay flat as the table grows.
+    """
+    from sqlalchemy.orm import Session
+    from .cli import paginate
+    from .db import create_db_engine
+    from .models import Base, Client
+    from .queries import client_rows
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            engine = create_db_engine(f"sqlite:///{os.path.join(directory, f'clients-{size}.db')}")
+            Base.metadata.create_all(engine)
+            _fill_clients(engine, size)
+            with Session(engine) as session:
+                # Compile the query and warm SQLAlchemy's caches untraced.
+                list(paginate(client_rows(session), Client.id, limit=1))
+                rows = 0
+                tracemalloc.start()
+                started = time.perf_counter()
+                for row in paginate(client_rows(session), Client.id, batch_size=batch_size):
+                    rows += 1
+                elapsed = time.perf_counter() - started
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            engine.dispose()
+            results[str(size)] = {'rows': rows, 'seconds': elapsed, 'peak_memory_kb': peak / 1024}
+    return results
+
+def _scratch_copy(directory):
+    """Copy the configured SQLite database into `directory` and return the copy's URL."""
+    from .db import get_engine
+    engine = get_engine()
+    if engine.dialect.name != 'sqlite':
+        raise ValueError("this scenario needs a SQLite database")
+    path = os.path.join(directory, 'scratch.db')
+    source = engine.raw_connection()
+    try:
+        with sqlite3.connect(path) as target:
+            source.driver_connection.backup(target)
+        target.close()
+    finally:
+        source.close()
+    return f"sqlite:///{path}"
+
+def _worker_main(job, url, busy_timeout, barrier, results, worker, args):
+    # A spawned process: point veterinary.db at the copy before it is imported.
+    os.environ['VETERINARY_DATABASE_URL'] = url
+    os.environ.pop('VETERINARY_CLINIC', None)
+    os.environ.pop('VETERINARY_METRICS_FILE', None)
+    if busy_timeout is not None:
+        os.environ['VETERINARY_BUSY_TIMEOUT'] = str(busy_timeout)
+    # Import the CLI and create the engine before the clock starts.
+    importlib.import_module(f'{__package__}.cli')
+    importlib.import_module(f'{__package__}.db').get_engine()
+    barrier.wait()
+    results.put(job(worker, *args))
+
+def _run_workers(job, url, workers, args, busy_timeout=None):
+    """Run job(worker, *args) in `workers` new processes started together; returns their results."""
+    context = multiprocessing.get_context('spawn')
+    barrier, results = context.Barrier(workers), context.Queue()
+    processes = [context.Process(target=_worker_main, args=(job, url, busy_timeout, barrier, results, worker, args))
+                 for worker in range(workers)]
+    for process in processes:
+        process.start()
+    collected = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return collected
+
+def _is_locked(error):
+    return 'database is locked' in str(getattr(error, 'orig', error))
+
+def _write_clients(worker, seconds):
+    import click
+    from sqlalchemy.exc import OperationalError
+    latencies, locked, failed = [], 0, 0
+    stamp = time.time_ns()
+    deadline = time.perf_counter() + seconds
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        i = 0
+        while time.perf_counter() < deadline:
+            i += 1
+            started = time.perf_counter()
+            try:
+                _invoke(['add-client', '--name', 'Writer', '--email', f'writer.{stamp}.{worker}.{i}@example.com',
+                         '--phone', f'writer-{stamp}-{worker}-{i}'], None)
+            except OperationalError as e:
+                if not _is_locked(e):
+                    raise
+                locked += 1
+            except click.ClickException:
+                failed += 1
+            else:
+                latencies.append(time.perf_counter() - started)
+    return {'latencies': latencies, 'locked': locked, 'failed': failed}
+
+def _summary(results, seconds):
+    from .loadtest import percentile
+    latencies = sorted(latency for result in results for latency in result['latencies'])
+    return {
+        'commits': len(latencies),
+        'commits_per_second': len(latencies) / seconds,
+        'locked': sum(result['locked'] for result in results),
+        'failed': sum(result['failed'] for result in results),
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+    }
+
+def concurrent_writers(writers=4, seconds=5.0, busy_timeout=None):
+    """Throughput of `writers` processes running add-client against a copy of the database.
+
+    Each commit is one write transaction, so the processes queue on
+    SQLite's single write lock; a writer that waits longer than the busy
+    timeout fails with "database is locked", which is counted.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        url = _scratch_copy(directory)
+        results = _run_workers(_write_clients, url, writers, (seconds,), busy_timeout)
+    return dict(_summary(results, seconds), writers=writers, seconds=seconds)
+
+SLOTS_PER_DAY = 20  # half-hour starts from 08:00 to 17:30
+
+def _book_slots(worker, day, vet_ids, client_id, animal_id, attempts):
+    import click
+    from sqlalchemy.exc import OperationalError
+    rng = random.Random(worker)
+    latencies, conflict_latencies, locked = [], [], 0
+    began = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        for _ in range(attempts):
+            slot = rng.randrange(SLOTS_PER_DAY)
+            args = ['add-appointment', '--date', day, '--start-time', f'{8 + slot // 2:02d}:{slot % 2 * 30:02d}',
+                    '--duration', str(rng.choice((30, 30, 60))), '--reason', 'Busy day',
+                    '--client-id', str(client_id), '--animal-id', str(animal_id),
+                    '--veterinarian-id', str(rng.choice(vet_ids))]
+            started = time.perf_counter()
+            try:
+                _invoke(args, None)
+            except OperationalError as e:
+                if not _is_locked(e):
+                    raise
+                locked += 1
+            except click.ClickException:
+                conflict_latencies.append(time.perf_counter() - started)
+            else:
+                latencies.append(time.perf_counter() - started)
+    return {'latencies': latencies, 'conflict_latencies': conflict_latencies, 'locked': locked, 'failed': 0,
+            'seconds': time.perf_counter() - began}
+
+def _double_bookings(engine, day):
+    with engine.connect() as connection:
+        return connection.execute(text(
+            "SELECT count(*) FROM appointments AS a JOIN appointments AS b "
+            "ON b.veterinarian_id = a.veterinarian_id AND b.date = a.date AND b.id > a.id "
+            "AND b.start_time < a.end_time AND a.start_time < b.end_time WHERE a.date = :day"
+        ), {'day': day}).scalar()
+
+def busy_booking_day(workers=4, vets=5, attempts=40, busy_timeout=None):
+    """Book one day's slots for `vets` vets from `workers` processes at once, on a copy of the database.
+
+    Each process makes `attempts` add-appointment calls for random vets,
+    slots and lengths, so many collide. Reports bookings and conflicts with
+    their latencies, and checks that no vet ended up double-booked.
+    """
+    from .loadtest import percentile
+    from .db import create_db_engine
+    from .models import Animal, Appointment, Veterinarian
+    with tempfile.TemporaryDirectory() as directory:
+        url = _scratch_copy(directory)
+        engine = create_db_engine(url)
+        with engine.connect() as connection:
+            vet_ids = connection.execute(select(Veterinarian.id).order_by(Veterinarian.id).limit(vets)).scalars().all()
+            animal = connection.execute(select(Animal.id, Animal.owner_id).where(Animal.owner_id.is_not(None)).limit(1)).first()
+            last = connection.execute(select(func.max(Appointment.date))).scalar()
+        if not vet_ids or animal is None:
+            engine.dispose()
+            raise ValueError("the busy day scenario needs veterinarians and an animal with an owner; seed the database first")
+        # The day after the last booking, so every slot starts out free.
+        day = ((last or date.today()) + timedelta(days=1)).isoformat()
+        results = _run_workers(_book_slots, url, workers, (day, vet_ids, animal.owner_id, animal.id, attempts), busy_timeout)
+        elapsed = max(result['seconds'] for result in results)
+        double_bookings = _double_bookings(engine, day)
+        engine.dispose()
+    summary = _summary(results, elapsed)
+    conflicts = sorted(latency for result in results for latency in result['conflict_latencies'])
+    return {
+        'workers': workers,
+        'vets': len(vet_ids),
+        'slots': len(vet_ids) * SLOTS_PER_DAY,
+        'attempts': workers * attempts,
+        'bookings': summary['commits'],
+        'conflicts': len(conflicts),
+        'locked': summary['locked'],
+        'double_bookings': double_bookings,
+        'attempts_per_second': workers * attempts / elapsed,
+        'p50_ms': summary['p50_ms'],
+        'p99_ms': summary['p99_ms'],
+        'conflict_p50_ms': percentile(conflicts, 0.50) * 1000,
+        'conflict_p99_ms': percentile(conflicts, 0.99) * 1000,
+    }
+
+def write_report(report, path):
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
@@ -0,0 +1,151 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+from .db import DATABASE_URL
+from .models import Client, Veterinarian, Specialization, Animal
+
+# Reference data shown in the add-* pick lists, cached as (id, name) rows so
+# rendering a list again costs no database work. Flushes that insert, update
+# or delete one of these models drop the matching entry; other processes'
+# writes are caught on load by comparing max(id) and, failing that, by the TTL.
+
+PICK_LISTS = {
+    'clients': Client,
+    'animals': Animal,
+    'veterinarians': Veterinarian,
+    'specializations': Specialization,
+}
+
+# Deleting a client cascades to their animals inside the database, where no
+# ORM event sees it.
+CASCADES = {'clients': ('animals',)}
+
+class LRUCache:
+    """Thread-safe LRU mapping whose entries expire `ttl` seconds after being set.
+
+    With a `path`, entries are loaded from and saved to a JSON file so they
+    survive between CLI runs; `stamp` is stored alongside each value so the
+    caller can tell whether a loaded entry still matches the database.
+    """
+
+    def __init__(self, maxsize=128, ttl=300, path=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._dirty = False
+        if path:
+            self.load()
+
+    def get(self, key):
+        """(value, stamp) for a live entry, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, stamp, expires = entry
+            if expires < time.time():
+                del self._entries[key]
+                self._dirty = True
+                return None
+            self._entries.move_to_end(key)
+            return value, stamp
+
+    def set(self, key, value, stamp=None):
+        with self._lock:
+            self._entries[key] = (value, stamp, time.time() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+            self._dirty = True
+
+    def invalidate(self, *keys):
+        """Drop the given entries, or every entry when no keys are given."""
+        with self._lock:
+            for key in keys or list(self._entries):
+                if self._entries.pop(key, None) is not None:
+                    self._dirty = True
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get('database') != DATABASE_URL:
+            return
+        now = time.time()
+        with self._lock:
+            for key, value, stamp, expires in data['entries']:
+                if expires > now:
+                    self._entries[key] = (value, stamp, expires)
+
+    def save(self):
+        """Write the entries to `path` if anything changed since loading."""
+        if not self.path or not self._dirty:
+            return
+        with self._lock:
+            entries = [[key, value, stamp, expires] for key, (value, stamp, expires) in self._entries.items()]
+            self._dirty = False
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'database': DATABASE_URL, 'entries': entries}, f)
+        os.replace(tmp_path, self.path)
+
+lookup_cache = LRUCache(
+    ttl=int(os.environ.get("VETERINARY_CACHE_TTL", 300)),
+    path=os.environ.get("VETERINARY_CACHE_FILE"),
+)
+
+# Pick lists already checked against the database in this process.
+_checked = set()
+
+def pick_list(session, name):
+    """(id, name) rows of a PICK_LISTS model, ordered by ID."""
+    model = PICK_LISTS[name]
+    cached = lookup_cache.get(name)
+    if cached is not None:
+        rows, stamp = cached
+        # An entry read from disk was filled by an earlier run; one indexed
+        # max(id) lookup shows whether rows were added since.
+        if name in _checked or stamp == session.query(func.max(model.id)).scalar():
+            _checked.add(name)
+            return [tuple(row) for row in rows]
+    rows = [tuple(row) for row in session.query(model.id, model.name).order_by(model.id)]
+    lookup_cache.set(name, rows, rows[-1][0] if rows else None)
+    _checked.add(name)
+    return rows
+
+def name_map(session, name):
+    """Map of ID to name for a PICK_LISTS model."""
+    return dict(pick_list(session, name))
+
+def _invalidate(mapper, connection, target):
+    for name, model in PICK_LISTS.items():
+        if isinstance(target, model):
+            names = (name, *CASCADES.get(name, ()))
+            lookup_cache.invalidate(*names)
+            # Reloading before commit would cache uncommitted rows; drop the
+            # entries again if the transaction ends up rolled back.
+            session = Session.object_session(target)
+            if session is not None:
+                session.info.setdefault('stale_pick_lists', set()).update(names)
+
+for model in PICK_LISTS.values():
+    for event_name in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(model, event_name, _invalidate)
+
+@event.listens_for(Session, "after_rollback")
+def _invalidate_on_rollback(session):
+    names = session.info.pop('stale_pick_lists', None)
+    if names:
+        lookup_cache.invalidate(*names)
+
+@event.listens_for(Session, "after_commit")
+def _clear_stale_pick_lists(session):
+    session.info.pop('stale_pick_lists', None)
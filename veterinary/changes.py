@@ -0,0 +1,201 @@
+import json
+from datetime import datetime
+from itertools import groupby
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, Text, func, inspect, select, text
+from sqlalchemy.dialects.sqlite import insert
+from .archive import ARCHIVED, archive_table, archived_years, create_archive_table, parse_archive_table_name
+from .models import Base
+
+# Change data capture. Every insert, update and delete on the tables in
+# models.py (the veterinarian_specialization association included) and on
+# the archive tables is appended to change_log by SQLite triggers, in the
+# same transaction as the change, so Core inserts, bulk imports, archive
+# moves and the database's own cascades are logged as well as ORM flushes:
+#
+#   change_log   id (increasing, never reused), table_name, operation
+#                ('insert', 'update' or 'delete'), data (the row as JSON, or
+#                its primary key for deletes)
+#   sync_state   per source database, the last change applied here
+#
+# sync() copies the changes after a target's watermark in batches. Each
+# batch is applied as upserts and deletes by primary key, with the new
+# watermark, in one transaction, so a sync can be interrupted and re-run
+# and applying a change twice leaves the same row behind.
+#
+# reminder_jobs isn't logged: a target's own triggers queue the jobs for the
+# appointments and prescriptions it receives.
+
+change_metadata = MetaData()
+
+change_log = Table(
+    'change_log', change_metadata,
+    Column('id', Integer, primary_key=True),
+    Column('table_name', String, nullable=False),
+    Column('operation', String, nullable=False),
+    Column('data', Text, nullable=False),
+    # AUTOINCREMENT so pruned IDs are never handed out again.
+    sqlite_autoincrement=True,
+)
+
+sync_state = Table(
+    'sync_state', change_metadata,
+    Column('source', String, primary_key=True),
+    Column('last_change_id', Integer, nullable=False),
+    Column('synced_at', DateTime, nullable=False),
+)
+
+# Logged tables in dependency order, parents first.
+CAPTURED = [table for table in Base.metadata.sorted_tables if table.name != 'reminder_jobs']
+
+def has_change_log(connection):
+    return inspect(connection).has_table('change_log')
+
+def _json(table, row, columns=None):
+    columns = columns or [column.name for column in table.columns]
+    return "json_object(" + ", ".join(f"'{name}', {row}.{name}" for name in columns) + ")"
+
+def _log(table, operation, data):
+    return f"INSERT INTO change_log (table_name, operation, data) VALUES ('{table.name}', '{operation}', {data});"
+
+def change_trigger_ddl(table):
+    """Statements creating the triggers that log `table`'s changes."""
+    key = [column.name for column in table.primary_key]
+    key_changed = " OR ".join(f"old.{name} IS NOT new.{name}" for name in key)
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {table.name}_changes_insert AFTER INSERT ON {table.name} "
+        f"BEGIN {_log(table, 'insert', _json(table, 'new'))} END",
+        f"CREATE TRIGGER IF NOT EXISTS {table.name}_changes_delete AFTER DELETE ON {table.name} "
+        f"BEGIN {_log(table, 'delete', _json(table, 'old', key))} END",
+        # A changed primary key is logged as a delete of the old key first.
+        f"CREATE TRIGGER IF NOT EXISTS {table.name}_changes_update AFTER UPDATE ON {table.name} "
+        f"BEGIN INSERT INTO change_log (table_name, operation, data) "
+        f"SELECT '{table.name}', 'delete', {_json(table, 'old', key)} WHERE {key_changed}; "
+        f"{_log(table, 'update', _json(table, 'new'))} END",
+    ]
+
+def _logged_tables(connection):
+    tables = list(CAPTURED)
+    for name in ARCHIVED:
+        tables += [archive_table(name, year) for year in archived_years(connection, name)]
+    return tables
+
+def create_change_triggers(connection, table=None):
+    """Create the logging triggers on one table, or on every logged table."""
+    for logged in [table] if table is not None else _logged_tables(connection):
+        for statement in change_trigger_ddl(logged):
+            connection.execute(text(statement))
+
+def drop_change_triggers(connection):
+    for table in _logged_tables(connection):
+        for event in ('insert', 'update', 'delete'):
+            connection.execute(text(f"DROP TRIGGER IF EXISTS {table.name}_changes_{event}"))
+
+def create_change_log(connection):
+    """Create the change log tables and triggers if missing (SQLite only)."""
+    change_metadata.create_all(connection)
+    create_change_triggers(connection)
+
+def drop_change_log(connection):
+    drop_change_triggers(connection)
+    change_metadata.drop_all(connection)
+
+def last_rowids(connection):
+    """{table name: highest rowid} for every logged table, to pass to log_rows() later."""
+    return {table.name: connection.execute(text(f"SELECT coalesce(max(rowid), 0) FROM {table.name}")).scalar()
+            for table in _logged_tables(connection)}
+
+def log_table_rows(connection, table, after=0):
+    """Log the rows of `table` past rowid `after` as inserts, in one set-based statement."""
+    connection.execute(text(
+        f"INSERT INTO change_log (table_name, operation, data) "
+        f"SELECT '{table.name}', 'insert', {_json(table, 't')} FROM {table.name} AS t "
+        f"WHERE t.rowid > :since ORDER BY t.rowid"
+    ), {'since': after})
+
+def log_rows(connection, after=None):
+    """Log every row (or every row past `after`, from last_rowids()) as an insert, in set-based statements."""
+    for table in _logged_tables(connection):
+        log_table_rows(connection, table, (after or {}).get(table.name, 0))
+
+def prune_changes(connection, through):
+    """Delete the logged changes up to and including ID `through`."""
+    return connection.execute(change_log.delete().where(change_log.c.id <= through)).rowcount
+
+# Applying changes.
+
+def _target_table(connection, name, known):
+    table = known.get(name)
+    if table is None:
+        archived = parse_archive_table_name(name)
+        if archived is None:
+            raise ValueError(f"change for unknown table '{name}'")
+        # An archive table the target doesn't have yet.
+        table = known[name] = create_archive_table(connection, *archived)
+    return table
+
+def _statement(table, operation):
+    columns = [column.name for column in table.columns]
+    key = [column.name for column in table.primary_key]
+    if operation == 'delete':
+        return f"DELETE FROM {table.name} WHERE " + " AND ".join(f"{name} = :{name}" for name in key)
+    others = [name for name in columns if name not in key]
+    conflict = ("DO UPDATE SET " + ", ".join(f"{name} = excluded.{name}" for name in others)) if others else "DO NOTHING"
+    return (f"INSERT INTO {table.name} ({', '.join(columns)}) VALUES ({', '.join(':' + name for name in columns)}) "
+            f"ON CONFLICT ({', '.join(key)}) {conflict}")
+
+def apply_changes(connection, changes, known=None):
+    """Apply change_log rows, in order, as upserts and deletes by primary key.
+
+    Values are written as they were stored at the source. Runs of changes
+    to the same table are sent with executemany.
+    """
+    known = known if known is not None else {table.name: table for table in CAPTURED}
+    kind = lambda change: (change.table_name, 'delete' if change.operation == 'delete' else 'upsert')
+    for (name, operation), run in groupby(changes, key=kind):
+        table = _target_table(connection, name, known)
+        connection.execute(text(_statement(table, operation)), [json.loads(change.data) for change in run])
+
+def watermark(connection, source):
+    """The ID of the last change from `source` applied here, or 0."""
+    return connection.execute(
+        select(sync_state.c.last_change_id).where(sync_state.c.source == source)).scalar() or 0
+
+def _set_watermark(connection, source, change_id):
+    statement = insert(sync_state).values(source=source, last_change_id=change_id, synced_at=datetime.now())
+    connection.execute(statement.on_conflict_do_update(
+        index_elements=[sync_state.c.source],
+        set_={'last_change_id': statement.excluded.last_change_id, 'synced_at': statement.excluded.synced_at},
+    ))
+
+def sync(source, target, batch_size=5000, since=None, progress=None):
+    """Apply the changes logged in the `source` engine's database to `target`'s.
+
+    Starts after the target's watermark for this source, or after change
+    ID `since`. `progress` is called with (changes shipped, watermark)
+    after each batch. Returns the same pair at the end.
+    """
+    name = source.url.render_as_string(hide_password=True)
+    with target.connect() as connection:
+        if not has_change_log(connection):
+            raise ValueError("the target has no change log tables; run the migrations on it first")
+        position = watermark(connection, name) if since is None else since
+    known = {table.name: table for table in CAPTURED}
+    shipped = 0
+    while True:
+        with source.connect() as connection:
+            changes = connection.execute(
+                select(change_log).where(change_log.c.id > position).order_by(change_log.c.id).limit(batch_size)
+            ).all()
+        if not changes:
+            return shipped, position
+        with target.begin() as connection:
+            apply_changes(connection, changes, known)
+            position = changes[-1].id
+            _set_watermark(connection, name, position)
+        shipped += len(changes)
+        if progress:
+            progress(shipped, position)
+
+def pending_changes(connection, after):
+    """How many logged changes come after ID `after`."""
+    return connection.execute(select(func.count()).select_from(change_log).where(change_log.c.id > after)).scalar()
@@ -1,19 +1,85 @@
+import os
+import re
+import shlex
+import sys
+import time
 import click
-from sqlalchemy import create_engine
 from datetime import datetime
-from sqlalchemy.orm import sessionmaker
-from .models import Base, Client, Veterinarian, Specialization, Animal, Appointment, Prescription
 
-DATABASE_URL = "sqlite:///veterinary.db"
+# SQLAlchemy, the models and the engine are imported inside each command, so
+# that `--help` and commands that fail argument parsing start quickly.
 
-engine = create_engine(DATABASE_URL)
-Session = sessionmaker(bind=engine)
-session = Session()
+# Mirror exporter.TABLES (in dependency order) / importer.ENTITIES /
+# exporter.FORMATS, which can't be imported here without loading the models.
+# tests/test_cli.py checks that they match.
+TABLES = ('clients', 'specializations', 'veterinarians', 'animals', 'veterinarian_specialization', 'appointments', 'prescriptions',
+          'reminder_jobs')
+ENTITIES = ('clients', 'specializations', 'veterinarians', 'animals', 'appointments', 'prescriptions')
+FORMATS = ('csv', 'jsonl', 'parquet')
+# Mirrors db.CLINIC_NAME.
+CLINIC_NAME = re.compile(r"[A-Za-z0-9_-]+")
 
-@click.group()
-def cli():
+def pagination_options(f):
+    """Add --limit/--offset/--after-id/--batch-size options to a list command."""
+    f = click.option('--batch-size', default=1000, show_default=True, help="Rows fetched per round trip while streaming.")(f)
+    f = click.option('--after-id', type=int, default=None, help="Only list rows with an ID greater than this (keyset pagination).")(f)
+    f = click.option('--offset', type=int, default=None, help="Skip this many rows.")(f)
+    f = click.option('--limit', type=int, default=None, help="Maximum number of rows to list.")(f)
+    return f
+
+def paginate(query, id_column, limit=None, offset=None, after_id=None, batch_size=1000):
+    """Order a query by ID, apply the pagination options and stream it in batches."""
+    if after_id is not None:
+        query = query.filter(id_column > after_id)
+    query = query.order_by(id_column)
+    if offset:
+        query = query.offset(offset)
+    if limit is not None:
+        query = query.limit(limit)
+    return query.yield_per(batch_size)
+
+def remove_session():
+    # Only commands that touched the database have imported veterinary.db.
+    db = sys.modules.get('veterinary.db')
+    if db is not None:
+        db.session.remove()
+    cache = sys.modules.get('veterinary.cache')
+    if cache is not None:
+        cache.lookup_cache.save()
+
+class TimedCommand(click.Command):
+    """A command timed by veterinary.metrics when VETERINARY_METRICS_FILE is set."""
+
+    def invoke(self, ctx):
+        if not os.environ.get("VETERINARY_METRICS_FILE"):
+            return super().invoke(ctx)
+        from .metrics import recorder
+        with recorder().command(ctx.info_name):
+            return super().invoke(ctx)
+
+class CommandGroup(click.Group):
+    command_class = TimedCommand
+
+def select_clinic(ctx, param, value):
+    if value is None:
+        return None
+    if not CLINIC_NAME.fullmatch(value):
+        raise click.BadParameter("use letters, digits, '-' and '_'")
+    db = sys.modules.get('veterinary.db')
+    if db is not None and db.CLINIC != value:
+        raise click.UsageError("--clinic must be given before the database is opened")
+    # Read by veterinary.db when it is first imported.
+    os.environ['VETERINARY_CLINIC'] = value
+    return value
+
+@click.group(cls=CommandGroup)
+@click.option('--clinic', envvar='VETERINARY_CLINIC', callback=select_clinic, expose_value=False, is_eager=True,
+              help="Work on this clinic's database in the clinics directory (default: $VETERINARY_CLINIC).")
+@click.pass_context
+def cli(ctx):
     """CLI for managing veterinary database."""
-    pass
+    # Each invocation works in its own session, closed when the command ends.
+    ctx.call_on_close(remove_session)
 
 @cli.command()
 def menu():
@@ -77,279 +143,1157 @@ def menu():
             click.echo(f"Running: {commands[choice - 1]}")
             cmd = cli.get_command(None, command_name)
             if cmd:
-                with click.Context(cmd) as ctx:
-                    cmd.invoke(ctx)
+                # make_context fills in option defaults, which a bare Context does not.
+                try:
+                    with cmd.make_context(command_name, []) as ctx:
+                        ctx.call_on_close(remove_session)
+                        cmd.invoke(ctx)
+                except click.ClickException as e:
+                    # Report a rejected operation and stay in the menu.
+                    e.show()
         else:
             click.echo("Invalid choice. Please try again.")
 
+class BatchRun:
+    """State of a running `batch` command, found through the click context."""
+
+    def __init__(self, commit_every=0):
+        self.commit_every = commit_every
+        self.pending = 0
+
+def current_batch():
+    ctx = click.get_current_context(silent=True)
+    return ctx.find_object(BatchRun) if ctx else None
+
+def commit():
+    """Commit the command's changes, or leave them to the enclosing batch."""
+    from .db import session
+    from sqlalchemy.exc import IntegrityError
+    batch = current_batch()
+    if batch is None:
+        try:
+            session.commit()
+        except IntegrityError as e:
+            session.rollback()
+            raise click.ClickException(f"Not saved: {e.orig}")
+        return
+    # Flush so constraint errors surface on the operation that caused them.
+    session.flush()
+    batch.pending += 1
+    if batch.commit_every and batch.pending >= batch.commit_every:
+        session.commit()
+        batch.pending = 0
+
+def prompt_optional(param, text, **kwargs):
+    """Prompt for an optional field, but only if `param` was itself prompted for.
+
+    Scripted calls that pass the required fields as options get the default.
+    """
+    ctx = click.get_current_context()
+    if ctx.get_parameter_source(param) == click.core.ParameterSource.PROMPT:
+        return click.prompt(text, **kwargs)
+    return kwargs['default']
+
+def echo_choices(title, rows):
+    click.echo(f"Available {title}:")
+    for id, name in rows:
+        click.echo(f"ID: {id}, Name: {name}")
+
 # Command implementations
 @cli.command('add-client')
-def add_client():
+@click.option('--name', prompt="Enter client's name")
+@click.option('--email', prompt="Enter client's email")
+@click.option('--phone', prompt="Enter client's phone number")
+def add_client(name, email, phone):
     """Add a new client."""
+    from .db import session
+    from .models import Client
     client_data = {
-        'name': click.prompt("Enter client's name"),
-        'email': click.prompt("Enter client's email"),
-        'phone': click.prompt("Enter client's phone number")
+        'name': name,
+        'email': email,
+        'phone': phone
     }
     client = Client(**client_data)
     session.add(client)
-    session.commit()
+    commit()
     click.echo(f"Client '{client_data['name']}' added.")
 
 @cli.command('add-specialization')
-def add_specialization():
+@click.option('--name', prompt="Enter specialization name")
+def add_specialization(name):
     """Add a new specialization."""
+    from .db import session
+    from .models import Specialization
     specialization_data = {
-        'name': click.prompt("Enter specialization name")
+        'name': name
     }
     specialization = Specialization(**specialization_data)
     session.add(specialization)
-    session.commit()
+    commit()
     click.echo(f"Specialization '{specialization_data['name']}' added.")
 
 @cli.command('add-veterinarian')
-def add_veterinarian():
+@click.option('--name', prompt="Enter veterinarian's name")
+@click.option('--specializations', 'specializations_input', default=None, help="Comma-separated specialization IDs.")
+def add_veterinarian(name, specializations_input):
     """Add a new veterinarian and optionally add specializations."""
+    from .db import session
+    from .models import Veterinarian, Specialization
+    from .cache import pick_list
     veterinarian_data = {
-        'name': click.prompt("Enter veterinarian's name")
+        'name': name
     }
     veterinarian = Veterinarian(**veterinarian_data)
     session.add(veterinarian)
 
-    specializations = session.query(Specialization).all()
-    if specializations:
-        click.echo("Available Specializations:")
-        for spec in specializations:
-            click.echo(f"ID: {spec.id}, Name: {spec.name}")
+    if specializations_input is None:
+        specializations = pick_list(session, 'specializations')
+        if specializations:
+            echo_choices("Specializations", specializations)
+        specializations_input = click.prompt("Enter specialization IDs (comma-separated)", default='')
 
-    specializations_input = click.prompt("Enter specialization IDs (comma-separated)", default='')
     if specializations_input:
         spec_ids = [int(id.strip()) for id in specializations_input.split(',')]
+        found = {spec.id: spec for spec in session.query(Specialization).filter(Specialization.id.in_(spec_ids))}
         for spec_id in spec_ids:
-            specialization = session.query(Specialization).get(spec_id)
-            if specialization:
-                veterinarian.specializations.append(specialization)
+            if spec_id in found:
+                veterinarian.specializations.append(found[spec_id])
             else:
                 click.echo(f"Specialization ID '{spec_id}' not found.")
-    session.commit()
+    commit()
     click.echo(f"Veterinarian '{veterinarian_data['name']}' added.")
 
 @cli.command('add-animal')
-def add_animal():
+@click.option('--name', prompt="Enter animal's name")
+@click.option('--species', prompt="Enter animal's species")
+@click.option('--age', prompt="Enter animal's age", type=int)
+@click.option('--breed', default=None)
+@click.option('--weight', type=float, default=None, help="Weight in kg, used to check doses.")
+@click.option('--owner-id', type=int, default=None, help="ID of the owning client.")
+def add_animal(name, species, age, breed, weight, owner_id):
     """Add a new animal."""
+    from .db import session
+    from .models import Animal
+    from .cache import pick_list
+    if breed is None:
+        breed = prompt_optional('name', "Enter animal's breed", default="")
+    if weight is None:
+        weight = prompt_optional('name', "Enter animal's weight in kg (blank if unknown)", default="", type=str)
+        try:
+            weight = float(weight) if weight else None
+        except ValueError:
+            click.echo("Invalid weight. Please enter a number of kg.")
+            return
     animal_data = {
-        'name': click.prompt("Enter animal's name"),
-        'species': click.prompt("Enter animal's species"),
-        'breed': click.prompt("Enter animal's breed", default=""),
-        'age': click.prompt("Enter animal's age", type=int)
+        'name': name,
+        'species': species,
+        'breed': breed,
+        'age': age,
+        'weight': weight
     }
 
-    owners = session.query(Client).all()
-    if owners:
-        click.echo("Available Clients:")
-        for owner in owners:
-            click.echo(f"ID: {owner.id}, Name: {owner.name}")
-        owner_id = click.prompt("Enter the owner's ID", type=int)
-    else:
-        click.echo("No clients available.")
-        return
+    if owner_id is None:
+        owners = pick_list(session, 'clients')
+        if owners:
+            echo_choices("Clients", owners)
+            owner_id = click.prompt("Enter the owner's ID", type=int)
+        else:
+            click.echo("No clients available.")
+            return
 
     animal = Animal(owner_id=owner_id, **animal_data)
     session.add(animal)
-    session.commit()
+    commit()
     click.echo(f"Animal '{animal_data['name']}' added.")
 
 @cli.command('add-appointment')
-def add_appointment():
+@click.option('--date', 'date_input', prompt="Enter appointment date (YYYY-MM-DD)")
+@click.option('--start-time', 'time_input', prompt="Enter appointment start time (HH:MM)")
+@click.option('--reason', prompt="Enter appointment reason")
+@click.option('--duration', type=int, default=None, help="Length in minutes (default: 30).")
+@click.option('--client-id', type=int, default=None)
+@click.option('--animal-id', type=int, default=None)
+@click.option('--veterinarian-id', type=int, default=None)
+def add_appointment(date_input, time_input, reason, duration, client_id, animal_id, veterinarian_id):
     """Add a new appointment."""
-    date_input = click.prompt("Enter appointment date (YYYY-MM-DD)")
-    
+    from .db import session
+    from .cache import pick_list
+    from .scheduler import BookingConflict, add_minutes, book
     # Convert the date input to a datetime object
     try:
         date = datetime.strptime(date_input, "%Y-%m-%d").date()
     except ValueError:
-        click.echo("Invalid date format. Please use YYYY-MM-DD.")
-        return
-
-    reason = click.prompt("Enter appointment reason")
+        raise click.ClickException("Invalid date format. Please use YYYY-MM-DD.")
 
-    clients = session.query(Client).all()
-    animals = session.query(Animal).all()
-    vets = session.query(Veterinarian).all()
-
-    click.echo("Available Clients:")
-    for client in clients:
-        click.echo(f"ID: {client.id}, Name: {client.name}")
+    try:
+        start_time = datetime.strptime(time_input, "%H:%M").time()
+    except ValueError:
+        raise click.ClickException("Invalid time format. Please use HH:MM.")
 
-    click.echo("Available Animals:")
-    for animal in animals:
-        click.echo(f"ID: {animal.id}, Name: {animal.name}")
+    if duration is None:
+        duration = prompt_optional('date_input', "Enter appointment duration in minutes", type=int, default=30)
 
-    click.echo("Available Veterinarians:")
-    for vet in vets:
-        click.echo(f"ID: {vet.id}, Name: {vet.name}")
+    if client_id is None:
+        echo_choices("Clients", pick_list(session, 'clients'))
+    if animal_id is None:
+        echo_choices("Animals", pick_list(session, 'animals'))
+    if veterinarian_id is None:
+        echo_choices("Veterinarians", pick_list(session, 'veterinarians'))
 
     appointment_data = {
         'date': date,
+        'start_time': start_time,
+        'end_time': add_minutes(start_time, duration),
         'reason': reason,
-        'client_id': click.prompt("Enter the client's ID", type=int),
-        'animal_id': click.prompt("Enter the animal's ID", type=int),
-        'veterinarian_id': click.prompt("Enter the veterinarian's ID", type=int)
+        'client_id': client_id if client_id is not None else click.prompt("Enter the client's ID", type=int),
+        'animal_id': animal_id if animal_id is not None else click.prompt("Enter the animal's ID", type=int),
+        'veterinarian_id': veterinarian_id if veterinarian_id is not None else click.prompt("Enter the veterinarian's ID", type=int)
     }
 
-    appointment = Appointment(**appointment_data)
-    session.add(appointment)
-    session.commit()
+    if current_batch() is None:
+        # End the session's read transaction so booking starts from fresh data.
+        session.commit()
+    try:
+        book(session.connection(), **appointment_data)
+    except (BookingConflict, ValueError) as e:
+        raise click.ClickException(f"Appointment not added. {e}")
+    commit()
     click.echo("Appointment added.")
 
 @cli.command('add-prescription')
-def add_prescription():
+@click.option('--medication', prompt="Enter medication name")
+@click.option('--dosage', prompt="Enter dosage")
+@click.option('--animal-id', type=int, default=None)
+@click.option('--force', is_flag=True, help="Add it even if the dose, species or interaction checks fail.")
+def add_prescription(medication, dosage, animal_id, force):
     """Add a new prescription."""
+    from .db import session
+    from .models import Prescription
+    from .cache import pick_list
+    from .prescribing import check_prescription
     prescription_data = {
-        'medication': click.prompt("Enter medication name"),
-        'dosage': click.prompt("Enter dosage")
+        'medication': medication,
+        'dosage': dosage
     }
 
-    animals = session.query(Animal).all()
-    if animals:
-        click.echo("Available Animals:")
-        for animal in animals:
-            click.echo(f"ID: {animal.id}, Name: {animal.name}")
-        animal_id = click.prompt("Enter the animal's ID", type=int)
-    else:
-        click.echo("No animals available.")
-        return
+    if animal_id is None:
+        animals = pick_list(session, 'animals')
+        if animals:
+            echo_choices("Animals", animals)
+            animal_id = click.prompt("Enter the animal's ID", type=int)
+        else:
+            click.echo("No animals available.")
+            return
+
+    findings = check_prescription(session.connection(), animal_id, medication, dosage)
+    errors = [finding for finding in findings if finding.severity == 'error']
+    for finding in findings:
+        click.echo(f"{finding.severity.capitalize()}: {finding.message}.")
+    if errors and not force:
+        raise click.ClickException("Prescription not added. Use --force to add it anyway.")
 
     prescription = Prescription(animal_id=animal_id, **prescription_data)
     session.add(prescription)
-    session.commit()
+    commit()
     click.echo("Prescription added.")
 
 @cli.command('list-clients')
-def list_clients():
+@pagination_options
+def list_clients(**page):
     """List all clients."""
-    clients = session.query(Client).all()
+    from .db import session
+    from .models import Client
+    from .queries import client_rows
     click.echo("\nClients:")
-    for client in clients:
-        click.echo(f"ID: {client.id}, Name: {client.name}, Email: {client.email}, Phone: {client.phone}")
+    for client_id, name, email, phone in paginate(client_rows(session), Client.id, **page):
+        click.echo(f"ID: {client_id}, Name: {name}, Email: {email}, Phone: {phone}")
 
 @cli.command('list-veterinarians')
-def list_veterinarians():
+@pagination_options
+def list_veterinarians(**page):
     """List all veterinarians."""
-    veterinarians = session.query(Veterinarian).all()
+    from .db import session
+    from .models import Veterinarian
+    from .queries import veterinarian_rows
     click.echo("\nVeterinarians:")
-    for veterinarian in veterinarians:
-        click.echo(f"ID: {veterinarian.id}, Name: {veterinarian.name}")
+    for vet_id, name in paginate(veterinarian_rows(session), Veterinarian.id, **page):
+        click.echo(f"ID: {vet_id}, Name: {name}")
 
 @cli.command('list-specializations')
-def list_specializations():
+@pagination_options
+def list_specializations(**page):
     """List all specializations."""
-    specializations = session.query(Specialization).all()
+    from .db import session
+    from .models import Specialization
+    from .queries import specialization_rows
     click.echo("\nSpecializations:")
-    for specialization in specializations:
-        click.echo(f"ID: {specialization.id}, Name: {specialization.name}")
+    for spec_id, name in paginate(specialization_rows(session), Specialization.id, **page):
+        click.echo(f"ID: {spec_id}, Name: {name}")
 
 @cli.command('list-animals')
-def list_animals():
+@pagination_options
+def list_animals(**page):
     """List all animals."""
-    animals = session.query(Animal).all()
+    from .db import session
+    from .models import Animal
+    from .queries import animal_rows
     click.echo("\nAnimals:")
-    for animal in animals:
-        owner_name = animal.owner.name if animal.owner else "No owner"
-        click.echo(f"ID: {animal.id}, Name: {animal.name}, Species: {animal.species}, Breed: {animal.breed}, Age: {animal.age}, Owner: {owner_name}")
+    for animal_id, name, species, breed, age, owner_name in paginate(animal_rows(session), Animal.id, **page):
+        owner_name = owner_name if owner_name is not None else "No owner"
+        click.echo(f"ID: {animal_id}, Name: {name}, Species: {species}, Breed: {breed}, Age: {age}, Owner: {owner_name}")
+
+def date_range_options(f):
+    """Add --from/--to options (inclusive dates) to a list command."""
+    f = click.option('--to', 'last', type=click.DateTime(formats=["%Y-%m-%d"]), default=None, help="Only list rows dated on or before this day.")(f)
+    f = click.option('--from', 'first', type=click.DateTime(formats=["%Y-%m-%d"]), default=None, help="Only list rows dated on or after this day.")(f)
+    return f
+
+def archive_source(session, name, first, last):
+    """The live table, or a union with the archive tables the date range reaches into."""
+    from .archive import date_range, source_for
+    start, end = date_range(first.date() if first else None, last.date() if last else None)
+    return source_for(session.connection(), name, start, end)
 
 @cli.command('list-appointments')
-def list_appointments():
-    """List all appointments."""
-    appointments = session.query(Appointment).all()
+@date_range_options
+@pagination_options
+def list_appointments(first, last, **page):
+    """List all appointments, including archived ones."""
+    from .db import session
+    from .queries import appointment_rows
+    source = archive_source(session, 'appointments', first, last)
     click.echo("\nAppointments:")
-    for appointment in appointments:
-        vet_name = appointment.veterinarian.name
-        animal_name = appointment.animal.name
-        client_name = appointment.client.name
-        click.echo(f"Appointment ID: {appointment.id}, Date: {appointment.date}, Reason: {appointment.reason}, Client: {client_name}, Animal: {animal_name}, Veterinarian: {vet_name}")
+    for appointment_id, date, start_time, end_time, reason, client_name, animal_name, vet_name in paginate(appointment_rows(session, source), source.c.id, **page):
+        slot = f", Time: {start_time:%H:%M}-{end_time:%H:%M}" if start_time and end_time else ""
+        click.echo(f"Appointment ID: {appointment_id}, Date: {date}{slot}, Reason: {reason}, Client: {client_name}, Animal: {animal_name}, Veterinarian: {vet_name}")
 
 @cli.command('list-prescriptions')
-def list_prescriptions():
-    """List all prescriptions."""
-    prescriptions = session.query(Prescription).all()
+@date_range_options
+@pagination_options
+def list_prescriptions(first, last, **page):
+    """List all prescriptions, including archived ones."""
+    from .db import session
+    from .queries import prescription_rows
+    source = archive_source(session, 'prescriptions', first, last)
     click.echo("\nPrescriptions:")
-    for prescription in prescriptions:
-        animal_name = prescription.animal.name
-        click.echo(f"ID: {prescription.id}, Animal: {animal_name}, Medication: {prescription.medication}, Dosage: {prescription.dosage}")
+    for prescription_id, date, animal_name, medication, dosage in paginate(prescription_rows(session, source), source.c.id, **page):
+        prescribed = f", Date: {date}" if date else ""
+        click.echo(f"ID: {prescription_id}{prescribed}, Animal: {animal_name}, Medication: {medication}, Dosage: {dosage}")
+
+@cli.command('search')
+@click.argument('query')
+@click.option('--kind', 'kinds', multiple=True, type=click.Choice(['client', 'animal', 'appointment']), help="Only search these record types.")
+@click.option('--limit', default=20, show_default=True)
+@click.option('--fuzzy/--no-fuzzy', default=None, help="Also match misspelled names (default: only when nothing matches exactly).")
+@click.option('--rebuild', is_flag=True, help="Rebuild the search index from the tables first.")
+def search(query, kinds, limit, fuzzy, rebuild):
+    """Search clients, animals and appointment reasons."""
+    from .db import session
+    from .models import Client, Animal, Appointment
+    from .search import search as search_index, fuzzy_search, rebuild_search_index
+
+    connection = session.connection()
+    if rebuild:
+        rebuild_search_index(connection)
+        session.commit()
+        connection = session.connection()
+
+    results = search_index(connection, query, kinds, limit)
+    if fuzzy or (fuzzy is None and not results):
+        seen = {(kind, id) for kind, id, _ in results}
+        results += [match for match in fuzzy_search(connection, query, kinds, limit) if match[:2] not in seen]
+        results = results[:limit]
+    if not results:
+        click.echo("No matches found.")
+        return
+
+    # Fetch the matched rows with one query per kind.
+    ids = {}
+    for kind, id, _ in results:
+        ids.setdefault(kind, []).append(id)
+    rows = {}
+    if 'client' in ids:
+        for client in session.query(Client.id, Client.name, Client.email, Client.phone).filter(Client.id.in_(ids['client'])):
+            rows['client', client.id] = f"Client ID: {client.id}, Name: {client.name}, Email: {client.email}, Phone: {client.phone}"
+    if 'animal' in ids:
+        for animal in session.query(Animal.id, Animal.name, Animal.species, Animal.breed).filter(Animal.id.in_(ids['animal'])):
+            rows['animal', animal.id] = f"Animal ID: {animal.id}, Name: {animal.name}, Species: {animal.species}, Breed: {animal.breed}"
+    if 'appointment' in ids:
+        for appointment in session.query(Appointment.id, Appointment.date, Appointment.reason).filter(Appointment.id.in_(ids['appointment'])):
+            rows['appointment', appointment.id] = f"Appointment ID: {appointment.id}, Date: {appointment.date}, Reason: {appointment.reason}"
+
+    click.echo("\nResults:")
+    for kind, id, _ in results:
+        if (kind, id) in rows:
+            click.echo(rows[kind, id])
+
+@cli.command('find-vets')
+@click.option('--specialization', 'specializations', multiple=True, required=True, help="Specialization name or ID; repeat to require several.")
+@click.option('--date', 'day', type=click.DateTime(formats=["%Y-%m-%d"]), default=None, help="Also show each vet's bookings on this day.")
+def find_vets(specializations, day):
+    """Find veterinarians with the given specializations."""
+    from sqlalchemy import func
+    from .db import session
+    from .models import Appointment
+    from .cache import name_map
+    from .vet_index import specialization_index
+    vet_ids = specialization_index.vets_for(session, *specializations)
+    if not vet_ids:
+        click.echo("No matching veterinarians found.")
+        return
+
+    bookings = {}
+    if day:
+        bookings = dict(
+            session.query(Appointment.veterinarian_id, func.count(Appointment.id))
+            .filter(Appointment.veterinarian_id.in_(vet_ids), Appointment.date == day.date())
+            .group_by(Appointment.veterinarian_id)
+        )
+    names = name_map(session, 'veterinarians')
+    click.echo("\nVeterinarians:")
+    for vet_id in sorted(vet_ids):
+        name = names.get(vet_id)
+        booked = f", Appointments on {day.date()}: {bookings.get(vet_id, 0)}" if day else ""
+        click.echo(f"ID: {vet_id}, Name: {name}{booked}")
+
+@cli.command('next-slot')
+@click.option('--specialization', required=True, help="Specialization name or ID.")
+@click.option('--date', 'day', type=click.DateTime(formats=["%Y-%m-%d"]), default=None, help="First day to search (default: today).")
+@click.option('--after', type=click.DateTime(formats=["%H:%M"]), default=None, help="Earliest start time on the first day (HH:MM).")
+@click.option('--duration', default=30, show_default=True, help="Slot length in minutes.")
+@click.option('--days', default=7, show_default=True, help="How many days ahead to search.")
+def next_slot(specialization, day, after, duration, days):
+    """Find the next free slot with a vet who has a given specialization."""
+    from .db import get_engine
+    from .scheduler import next_free_slot
+    day = day.date() if day else datetime.now().date()
+    with get_engine().connect() as connection:
+        slot = next_free_slot(connection, specialization, day, duration, after.time() if after else None, days)
+    if slot is None:
+        click.echo(f"No free {duration}-minute slot found within {days} days.")
+        return
+    vet_id, vet_name, slot_date, start, end = slot
+    click.echo(f"Next free slot: {slot_date} {start:%H:%M}-{end:%H:%M} with {vet_name} (ID: {vet_id})")
+
+@cli.command('explain')
+@click.argument('query_name', required=False)
+def explain(query_name):
+    """Print SQLite's query plan for the CLI's built-in queries."""
+    from sqlalchemy import text
+    from .db import session, get_engine
+    from .queries import explain_queries
+    queries = explain_queries(session)
+    if query_name:
+        if query_name not in queries:
+            click.echo(f"Unknown query '{query_name}'. Available: {', '.join(queries)}")
+            return
+        queries = {query_name: queries[query_name]}
+
+    for name, query in queries.items():
+        sql = str(query.statement.compile(dialect=get_engine().dialect, compile_kwargs={"literal_binds": True}))
+        click.echo(f"\n{name}:")
+        for row in session.execute(text(f"EXPLAIN QUERY PLAN {sql}")):
+            click.echo(f"  {row.detail}")
+
+@cli.command('import')
+@click.argument('entity', type=click.Choice(ENTITIES))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), default=None, help="Input format (default: from the file extension).")
+@click.option('--batch-size', default=5000, show_default=True, help="Rows inserted and committed per batch.")
+@click.option('--reject-file', type=click.Path(dir_okay=False), default=None, help="Where to write rejected rows (default: <file>.rejects.jsonl).")
+def import_data(entity, path, fmt, batch_size, reject_file):
+    """Bulk import clients, animals, appointments, etc. from CSV or JSONL."""
+    from .db import session
+    from .cache import PICK_LISTS, lookup_cache
+    from .importer import Importer, RejectWriter, read_rows, default_reject_path
+    from .vet_index import specialization_index
+    reject = RejectWriter(reject_file or default_reject_path(path))
+    started = time.perf_counter()
+    try:
+        inserted = Importer(session, entity, reject).run(read_rows(path, fmt), batch_size)
+    finally:
+        reject.close()
+        if entity in ('veterinarians', 'specializations'):
+            specialization_index.invalidate()
+        # Core inserts skip the ORM events that keep the cache current.
+        if entity in PICK_LISTS:
+            lookup_cache.invalidate(entity)
+    elapsed = time.perf_counter() - started
+    rate = inserted / elapsed if elapsed else 0
+    click.echo(f"Imported {inserted} {entity} in {elapsed:.2f}s ({rate:.0f} rows/s).")
+    if reject.count:
+        click.echo(f"Rejected {reject.count} rows, see {reject.path}.")
+
+@cli.command('batch')
+@click.argument('script', type=click.File('r'))
+@click.option('--commit-every', default=0, show_default=True, help="Commit after this many operations (0: one transaction for the whole script).")
+@click.option('--quiet', is_flag=True, help="Only print the summary, not a timing per operation.")
+@click.pass_context
+def batch(ctx, script, commit_every, quiet):
+    """Run add/delete commands from a script, one command line per line.
+
+    Lines look like `add-client --name Bob --email bob@example.com --phone 123`;
+    blank lines and # comments are skipped. If an operation fails, every
+    operation since the last commit is rolled back and the batch stops.
+    """
+    from .db import session
+    run = ctx.obj = BatchRun(commit_every)
+    timings = {}
+    started = time.perf_counter()
+
+    for line_number, line in enumerate(script, 1):
+        args = shlex.split(line, comments=True)
+        if not args:
+            continue
+        name, args = args[0], args[1:]
+        cmd = cli.get_command(ctx, name)
+        op_started = time.perf_counter()
+        try:
+            if cmd is None or name in ('menu', 'batch', 'serve', 'load-test', 'benchmark', 'remind'):
+                raise click.UsageError(f"'{name}' cannot be used in a batch")
+            with cmd.make_context(name, args, parent=ctx) as sub_ctx:
+                cmd.invoke(sub_ctx)
+        except Exception as e:
+            session.rollback()
+            click.echo(f"Line {line_number}: {name} failed: {getattr(e, 'orig', None) or e}")
+            click.echo(f"Rolled back {run.pending} uncommitted operation(s).")
+            ctx.exit(1)
+        elapsed = time.perf_counter() - op_started
+        timings.setdefault(name, []).append(elapsed)
+        if not quiet:
+            click.echo(f"Line {line_number}: {name} took {elapsed * 1000:.2f} ms")
+
+    session.commit()
+    total = time.perf_counter() - started
+    count = sum(len(times) for times in timings.values())
+    click.echo(f"\nRan {count} operations in {total:.2f}s ({count / total if total else 0:.0f} ops/s).")
+    for name, times in timings.items():
+        click.echo(f"{name}: {len(times)} ops, mean {sum(times) / len(times) * 1000:.2f} ms, max {max(times) * 1000:.2f} ms")
+
+@cli.command('export')
+@click.argument('tables', nargs=-1, type=click.Choice(TABLES))
+@click.option('--format', 'fmt', type=click.Choice(FORMATS), default='csv', show_default=True)
+@click.option('--output-dir', type=click.Path(file_okay=False), default='export', show_default=True)
+@click.option('--since', type=click.DateTime(formats=["%Y-%m-%d"]), default=None, help="Only export appointments on or after this date (YYYY-MM-DD).")
+@click.option('--batch-size', default=10000, show_default=True, help="Rows fetched and written per batch.")
+@click.option('--gzip', 'compress', is_flag=True, help="Gzip CSV/JSONL output.")
+@click.option('--parallel', is_flag=True, help="Export the tables concurrently.")
+def export(tables, fmt, output_dir, since, batch_size, compress, parallel):
+    """Export tables to CSV, JSONL or Parquet files (default: all tables)."""
+    from .db import get_engine
+    from .exporter import export_tables
+    tables = tables or TABLES
+    try:
+        results = export_tables(
+            get_engine(), tables, output_dir,
+            parallel=len(tables) if parallel else 1,
+            fmt=fmt, since=since.date() if since else None,
+            batch_size=batch_size, compress=compress,
+        )
+    except RuntimeError as e:
+        click.echo(str(e))
+        return
+    for path, count in results:
+        click.echo(f"Exported {count} rows to {path}.")
+
+@cli.command('serve')
+@click.option('--host', default='127.0.0.1', show_default=True)
+@click.option('--port', default=8000, show_default=True)
+@click.option('--pool-size', type=int, default=None, help="Database connections kept open (default: VETERINARY_POOL_SIZE or 5).")
+def serve(host, port, pool_size):
+    """Serve the records as a JSON HTTP API (needs aiosqlite for SQLite)."""
+    import asyncio
+    from . import api
+    click.echo(f"Serving on http://{host}:{port}/ (Ctrl+C to stop)")
+    try:
+        asyncio.run(api.serve(host, port, pool_size=pool_size))
+    except ImportError:
+        click.echo("The API server needs the asyncio extras: pip install 'sqlalchemy[asyncio]' aiosqlite")
+    except KeyboardInterrupt:
+        pass
+
+@cli.command('load-test')
+@click.option('--host', default='127.0.0.1', show_default=True)
+@click.option('--port', default=8000, show_default=True)
+@click.option('--concurrency', default=100, show_default=True, help="Simultaneous keep-alive clients.")
+@click.option('--requests', 'total', default=10000, show_default=True, help="Total requests to send.")
+@click.option('--page-size', default=50, show_default=True)
+def load_test(host, port, concurrency, total, page_size):
+    """Send concurrent read requests to a running API server and report latency."""
+    import asyncio
+    from .loadtest import run_load_test
+    try:
+        result = asyncio.run(run_load_test(host, port, concurrency, total, page_size))
+    except OSError as e:
+        click.echo(f"Could not reach the server at {host}:{port}: {e}")
+        return
+    click.echo(f"{result['requests']} requests from {result['concurrency']} clients in {result['seconds']:.2f}s "
+               f"({result['requests_per_second']:.0f} req/s), {result['errors']} errors")
+    click.echo(f"p50 {result['p50_ms']:.2f} ms, p99 {result['p99_ms']:.2f} ms")
+
+@cli.command('seed')
+@click.option('--appointments', default=1000, show_default=True, help="Appointments to generate; other tables are sized from this.")
+@click.option('--seed', 'random_seed', default=0, show_default=True, help="Random seed; the same seed gives the same data.")
+@click.option('--start-date', type=click.DateTime(formats=["%Y-%m-%d"]), default="2020-01-01", show_default=True, help="Date of the first appointments.")
+@click.option('--chunk-size', default=20000, show_default=True, help="Rows per insert statement batch.")
+def seed(appointments, random_seed, start_date, chunk_size):
+    """Fill the database with reproducible synthetic data."""
+    from .db import get_engine
+    from .cache import lookup_cache
+    from .seed import seed_database
+    started = time.perf_counter()
+    inserted = seed_database(get_engine(), appointments, random_seed, start_date.date(), chunk_size)
+    lookup_cache.invalidate()
+    elapsed = time.perf_counter() - started
+    for table, count in inserted.items():
+        click.echo(f"{table}: {count} rows")
+    total = sum(inserted.values())
+    click.echo(f"Inserted {total} rows in {elapsed:.2f}s ({total / elapsed if elapsed else 0:.0f} rows/s).")
+
+@cli.command('benchmark')
+@click.option('--scenario', 'selected', multiple=True, default=['commands'], show_default=True,
+              type=click.Choice(['commands', 'paginate-memory', 'writers', 'busy-day']),
+              help="What to run (repeatable): the CLI commands against the current database, paginate() "
+                   "over scratch client tables of each --sizes, --writers processes adding clients to a "
+                   "copy of the database, or --writers processes booking one day for --vets vets in a copy.")
+@click.option('--repeat', default=5, show_default=True, help="Runs per command; the first is a warm-up.")
+@click.option('--sizes', default='10000,100000,1000000', show_default=True, help="Client table sizes for paginate-memory, comma-separated.")
+@click.option('--writers', default=4, show_default=True, help="Writer processes for the writers scenario.")
+@click.option('--seconds', default=5.0, show_default=True, help="How long the writers scenario runs.")
+@click.option('--vets', default=5, show_default=True, help="Veterinarians whose day is booked in the busy-day scenario.")
+@click.option('--attempts', default=40, show_default=True, help="Bookings each busy-day process tries.")
+@click.option('--busy-timeout', type=int, default=None, help="Milliseconds a writer waits for the lock (default: VETERINARY_BUSY_TIMEOUT or 5000).")
+@click.option('--output', type=click.Path(dir_okay=False), default='benchmark.json', show_default=True, help="Where to write the JSON report.")
+@click.option('--compare', 'baseline_path', type=click.Path(exists=True, dir_okay=False), default=None, help="Earlier report to check for regressions.")
+@click.option('--threshold', default=0.25, show_default=True, help="Relative slowdown or memory growth counted as a regression.")
+@click.pass_context
+def benchmark(ctx, selected, repeat, sizes, writers, seconds, vets, attempts, busy_timeout, output, baseline_path, threshold):
+    """Time the list, add and delete commands against the current database.
+
+    Every row the add commands create is deleted again by the delete
+    commands; still, run this against a seeded copy rather than live data.
+    """
+    import json
+    from .benchmark import (run_benchmarks, new_report, paginate_memory, concurrent_writers, busy_booking_day,
+                            compare_reports, write_report)
+    try:
+        sizes = [int(size) for size in sizes.split(',') if size.strip()]
+    except ValueError:
+        raise click.BadParameter("use comma-separated row counts, such as 10000,100000", param_hint='--sizes')
+    report = run_benchmarks(repeat) if 'commands' in selected else new_report()
+    if 'paginate-memory' in selected:
+        report['paginate_memory'] = paginate_memory(sizes)
+    try:
+        if 'writers' in selected:
+            report['writers'] = concurrent_writers(writers, seconds, busy_timeout)
+        if 'busy-day' in selected:
+            report['busy_day'] = busy_booking_day(writers, vets, attempts, busy_timeout)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    write_report(report, output)
+    if 'scenarios' in report:
+        click.echo(f"{'Command':<32}{'median ms':>12}{'statements':>12}{'peak KiB':>12}")
+        for name, result in report['scenarios'].items():
+            click.echo(f"{name:<32}{result['median_ms']:>12.2f}{result['statements']:>12}{result['peak_memory_kb']:>12.0f}")
+    if 'paginate_memory' in report:
+        click.echo(f"{'paginate() over clients':<32}{'rows/s':>12}{'peak KiB':>12}")
+        for size, result in report['paginate_memory'].items():
+            click.echo(f"{size + ' rows':<32}{result['rows'] / result['seconds']:>12.0f}{result['peak_memory_kb']:>12.0f}")
+    if 'writers' in report:
+        result = report['writers']
+        click.echo(f"{result['writers']} writer processes: {result['commits_per_second']:.0f} commits/s, "
+                   f"p50 {result['p50_ms']:.2f} ms, p99 {result['p99_ms']:.2f} ms, "
+                   f"{result['locked']} 'database is locked' failures, {result['failed']} other failures")
+    if 'busy_day' in report:
+        result = report['busy_day']
+        click.echo(f"Busy day, {result['workers']} processes booking {result['slots']} slots of {result['vets']} vets: "
+                   f"{result['bookings']} booked (p50 {result['p50_ms']:.2f} ms, p99 {result['p99_ms']:.2f} ms), "
+                   f"{result['conflicts']} conflicts (p50 {result['conflict_p50_ms']:.2f} ms, p99 {result['conflict_p99_ms']:.2f} ms), "
+                   f"{result['locked']} locked, {result['double_bookings']} double bookings")
+    click.echo(f"Report written to {output}.")
+
+    if baseline_path:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        if baseline.get('rows') != report.get('rows'):
+            click.echo("Warning: the baseline was run against a different number of rows.")
+        regressions = compare_reports(baseline, report, threshold)
+        for name, metric, before, after in regressions:
+            click.echo(f"Regression in {name}: {metric} {before:.2f} -> {after:.2f}")
+        if regressions:
+            ctx.exit(1)
+        click.echo(f"No regressions against {baseline.get('commit') or baseline_path}.")
 
 # Delete commands
 @cli.command('delete-client')
-def delete_client():
+@click.option('--id', 'client_id', prompt="Enter the client ID to delete", type=int)
+def delete_client(client_id):
     """Delete a client by ID."""
-    client_id = click.prompt("Enter the client ID to delete", type=int)
-    client = session.query(Client).get(client_id)
+    from .db import session
+    from .models import Client
+    client = session.get(Client, client_id)
     if client:
         session.delete(client)
-        session.commit()
+        commit()
         click.echo(f"Client '{client.name}' deleted.")
     else:
-        click.echo("Client not found.")
+        raise click.ClickException("Client not found.")
 
 @cli.command('delete-veterinarian')
-def delete_veterinarian():
+@click.option('--id', 'vet_id', prompt="Enter the veterinarian ID to delete", type=int)
+def delete_veterinarian(vet_id):
     """Delete a veterinarian by ID."""
-    vet_id = click.prompt("Enter the veterinarian ID to delete", type=int)
-    veterinarian = session.query(Veterinarian).get(vet_id)
+    from .db import session
+    from .models import Veterinarian
+    veterinarian = session.get(Veterinarian, vet_id)
     if veterinarian:
         session.delete(veterinarian)
-        session.commit()
+        commit()
         click.echo(f"Veterinarian '{veterinarian.name}' deleted.")
     else:
-        click.echo("Veterinarian not found.")
+        raise click.ClickException("Veterinarian not found.")
 
 @cli.command('delete-specialization')
-def delete_specialization():
+@click.option('--id', 'spec_id', prompt="Enter the specialization ID to delete", type=int)
+def delete_specialization(spec_id):
     """Delete a specialization by ID."""
-    spec_id = click.prompt("Enter the specialization ID to delete", type=int)
-    specialization = session.query(Specialization).get(spec_id)
+    from .db import session
+    from .models import Specialization
+    specialization = session.get(Specialization, spec_id)
     if specialization:
         session.delete(specialization)
-        session.commit()
+        commit()
         click.echo(f"Specialization '{specialization.name}' deleted.")
     else:
-        click.echo("Specialization not found.")
+        raise click.ClickException("Specialization not found.")
 
 @cli.command('delete-animal')
-def delete_animal():
+@click.option('--id', 'animal_id', prompt="Enter the animal ID to delete", type=int)
+def delete_animal(animal_id):
     """Delete an animal by ID."""
-    animal_id = click.prompt("Enter the animal ID to delete", type=int)
-    animal = session.query(Animal).get(animal_id)
+    from .db import session
+    from .models import Animal
+    animal = session.get(Animal, animal_id)
     if animal:
         session.delete(animal)
-        session.commit()
+        commit()
         click.echo(f"Animal '{animal.name}' deleted.")
     else:
-        click.echo("Animal not found.")
+        raise click.ClickException("Animal not found.")
 
 @cli.command('delete-appointment')
-def delete_appointment():
+@click.option('--id', 'appointment_id', prompt="Enter the appointment ID to delete", type=int)
+def delete_appointment(appointment_id):
     """Delete an appointment by ID."""
-    appointment_id = click.prompt("Enter the appointment ID to delete", type=int)
-    appointment = session.query(Appointment).get(appointment_id)
+    from .db import session
+    from .models import Appointment
+    appointment = session.get(Appointment, appointment_id)
     if appointment:
         session.delete(appointment)
-        session.commit()
+        commit()
         click.echo(f"Appointment ID '{appointment.id}' deleted.")
     else:
-        click.echo("Appointment not found.")
+        raise click.ClickException("Appointment not found.")
 
 @cli.command('delete-prescription')
-def delete_prescription():
+@click.option('--id', 'prescription_id', prompt="Enter the prescription ID to delete", type=int)
+def delete_prescription(prescription_id):
     """Delete a prescription by ID."""
-    prescription_id = click.prompt("Enter the prescription ID to delete", type=int)
-    prescription = session.query(Prescription).get(prescription_id)
+    from .db import session
+    from .models import Prescription
+    prescription = session.get(Prescription, prescription_id)
     if prescription:
         session.delete(prescription)
-        session.commit()
+        commit()
         click.echo(f"Prescription ID '{prescription.id}' deleted.")
     else:
-        click.echo("Prescription not found.")
+        raise click.ClickException("Prescription not found.")
+
+@cli.command('stats')
+@date_range_options
+@click.option('--top', default=10, show_default=True, help="How many species and medications to list.")
+@click.option('--json', 'as_json', is_flag=True, help="Print the statistics as JSON.")
+@click.option('--rebuild', is_flag=True, help="Recompute the daily summaries from the tables first.")
+def stats(first, last, top, as_json, rebuild):
+    """Show appointment, vet, species and prescription statistics."""
+    import json
+    from .db import get_engine
+    from .archive import date_range
+    from .stats import clinic_stats, has_stats, rebuild_stats
+    start, end = date_range(first.date() if first else None, last.date() if last else None)
+    engine = get_engine()
+    with engine.connect() as connection:
+        if not has_stats(connection):
+            click.echo("The summary tables are missing; run `alembic upgrade head` first.")
+            return
+    if rebuild:
+        with engine.begin() as connection:
+            rebuild_stats(connection)
+    with engine.connect() as connection:
+        result = clinic_stats(connection, start, end, top)
+    if as_json:
+        click.echo(json.dumps(result, indent=2))
+        return
+
+    appointments = result['appointments']
+    click.echo(f"\nAppointments: {appointments['total']} over {appointments['days']} days "
+               f"({appointments['average_per_day']} per day)")
+    if appointments['busiest_day']:
+        click.echo(f"Busiest day: {appointments['busiest_day']['day']} ({appointments['busiest_day']['appointments']})")
+    click.echo("\nVeterinarians:")
+    for vet in result['veterinarians']:
+        if vet['veterinarian_id'] is None:
+            click.echo(f"No veterinarian: {vet['appointments']} appointments")
+            continue
+        click.echo(f"ID: {vet['veterinarian_id']}, Name: {vet['name']}, Appointments: {vet['appointments']}, "
+                   f"Days: {vet['days_worked']}, Utilization: {vet['utilization']:.0%}")
+    click.echo("\nSpecializations:")
+    for spec in result['specializations']:
+        click.echo(f"{spec['specialization']}: {spec['veterinarians']} vets, {spec['appointments']} appointments")
+    click.echo("\nTop species:")
+    for species in result['top_species']:
+        click.echo(f"{species['species']}: {species['animals']} animals")
+    click.echo("\nTop medications:")
+    for medication in result['top_medications']:
+        click.echo(f"{medication['medication']}: {medication['prescriptions']} prescriptions")
+
+def clinic_names(clinics):
+    """The clinics to fan out to: those given, or every clinic in the clinics directory."""
+    from .clinics import registry
+    names = list(clinics) or registry.names()
+    if not names:
+        raise click.ClickException(f"No clinic databases found in {registry.directory}.")
+    return names
+
+@cli.command('clinics')
+def list_clinics():
+    """List the clinics in the clinics directory."""
+    from .clinics import registry
+    names = registry.names()
+    if not names:
+        click.echo(f"No clinic databases found in {registry.directory}.")
+    for name in names:
+        click.echo(name)
+
+@cli.command('find-client')
+@click.option('--phone', default=None)
+@click.option('--email', default=None)
+@click.option('--name', default=None, help="Part of the client's name.")
+@click.option('--in', 'clinics', multiple=True, help="Only search this clinic; repeat for several (default: all).")
+@click.option('--workers', type=int, default=None, help="Clinics queried at once (default: all of them, up to 32).")
+def find_client(phone, email, name, clinics, workers):
+    """Find a client by phone, email or name across every clinic."""
+    if not (phone or email or name):
+        raise click.UsageError("Give at least one of --phone, --email or --name.")
+    from .clinics import ClinicQueryError, client_query, fan_out
+    found = 0
+    try:
+        for clinic, (client_id, client_name, client_email, client_phone) in fan_out(
+                client_query(phone, email, name), clinic_names(clinics), max_workers=workers):
+            click.echo(f"Clinic: {clinic}, ID: {client_id}, Name: {client_name}, Email: {client_email}, Phone: {client_phone}")
+            found += 1
+    except ClinicQueryError as e:
+        raise click.ClickException(str(e))
+    if not found:
+        click.echo("No matching clients.")
+
+@cli.command('group-report')
+@date_range_options
+@click.option('--in', 'clinics', multiple=True, help="Only include this clinic; repeat for several (default: all).")
+def group_report(first, last, clinics):
+    """Appointments per day across every clinic, with totals per clinic."""
+    from .archive import date_range
+    from .clinics import ClinicQueryError, appointments_per_day
+    names = clinic_names(clinics)
+    start, end = date_range(first.date() if first else None, last.date() if last else None)
+    totals = dict.fromkeys(names, 0)
+    started = time.perf_counter()
+    try:
+        for day, counts in appointments_per_day(start, end, names):
+            per_clinic = ", ".join(f"{clinic} {count}" for clinic, count in counts.items())
+            click.echo(f"{day}: {sum(counts.values())} ({per_clinic})")
+            for clinic, count in counts.items():
+                totals[clinic] += count
+    except ClinicQueryError as e:
+        raise click.ClickException(str(e))
+    click.echo("\nTotals:")
+    for clinic, count in totals.items():
+        click.echo(f"{clinic}: {count} appointments")
+    click.echo(f"Group: {sum(totals.values())} appointments across {len(names)} clinics "
+               f"in {time.perf_counter() - started:.2f}s.")
+
+@cli.command('sync')
+@click.option('--to', 'target_url', default=None, help="Database URL to copy the changes to.")
+@click.option('--to-clinic', default=None, help="Clinic database to copy the changes to.")
+@click.option('--batch-size', default=5000, show_default=True, help="Changes applied per transaction.")
+@click.option('--since', type=int, default=None,
+              help="Start after this change ID instead of the target's watermark, e.g. for a copy of this database.")
+@click.option('--prune', is_flag=True, help="Then delete the copied changes from this database's log (if it has no other copies).")
+def sync(target_url, to_clinic, batch_size, since, prune):
+    """Copy the changes made since the last sync to another database."""
+    if bool(target_url) == bool(to_clinic):
+        raise click.UsageError("Give one of --to or --to-clinic.")
+    from sqlalchemy.exc import IntegrityError
+    from .changes import pending_changes, prune_changes, sync as sync_changes
+    from .db import clinic_url, create_db_engine, get_engine
+    try:
+        target_url = target_url or clinic_url(to_clinic)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint='--to-clinic')
+    source, target = get_engine(), create_db_engine(target_url)
+    if target.url == source.url:
+        raise click.UsageError("The target is this database.")
+    started = time.perf_counter()
+
+    def progress(shipped, watermark):
+        click.echo(f"{shipped} changes applied, up to change {watermark}.", err=True)
+
+    try:
+        shipped, watermark = sync_changes(source, target, batch_size, since, progress)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    except IntegrityError as e:
+        raise click.ClickException(f"A change could not be applied, the target has diverged: {e.orig}")
+    finally:
+        target.dispose()
+    with source.begin() as connection:
+        if prune:
+            click.echo(f"Pruned {prune_changes(connection, watermark)} changes from the log.")
+        remaining = pending_changes(connection, watermark)
+    click.echo(f"Applied {shipped} changes to {target.url.render_as_string(hide_password=True)} "
+               f"in {time.perf_counter() - started:.2f}s; up to change {watermark}, {remaining} newer.")
+
+@cli.command('check-prescriptions')
+@click.option('--workers', type=int, default=None, help="Processes to check with (default: one per CPU).")
+@click.option('--limit', default=50, show_default=True, help="Most problems to list (0: only the summary).")
+@click.option('--errors-only', is_flag=True, help="Only list prescriptions with errors.")
+def check_prescriptions(workers, limit, errors_only):
+    """Re-check every prescription's dose, species and interactions."""
+    from .db import DATABASE_URL
+    from .prescribing import summarize_findings, validate_prescriptions
+    started = time.perf_counter()
+    checked, problems = validate_prescriptions(DATABASE_URL, workers)
+    elapsed = time.perf_counter() - started
+    if errors_only:
+        problems = [problem for problem in problems if any(finding.severity == 'error' for finding in problem[4])]
+    for prescription_id, animal_id, medication, dosage, findings in problems[:limit]:
+        click.echo(f"Prescription ID: {prescription_id}, Animal ID: {animal_id}, Medication: {medication}, Dosage: {dosage}")
+        for finding in findings:
+            if finding.severity == 'error' or not errors_only:
+                click.echo(f"  {finding.severity}: {finding.message}")
+    if len(problems) > limit:
+        click.echo(f"... and {len(problems) - limit} more.")
+    click.echo(f"\nChecked {checked} prescriptions in {elapsed:.2f}s: {len(problems)} with problems.")
+    for (severity, code), count in sorted(summarize_findings(problems).items()):
+        click.echo(f"{severity} {code}: {count}")
+
+@cli.command('snapshot')
+@click.option('--rebuild', is_flag=True, help="Reload every table instead of only the new rows.")
+@click.option('--dir', 'directory', type=click.Path(file_okay=False), default=None,
+              help="Where to keep the snapshot (default: next to the database file).")
+def snapshot(rebuild, directory):
+    """Update the columnar snapshot used by `analyze`."""
+    from .db import get_engine
+    try:
+        from .snapshot import load_snapshot, refresh_snapshot, default_directory
+    except ImportError:
+        raise click.ClickException("The snapshot needs NumPy: pip install numpy")
+    engine = get_engine()
+    directory = directory or default_directory(engine.url.render_as_string(hide_password=True))
+    started = time.perf_counter()
+    changes = refresh_snapshot(engine, directory, rebuild)
+    elapsed = time.perf_counter() - started
+    loaded = load_snapshot(directory)
+    for name, (added, rebuilt) in changes.items():
+        table = loaded[name]
+        how = "rebuilt" if rebuilt else "updated"
+        click.echo(f"{name}: {how}, {added} rows added, {len(table)} rows, {table.nbytes() / 2**20:.1f} MiB.")
+    click.echo(f"Snapshot in {directory} refreshed in {elapsed:.2f}s.")
+
+@cli.command('analyze')
+@date_range_options
+@click.option('--top', default=10, show_default=True, help="How many reasons, species, vets and medications to show.")
+@click.option('--refresh/--no-refresh', default=True, show_default=True, help="Add new rows to the snapshot first.")
+@click.option('--dir', 'directory', type=click.Path(file_okay=False), default=None,
+              help="Where the snapshot is kept (default: next to the database file).")
+@click.option('--json', 'as_json', is_flag=True, help="Print the results as JSON.")
+@click.option('--compare-orm', is_flag=True, help="Also compute the results from ORM objects and compare the time taken.")
+def analyze(first, last, top, refresh, directory, as_json, compare_orm):
+    """Count appointments and prescriptions by month, reason, species, vet and medication."""
+    import json
+    from .db import get_engine, session
+    from .archive import date_range
+    try:
+        from .snapshot import default_directory, load_snapshot, refresh_snapshot, summarize, summarize_with_orm
+    except ImportError:
+        raise click.ClickException("The snapshot needs NumPy: pip install numpy")
+    engine = get_engine()
+    directory = directory or default_directory(engine.url.render_as_string(hide_password=True))
+    if refresh:
+        refresh_snapshot(engine, directory)
+    loaded = load_snapshot(directory)
+    if loaded is None:
+        raise click.ClickException(f"No snapshot in {directory}; run `snapshot` first.")
+    start, end = date_range(first.date() if first else None, last.date() if last else None)
+    started = time.perf_counter()
+    result = summarize(loaded, start, end, top)
+    elapsed = time.perf_counter() - started
+
+    if as_json:
+        click.echo(json.dumps(result, indent=2, default=str))
+    else:
+        click.echo(f"Appointments: {result['appointments']}")
+        for title, key in (("By month", 'appointments_by_month'), ("By reason", 'appointments_by_reason'),
+                           ("By species", 'appointments_by_species'), ("By veterinarian ID", 'appointments_by_veterinarian'),
+                           ("Prescriptions by medication", 'prescriptions_by_medication')):
+            click.echo(f"\n{title}:")
+            for value, count in result[key].items():
+                click.echo(f"{value}: {count}")
+        click.echo(f"\nComputed from the snapshot in {elapsed * 1000:.1f} ms.")
+
+    if compare_orm:
+        started = time.perf_counter()
+        expected = summarize_with_orm(session, start, end, None)
+        orm_elapsed = time.perf_counter() - started
+        # Compare complete counts, since ties may be cut differently at --top.
+        same = summarize(loaded, start, end, None) == expected
+        click.echo(f"ORM iteration took {orm_elapsed * 1000:.1f} ms, {orm_elapsed / elapsed:.1f} times as long; "
+                   f"results {'match' if same else 'DIFFER'}.", err=as_json)
+
+@cli.command('archive')
+@click.option('--before', type=click.DateTime(formats=["%Y-%m-%d"]), required=True, help="Archive rows dated before this day (YYYY-MM-DD).")
+@click.option('--chunk-size', default=5000, show_default=True, help="Rows moved per transaction.")
+def archive(before, chunk_size):
+    """Move old appointments and prescriptions into yearly archive tables."""
+    from .db import get_engine
+    from .archive import ARCHIVED, archive_before
+    engine = get_engine()
+    started = time.perf_counter()
+    total = 0
+    for name in ARCHIVED:
+        for table_name, count in archive_before(engine, name, before.date(), chunk_size).items():
+            click.echo(f"Moved {count} {name} to {table_name}.")
+            total += count
+    if not total:
+        click.echo(f"Nothing dated before {before.date()} to archive.")
+        return
+    click.echo(f"Archived {total} rows in {time.perf_counter() - started:.2f}s.")
+
+@cli.command('purge-appointments')
+@click.option('--before', type=click.DateTime(formats=["%Y-%m-%d"]), required=True, help="Delete appointments dated before this day (YYYY-MM-DD).")
+@click.option('--chunk-size', default=5000, show_default=True, help="Rows deleted per transaction.")
+@click.option('--yes', is_flag=True, help="Don't ask for confirmation.")
+def purge_appointments(before, chunk_size, yes):
+    """Delete all appointments before a date, in short chunked transactions."""
+    from .db import get_engine
+    from .purge import appointments_before_conditions, count_rows, purge_appointments_before
+    before = before.date()
+    engine = get_engine()
+    with engine.connect() as connection:
+        count = sum(count_rows(connection, table, *conditions)
+                    for table, conditions in appointments_before_conditions(connection, before))
+    if not count:
+        click.echo(f"No appointments before {before}.")
+        return
+    if not yes and not click.confirm(f"Delete {count} appointments before {before}?"):
+        return
+    started = time.perf_counter()
+    deleted = purge_appointments_before(engine, before, chunk_size)
+    click.echo(f"Deleted {deleted} appointments in {time.perf_counter() - started:.2f}s.")
+
+@cli.command('purge-client')
+@click.option('--id', 'client_id', prompt="Enter the client ID to purge", type=int)
+@click.option('--chunk-size', default=5000, show_default=True, help="Rows deleted per transaction.")
+@click.option('--yes', is_flag=True, help="Don't ask for confirmation.")
+def purge_client(client_id, chunk_size, yes):
+    """Delete a client with all their animals, appointments and prescriptions."""
+    from .db import get_engine
+    from .cache import lookup_cache
+    from .purge import client_record_conditions, count_rows, purge_client as purge
+    engine = get_engine()
+    with engine.connect() as connection:
+        counts = {table.name: count_rows(connection, table, *conditions)
+                  for table, conditions in client_record_conditions(connection, client_id)}
+    if not counts['clients']:
+        raise click.ClickException("Client not found.")
+    summary = ", ".join(f"{count} {name}" for name, count in counts.items() if count)
+    if not yes and not click.confirm(f"Delete {summary}?"):
+        return
+    started = time.perf_counter()
+    deleted = purge(engine, client_id, chunk_size)
+    lookup_cache.invalidate('clients', 'animals')
+    summary = ", ".join(f"{count} {name}" for name, count in deleted.items() if count)
+    click.echo(f"Deleted {summary} in {time.perf_counter() - started:.2f}s.")
+
+@cli.command('remind')
+@click.option('--sink', default='stdout', show_default=True, envvar='VETERINARY_REMINDER_SINK',
+              help="Where to send reminders: stdout, file:PATH or module:factory.")
+@click.option('--workers', default=4, show_default=True, help="Threads sending reminders at once.")
+@click.option('--batch-size', default=200, show_default=True, help="Due jobs taken from the queue at a time.")
+@click.option('--poll', default=5.0, show_default=True, help="Most seconds to wait before looking for new jobs.")
+@click.option('--max-attempts', default=5, show_default=True, help="Tries before a job is marked failed.")
+@click.option('--once', is_flag=True, help="Send what is due now and exit instead of running until stopped.")
+def remind(sink, workers, batch_size, poll, max_attempts, once):
+    """Send appointment reminders, follow-ups and refill reminders as they fall due."""
+    from collections import Counter
+    from .db import get_engine
+    from .reminders import open_sink, run_worker
+    try:
+        target = open_sink(sink)
+    except (ImportError, AttributeError, OSError, ValueError) as e:
+        raise click.ClickException(f"Could not open sink '{sink}': {e}")
+    totals = Counter()
+    started = time.perf_counter()
+
+    def report(outcomes):
+        totals.update(outcomes)
+        click.echo(", ".join(f"{count} {outcome}" for outcome, count in sorted(outcomes.items())), err=True)
+
+    if not once:
+        click.echo(f"Sending reminders to {sink} (Ctrl+C to stop)", err=True)
+    try:
+        run_worker(get_engine(), target, workers, batch_size, poll, max_attempts, once, report=report)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if hasattr(target, 'close'):
+            target.close()
+    click.echo(f"Sent {totals['sent']} reminders in {time.perf_counter() - started:.2f}s: "
+               f"{totals['retrying']} to retry, {totals['failed']} failed, {totals['dropped']} dropped.", err=True)
+
+@cli.command('reminders')
+@click.option('--retry-failed', is_flag=True, help="Queue the jobs that ran out of attempts again.")
+def reminders(retry_failed):
+    """Show the reminder queue."""
+    from .db import get_engine
+    from .reminders import queue_status, retry_failed as requeue
+    now = datetime.now()
+    with get_engine().begin() as connection:
+        if retry_failed:
+            click.echo(f"Queued {requeue(connection, now)} failed job(s) again.")
+        rows = queue_status(connection, now)
+    if not rows:
+        click.echo("No reminders queued.")
+    for kind, status, jobs, due, earliest in rows:
+        click.echo(f"{kind} {status}: {jobs} job(s), {due} due now, earliest {earliest:%Y-%m-%d %H:%M}")
+
+@cli.command('metrics')
+@click.option('--file', 'path', type=click.Path(dir_okay=False), envvar='VETERINARY_METRICS_FILE', required=True,
+              help="Metrics file written by instrumented runs (default: $VETERINARY_METRICS_FILE).")
+@click.option('--format', 'fmt', type=click.Choice(['json', 'prometheus']), default='json', show_default=True)
+@click.option('--slowest', default=20, show_default=True, help="How many of the slowest logged statements to include.")
+@click.option('--reset', is_flag=True, help="Empty the metrics file after printing.")
+def metrics(path, fmt, slowest, reset):
+    """Summarize command timings, statement counts and slow queries."""
+    import json
+    from .metrics import prometheus_text, read_records, summarize
+    summary = summarize(read_records(path), slowest)
+    if fmt == 'prometheus':
+        click.echo(prometheus_text(summary), nl=False)
+    else:
+        click.echo(json.dumps(summary, indent=2))
+    if reset:
+        open(path, 'w').close()
 
 if __name__ == '__main__':
     cli()
@@ -0,0 +1,175 @@
+import heapq
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import groupby, islice
+from sqlalchemy import func, or_, select
+from .archive import source_for
+from .db import CLINICS_DIR, clinic_url, create_db_engine
+from .models import Client
+
+# Queries across every clinic of a group. Each clinic has its own SQLite
+# file in CLINICS_DIR; fan_out() runs the same query on all of them at once
+# from a thread pool (SQLite releases the GIL while it works) and yields rows
+# as they arrive, so a cross-clinic query takes about as long as the slowest
+# clinic rather than the sum of all of them.
+
+class ClinicQueryError(RuntimeError):
+    """A fanned-out query failed on one clinic's database."""
+
+    def __init__(self, clinic, error):
+        super().__init__(f"{clinic}: {error}")
+        self.clinic = clinic
+
+class EngineRegistry:
+    """One engine per clinic database, created on first use."""
+
+    def __init__(self, directory=None, pool_size=None):
+        self.directory = directory or CLINICS_DIR
+        self.pool_size = pool_size
+        self._engines = {}
+        self._lock = threading.Lock()
+
+    def names(self):
+        """Clinics with a database file, sorted by name."""
+        try:
+            files = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted(name[:-3] for name in files if name.endswith('.db'))
+
+    def engine(self, clinic):
+        with self._lock:
+            engine = self._engines.get(clinic)
+            if engine is None:
+                engine = self._engines[clinic] = create_db_engine(
+                    clinic_url(clinic, self.directory), pool_size=self.pool_size)
+            return engine
+
+    def dispose(self):
+        with self._lock:
+            for engine in self._engines.values():
+                engine.dispose()
+            self._engines.clear()
+
+registry = EngineRegistry()
+
+_DONE = object()
+
+def _put(out, item, stop):
+    # Waits for room in the queue, unless the reader has gone away.
+    while not stop.is_set():
+        try:
+            out.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def _run_shard(registry, clinic, query, out, stop, batch_size):
+    try:
+        with registry.engine(clinic).connect() as connection:
+            rows = iter(query(connection, clinic))
+            while not stop.is_set():
+                batch = list(islice(rows, batch_size))
+                if not batch or not _put(out, (clinic, batch), stop):
+                    break
+    except Exception as e:
+        _put(out, ClinicQueryError(clinic, e), stop)
+    finally:
+        _put(out, _DONE, stop)
+
+def _drain(out):
+    """Rows from one queue until its shard is done."""
+    while True:
+        item = out.get()
+        if item is _DONE:
+            return
+        if isinstance(item, ClinicQueryError):
+            raise item
+        clinic, batch = item
+        for row in batch:
+            yield clinic, row
+
+def fan_out(query, clinics=None, key=None, max_workers=None, registry=registry, batch_size=500, buffer=8):
+    """Run `query(connection, clinic)` on each clinic's database in parallel.
+
+    Yields (clinic, row) pairs while the queries are still running. Without
+    `key` rows come in whatever order the clinics produce them; with `key`,
+    each query must return rows sorted by `key(row)` and the streams are
+    merged into one sorted stream, using one thread per clinic whatever
+    `max_workers` says. Each clinic's thread buffers at most `buffer`
+    batches of `batch_size` rows ahead of the reader.
+    """
+    clinics = registry.names() if clinics is None else list(clinics)
+    if not clinics:
+        return
+    stop = threading.Event()
+    if key is None:
+        # Unordered: one queue shared by every clinic.
+        shared = queue.Queue(maxsize=buffer * len(clinics))
+        queues = {clinic: shared for clinic in clinics}
+        workers = max_workers or min(32, len(clinics))
+    else:
+        queues = {clinic: queue.Queue(maxsize=buffer) for clinic in clinics}
+        # The merge needs a row from every clinic before it can yield, so
+        # each clinic needs its own thread: a clinic still waiting for a
+        # worker would block the ones whose queues are full.
+        workers = len(clinics)
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='clinic')
+    try:
+        for clinic in clinics:
+            executor.submit(_run_shard, registry, clinic, query, queues[clinic], stop, batch_size)
+        if key is None:
+            remaining = len(clinics)
+            while remaining:
+                item = shared.get()
+                if item is _DONE:
+                    remaining -= 1
+                elif isinstance(item, ClinicQueryError):
+                    raise item
+                else:
+                    clinic, batch = item
+                    for row in batch:
+                        yield clinic, row
+        else:
+            yield from heapq.merge(*(_drain(queues[clinic]) for clinic in clinics), key=lambda item: key(item[1]))
+    finally:
+        # Lets the threads finish early if the reader stopped or failed.
+        stop.set()
+        executor.shutdown(wait=True)
+
+def client_query(phone=None, email=None, name=None):
+    """A fan_out() query for clients matching any of the given fields."""
+    conditions = []
+    if phone:
+        conditions.append(Client.phone == phone)
+    if email:
+        conditions.append(func.lower(Client.email) == email.lower())
+    if name:
+        conditions.append(Client.name.ilike(f"%{name}%"))
+    statement = select(Client.id, Client.name, Client.email, Client.phone).where(or_(*conditions)).order_by(Client.id)
+
+    def query(connection, clinic):
+        return connection.execute(statement)
+    return query
+
+def appointments_per_day_query(start=None, end=None):
+    """A fan_out() query for (day, appointments) in [start, end), ordered by day.
+
+    Archived appointments are included.
+    """
+    def query(connection, clinic):
+        source = source_for(connection, 'appointments', start, end)
+        return connection.execute(
+            select(source.c.date, func.count()).where(source.c.date.is_not(None))
+            .group_by(source.c.date).order_by(source.c.date)
+        )
+    return query
+
+def appointments_per_day(start=None, end=None, clinics=None, registry=registry):
+    """Yield (day, {clinic: appointments}) for the whole group, in day order."""
+    rows = fan_out(appointments_per_day_query(start, end), clinics, key=lambda row: row[0], registry=registry)
+    for day, group in groupby(rows, key=lambda item: item[1][0]):
+        yield day, {clinic: count for clinic, (_, count) in group}
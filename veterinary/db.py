@@ -1,10 +1,86 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import os
+import re
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker, scoped_session
 from sqlalchemy.ext.declarative import declarative_base
 
-DATABASE_URL = "sqlite:///veterinary.db"
+# A group of clinics keeps one SQLite file per clinic in CLINICS_DIR.
+# Setting VETERINARY_CLINIC (or passing --clinic to the CLI) points the
+# engine at that clinic's file instead of VETERINARY_DATABASE_URL.
+CLINICS_DIR = os.environ.get("VETERINARY_CLINICS_DIR", "clinics")
+CLINIC_NAME = re.compile(r"[A-Za-z0-9_-]+")
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-session = SessionLocal()
+def clinic_url(name, directory=None):
+    """The database URL of the clinic called `name`."""
+    if not CLINIC_NAME.fullmatch(name):
+        raise ValueError(f"Invalid clinic name {name!r}: use letters, digits, '-' and '_'.")
+    return f"sqlite:///{os.path.join(directory or CLINICS_DIR, name + '.db')}"
+
+CLINIC = os.environ.get("VETERINARY_CLINIC") or None
+DATABASE_URL = clinic_url(CLINIC) if CLINIC else os.environ.get("VETERINARY_DATABASE_URL", "sqlite:///veterinary.db")
+
+# Applied to every new SQLite connection. WAL lets readers run alongside a
+# writer, and busy_timeout makes a second writer wait for the lock instead of
+# failing straight away with "database is locked". SQLite only enforces
+# foreign keys, and their ON DELETE actions, when foreign_keys is on.
+SQLITE_PRAGMAS = {
+    "foreign_keys": "ON",
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -64000,  # negative means KiB, so 64 MB
+    "mmap_size": 256 * 1024 * 1024,
+    "busy_timeout": int(os.environ.get("VETERINARY_BUSY_TIMEOUT", 5000)),
+}
+
+def apply_sqlite_pragmas(engine, pragmas=None):
+    """Run SQLITE_PRAGMAS, updated with `pragmas`, on each new connection of a SQLite engine."""
+    if engine.dialect.name != "sqlite":
+        return
+    settings = dict(SQLITE_PRAGMAS, **(pragmas or {}))
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in settings.items():
+            if value is not None:
+                cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+def engine_options(pool_size=None, **kwargs):
+    """Keyword arguments for create_engine, with the pool size from VETERINARY_POOL_SIZE by default."""
+    pool_size = pool_size or os.environ.get("VETERINARY_POOL_SIZE")
+    if pool_size:
+        kwargs["pool_size"] = int(pool_size)
+    return kwargs
+
+def create_db_engine(url=None, pool_size=None, pragmas=None, **kwargs):
+    """Create an engine for `url` (default: VETERINARY_DATABASE_URL).
+
+    SQLite connections get SQLITE_PRAGMAS, updated with `pragmas`. The pool
+    size defaults to VETERINARY_POOL_SIZE when that is set.
+    """
+    engine = create_engine(url or DATABASE_URL, **engine_options(pool_size, **kwargs))
+    apply_sqlite_pragmas(engine, pragmas)
+    return engine
+
+_engine = None
+
+def get_engine():
+    """The shared engine, created on first use."""
+    global _engine
+    if _engine is None:
+        _engine = create_db_engine()
+    return _engine
+
+def __getattr__(name):
+    # `from veterinary.db import engine` keeps working without creating the
+    # engine at import time.
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
+# Thread-local session proxy; call session.remove() when a unit of work ends.
+# Sessions are bound when first used, so importing this module is cheap.
+session = scoped_session(lambda: SessionLocal(bind=get_engine()))
 Base = declarative_base()
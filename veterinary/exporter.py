@@ -0,0 +1,97 @@
+import csv
+import gzip
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import select, Integer, Float, Date, DateTime, Time
+from .archive import ARCHIVED, source_for
+from .models import Base, Appointment
+
+FORMATS = ('csv', 'jsonl', 'parquet')
+
+TABLES = tuple(Base.metadata.tables)
+
+def _open_text(path, compress):
+    if compress:
+        return gzip.open(path, 'wt', newline='', encoding='utf-8')
+    return open(path, 'w', newline='', encoding='utf-8')
+
+def write_csv(path, columns, batches, compress=False):
+    with _open_text(path, compress) as f:
+        writer = csv.writer(f)
+        writer.writerow([column.name for column in columns])
+        for batch in batches:
+            writer.writerows(batch)
+
+def write_jsonl(path, columns, batches, compress=False):
+    names = [column.name for column in columns]
+    with _open_text(path, compress) as f:
+        for batch in batches:
+            for row in batch:
+                f.write(json.dumps(dict(zip(names, row)), default=str) + '\n')
+
+def write_parquet(path, columns, batches, compress=False):
+    # pyarrow is optional; it is only needed for this format.
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export requires pyarrow (pip install pyarrow).")
+
+    # DateTime before Date, as the first isinstance match wins.
+    arrow_types = {Integer: pa.int64(), Float: pa.float64(), DateTime: pa.timestamp('us'), Date: pa.date32(),
+                   Time: pa.time64('us')}
+    schema = pa.schema([
+        (column.name, next((t for sql_type, t in arrow_types.items() if isinstance(column.type, sql_type)), pa.string()))
+        for column in columns
+    ])
+    with pq.ParquetWriter(path, schema, compression='zstd') as writer:
+        for batch in batches:
+            arrays = [pa.array(values, type=field.type) for values, field in zip(zip(*batch), schema)]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+
+WRITERS = {'csv': write_csv, 'jsonl': write_jsonl, 'parquet': write_parquet}
+
+def export_path(output_dir, table_name, fmt, compress=False):
+    path = os.path.join(output_dir, f"{table_name}.{fmt}")
+    return path + '.gz' if compress and fmt != 'parquet' else path
+
+def export_table(engine, table_name, output_dir, fmt='csv', since=None, batch_size=10000, compress=False):
+    """Stream one table to a file, batch_size rows at a time.
+
+    Only one batch is held in memory at once. Appointments and prescriptions
+    include their archived rows. `since` restricts appointments to those on
+    or after that date; other tables are always exported in full. Returns
+    (path, row count).
+    """
+    table = Base.metadata.tables[table_name]
+    columns = list(table.columns)
+    path = export_path(output_dir, table_name, fmt, compress)
+
+    count = 0
+    with engine.connect() as connection:
+        if table_name in ARCHIVED:
+            start = since if table is Appointment.__table__ else None
+            source = source_for(connection, table_name, start)
+        else:
+            source = table
+        query = select(source).order_by(*(source.c[column.name] for column in table.primary_key.columns))
+        result = connection.execution_options(stream_results=True, yield_per=batch_size).execute(query)
+
+        def batches():
+            nonlocal count
+            for partition in result.partitions():
+                count += len(partition)
+                yield partition
+
+        WRITERS[fmt](path, columns, batches(), compress)
+    return path, count
+
+def export_tables(engine, table_names, output_dir, parallel=1, **options):
+    """Export several tables, up to `parallel` at a time, each on its own connection."""
+    os.makedirs(output_dir, exist_ok=True)
+    if parallel <= 1:
+        return [export_table(engine, name, output_dir, **options) for name in table_names]
+    with ThreadPoolExecutor(max_workers=parallel) as pool:
+        futures = [pool.submit(export_table, engine, name, output_dir, **options) for name in table_names]
+        return [future.result() for future in futures]
@@ -0,0 +1,347 @@
+import csv
+import json
+import os
+from datetime import date as Date, time as Time
+from itertools import islice
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+from .models import Client, Veterinarian, Specialization, Animal, Appointment, Prescription
+
+ENTITIES = ('clients', 'specializations', 'veterinarians', 'animals', 'appointments', 'prescriptions')
+
+class RejectedRow(Exception):
+    """Raised by a row converter when a row cannot be imported."""
+
+class MalformedRow(dict):
+    """Yielded by read_rows() in place of a line that isn't a JSON object.
+
+    Holds the line number and text, which are written to the reject file.
+    """
+
+    def __init__(self, line_number, text, reason):
+        super().__init__(line=line_number, text=text)
+        self.reason = reason
+
+def read_rows(path, fmt=None):
+    """Yield each record of a CSV or JSONL file as a dict, one at a time."""
+    fmt = fmt or ('jsonl' if path.endswith(('.jsonl', '.json')) else 'csv')
+    with open(path, newline='', encoding='utf-8') as f:
+        if fmt == 'csv':
+            yield from csv.DictReader(f)
+        else:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield MalformedRow(line_number, line.rstrip('\r\n'), f"line {line_number}: invalid JSON ({e.msg})")
+                    continue
+                if isinstance(record, dict):
+                    yield record
+                else:
+                    yield MalformedRow(line_number, line.rstrip('\r\n'), f"line {line_number}: not a JSON object")
+
+def chunked(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+def _required(row, field):
+    value = row.get(field)
+    if value is None or str(value).strip() == '':
+        raise RejectedRow(f"missing {field}")
+    return str(value).strip()
+
+def _optional_date(value):
+    if value is None or str(value).strip() == '':
+        return None
+    try:
+        return Date.fromisoformat(str(value).strip())
+    except ValueError:
+        raise RejectedRow(f"invalid date '{value}'")
+
+def _optional_time(value):
+    if value is None or str(value).strip() == '':
+        return None
+    try:
+        return Time.fromisoformat(str(value).strip())
+    except ValueError:
+        raise RejectedRow(f"invalid time '{value}'")
+
+def _optional_int(value):
+    if value is None or str(value).strip() == '':
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise RejectedRow(f"invalid integer '{value}'")
+
+def _optional_float(value):
+    if value is None or str(value).strip() == '':
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        raise RejectedRow(f"invalid number '{value}'")
+
+def _deferrable_triggers(table):
+    """{insert trigger name: catch-up(connection, after rowid)} for the triggers a bulk insert can skip.
+
+    Each catch-up does, with set-based statements, what the trigger would
+    have done for every row past the rowid.
+    """
+    from .changes import log_table_rows
+    from .reminders import backfill_reminders
+    from .search import index_rows
+    from .stats import add_to_stats
+    name = table.name
+    return {
+        f"{name}_search_insert": lambda connection, after: index_rows(connection, name, after),
+        f"{name}_stats_insert": lambda connection, after: add_to_stats(connection, name, name, after),
+        f"{name}_reminders_insert": lambda connection, after: backfill_reminders(connection, name, after),
+        f"{name}_changes_insert": lambda connection, after: log_table_rows(connection, table, after),
+    }
+
+class Importer:
+    """Bulk-load one entity type from a stream of dict rows.
+
+    Foreign keys are resolved against lookup maps built with one query per
+    referenced table, rows are inserted with a single executemany per batch
+    and each batch is committed once. Rows that cannot be imported are
+    passed to `reject(row, reason)`.
+    """
+
+    def __init__(self, session, entity, reject):
+        if entity not in ENTITIES:
+            raise ValueError(f"Unknown entity '{entity}'")
+        self.session = session
+        self.entity = entity
+        self.reject = reject
+        self.model = {
+            'clients': Client,
+            'specializations': Specialization,
+            'veterinarians': Veterinarian,
+            'animals': Animal,
+            'appointments': Appointment,
+            'prescriptions': Prescription,
+        }[entity]
+        self.convert = getattr(self, f"_convert_{entity}")
+        self._load_lookups()
+
+    def _load_lookups(self):
+        query = self.session.query
+        if self.entity == 'clients':
+            self.emails, self.phones = set(), set()
+            for email, phone in query(Client.email, Client.phone):
+                self.emails.add(email)
+                self.phones.add(phone)
+        elif self.entity == 'specializations':
+            self.spec_names = {name for name, in query(Specialization.name)}
+        if self.entity in ('animals', 'appointments', 'prescriptions'):
+            self.client_ids = {email: id for id, email in query(Client.id, Client.email)}
+            self.known_client_ids = set(self.client_ids.values())
+        if self.entity in ('appointments', 'prescriptions'):
+            self.animal_ids, self.known_animal_ids = {}, set()
+            for id, owner_id, name in query(Animal.id, Animal.owner_id, Animal.name).order_by(Animal.id):
+                self.animal_ids.setdefault((owner_id, name), id)
+                self.known_animal_ids.add(id)
+        if self.entity == 'appointments':
+            self.vet_ids, self.known_vet_ids = {}, set()
+            for id, name in query(Veterinarian.id, Veterinarian.name).order_by(Veterinarian.id):
+                self.vet_ids.setdefault(name, id)
+                self.known_vet_ids.add(id)
+
+    # Foreign key resolution: an explicit *_id column wins, otherwise the
+    # natural key (client email, owner email + animal name, vet name) is used.
+
+    def _client_id(self, row, id_field, email_field):
+        client_id = _optional_int(row.get(id_field))
+        if client_id is not None:
+            if client_id not in self.known_client_ids:
+                raise RejectedRow(f"unknown {id_field} {client_id}")
+            return client_id
+        email = row.get(email_field)
+        if email:
+            if email not in self.client_ids:
+                raise RejectedRow(f"unknown {email_field} '{email}'")
+            return self.client_ids[email]
+        return None
+
+    def _animal_id(self, row, owner_id):
+        animal_id = _optional_int(row.get('animal_id'))
+        if animal_id is not None:
+            if animal_id not in self.known_animal_ids:
+                raise RejectedRow(f"unknown animal_id {animal_id}")
+            return animal_id
+        name = row.get('animal_name')
+        if name:
+            if (owner_id, name) not in self.animal_ids:
+                raise RejectedRow(f"unknown animal '{name}' for owner {owner_id}")
+            return self.animal_ids[(owner_id, name)]
+        return None
+
+    def _convert_clients(self, row):
+        mapping = {
+            'name': _required(row, 'name'),
+            'email': _required(row, 'email'),
+            'phone': _required(row, 'phone'),
+        }
+        if mapping['email'] in self.emails:
+            raise RejectedRow(f"duplicate email '{mapping['email']}'")
+        if mapping['phone'] in self.phones:
+            raise RejectedRow(f"duplicate phone '{mapping['phone']}'")
+        self.emails.add(mapping['email'])
+        self.phones.add(mapping['phone'])
+        return mapping
+
+    def _convert_specializations(self, row):
+        name = _required(row, 'name')
+        if name in self.spec_names:
+            raise RejectedRow(f"duplicate name '{name}'")
+        self.spec_names.add(name)
+        return {'name': name}
+
+    def _convert_veterinarians(self, row):
+        return {'name': _required(row, 'name')}
+
+    def _convert_animals(self, row):
+        return {
+            'name': _required(row, 'name'),
+            'species': _required(row, 'species'),
+            'breed': row.get('breed') or None,
+            'age': _optional_int(row.get('age')),
+            'weight': _optional_float(row.get('weight')),
+            'owner_id': self._client_id(row, 'owner_id', 'owner_email'),
+        }
+
+    def _convert_appointments(self, row):
+        date = _required(row, 'date')
+        try:
+            date = Date.fromisoformat(date)
+        except ValueError:
+            raise RejectedRow(f"invalid date '{date}'")
+        client_id = self._client_id(row, 'client_id', 'client_email')
+
+        vet_id = _optional_int(row.get('veterinarian_id'))
+        if vet_id is not None and vet_id not in self.known_vet_ids:
+            raise RejectedRow(f"unknown veterinarian_id {vet_id}")
+        if vet_id is None and row.get('veterinarian_name'):
+            vet_id = self.vet_ids.get(row['veterinarian_name'])
+            if vet_id is None:
+                raise RejectedRow(f"unknown veterinarian '{row['veterinarian_name']}'")
+
+        return {
+            'date': date,
+            'start_time': _optional_time(row.get('start_time')),
+            'end_time': _optional_time(row.get('end_time')),
+            'reason': _required(row, 'reason'),
+            'client_id': client_id,
+            'animal_id': self._animal_id(row, client_id),
+            'veterinarian_id': vet_id,
+        }
+
+    def _convert_prescriptions(self, row):
+        owner_id = self._client_id(row, 'owner_id', 'owner_email')
+        return {
+            'medication': _required(row, 'medication'),
+            'dosage': _required(row, 'dosage'),
+            'date': _optional_date(row.get('date')),
+            'animal_id': self._animal_id(row, owner_id),
+        }
+
+    def insert_batch(self, rows):
+        """Convert, insert and commit one batch. Returns the number inserted."""
+        mappings = []
+        sources = []
+        for row in rows:
+            try:
+                if isinstance(row, MalformedRow):
+                    raise RejectedRow(row.reason)
+                mappings.append(self.convert(row))
+                sources.append(row)
+            except RejectedRow as e:
+                self.reject(row, str(e))
+        if not mappings:
+            return 0
+
+        table = self.model.__table__
+        try:
+            self._bulk_insert(table, mappings)
+            self.session.commit()
+            return len(mappings)
+        except IntegrityError:
+            # Something the lookup maps could not see (e.g. a concurrent
+            # writer) broke a constraint; retry row by row to isolate it.
+            self.session.rollback()
+        inserted = 0
+        for row, mapping in zip(sources, mappings):
+            try:
+                self.session.execute(table.insert(), [mapping])
+                self.session.commit()
+                inserted += 1
+            except IntegrityError as e:
+                self.session.rollback()
+                self.reject(row, str(e.orig))
+        return inserted
+
+    def _bulk_insert(self, table, mappings):
+        """Insert a batch with one executemany.
+
+        On SQLite the table's search index, summary, reminder and change log
+        insert triggers, which cost several statements per row, are dropped
+        for the insert and their work done for the whole batch afterwards,
+        then they are recreated, all in the batch's transaction: other
+        connections never see the table without its triggers.
+        """
+        connection = self.session.connection()
+        if connection.dialect.name != 'sqlite':
+            connection.execute(table.insert(), mappings)
+            return
+        # pysqlite only opens a transaction itself before DML, and would
+        # commit the DROP TRIGGERs on their own. IMMEDIATE also takes the
+        # write lock, so no other rows can arrive past `after` meanwhile.
+        if not connection.connection.driver_connection.in_transaction:
+            connection.exec_driver_sql("BEGIN IMMEDIATE")
+        catch_up = _deferrable_triggers(table)
+        deferred = [(name, sql) for name, sql in connection.execute(
+            text("SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = :table"),
+            {'table': table.name}) if name in catch_up]
+        for name, _ in deferred:
+            connection.execute(text(f"DROP TRIGGER {name}"))
+        after = connection.execute(text(f"SELECT coalesce(max(rowid), 0) FROM {table.name}")).scalar()
+        connection.execute(table.insert(), mappings)
+        for name, sql in deferred:
+            catch_up[name](connection, after)
+            connection.execute(text(sql))
+
+    def run(self, rows, batch_size=5000):
+        inserted = 0
+        for batch in chunked(rows, batch_size):
+            inserted += self.insert_batch(batch)
+        return inserted
+
+class RejectWriter:
+    """Append rejected rows, with the reason, to a JSONL file opened on first use."""
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._file = None
+
+    def __call__(self, row, reason):
+        if self._file is None:
+            self._file = open(self.path, 'w', encoding='utf-8')
+        self._file.write(json.dumps({'row': row, 'reason': reason}) + '\n')
+        self.count += 1
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+def default_reject_path(path):
+    base, _ = os.path.splitext(path)
+    return f"{base}.rejects.jsonl"
@@ -0,0 +1,92 @@
+import asyncio
+import json
+import random
+import time
+
+# Load generator for the API server: `concurrency` keep-alive clients issue
+# `requests` GETs between them (list pages and single rows across all
+# resources) and the latencies are summarised as p50/p99 and throughput.
+
+PATHS = ['/clients', '/veterinarians', '/specializations', '/animals', '/appointments', '/prescriptions']
+
+async def _request(reader, writer, host, path):
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode('latin-1'))
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.lower() == 'content-length':
+            length = int(value)
+    body = await reader.readexactly(length) if length else b''
+    return status, body
+
+async def _client(host, port, paths, latencies, errors):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while paths:
+            path = paths.pop()
+            started = time.perf_counter()
+            try:
+                status, _ = await _request(reader, writer, host, path)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                errors.append(path)
+                writer.close()
+                reader, writer = await asyncio.open_connection(host, port)
+                continue
+            latencies.append(time.perf_counter() - started)
+            if status >= 500:
+                errors.append(path)
+    finally:
+        writer.close()
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+async def _max_id(host, port, path):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        # Follow the pages to the last one: IDs needn't be dense.
+        highest, after_id = 0, 0
+        while after_id is not None:
+            _, body = await _request(reader, writer, host, f"{path}?limit=1000&after_id={after_id}")
+            page = json.loads(body)
+            if page['items']:
+                highest = page['items'][-1]['id']
+            after_id = page['next_after_id']
+        return highest
+    finally:
+        writer.close()
+
+async def run_load_test(host='127.0.0.1', port=8000, concurrency=100, requests=10000, page_size=50, seed=0):
+    """Hammer the server and return a dict of latency and throughput figures."""
+    rng = random.Random(seed)
+    max_ids = {path: await _max_id(host, port, path) for path in PATHS}
+    paths = []
+    for _ in range(requests):
+        path = rng.choice(PATHS)
+        if max_ids[path] and rng.random() < 0.5:
+            paths.append(f"{path}/{rng.randint(1, max_ids[path])}")
+        else:
+            paths.append(f"{path}?limit={page_size}&after_id={rng.randint(0, max_ids[path])}")
+
+    latencies, errors = [], []
+    started = time.perf_counter()
+    await asyncio.gather(*(_client(host, port, paths, latencies, errors) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'concurrency': concurrency,
+        'seconds': elapsed,
+        'requests_per_second': len(latencies) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+    }
@@ -0,0 +1,199 @@
+import json
+import os
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import click
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Opt-in instrumentation, enabled by setting VETERINARY_METRICS_FILE. Every
+# CLI command is timed, and every SQL statement run on any engine while it
+# runs is counted against it; statements slower than
+# VETERINARY_SLOW_QUERY_MS (default 100) are also logged, without their
+# parameters. When the outermost command finishes, one JSON line per command
+# and slow statement is appended to the file, so many short CLI processes can
+# share it. `metrics` summarizes the file as JSON or Prometheus text.
+#
+# The per-statement cost is two perf_counter() calls and a few additions.
+
+METRICS_FILE = os.environ.get("VETERINARY_METRICS_FILE")
+SLOW_QUERY_MS = float(os.environ.get("VETERINARY_SLOW_QUERY_MS", 100))
+
+# Upper bounds, in seconds, of the command duration histogram buckets.
+BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+MAX_STATEMENT_LENGTH = 2000
+
+def _now():
+    return datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+class Recorder:
+    """Collects command timings and statement counts for one process."""
+
+    def __init__(self, path, slow_query_ms=SLOW_QUERY_MS):
+        self.path = path
+        self.slow_seconds = slow_query_ms / 1000
+        self._commands = []  # frames of the commands running, innermost last
+        self._records = []
+        self._installed = False
+
+    def install(self):
+        """Listen to statements on every engine, including ones not created yet."""
+        if not self._installed:
+            event.listen(Engine, "before_cursor_execute", self._before_execute)
+            event.listen(Engine, "after_cursor_execute", self._after_execute)
+            event.listen(Engine, "handle_error", self._failed_execute)
+            self._installed = True
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        context.metrics_started = time.perf_counter()
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self._record_statement(context, statement, executemany)
+
+    def _failed_execute(self, exception_context):
+        # Statements that raise never reach after_cursor_execute.
+        context = exception_context.execution_context
+        if context is not None and hasattr(context, 'metrics_started'):
+            self._record_statement(context, exception_context.statement or "", False)
+
+    def _record_statement(self, context, statement, executemany):
+        seconds = time.perf_counter() - context.metrics_started
+        commands = self._commands
+        if not commands:
+            return
+        frame = commands[-1]
+        frame['statements'] += 1
+        frame['sql_seconds'] += seconds
+        if seconds >= self.slow_seconds:
+            frame['slow_queries'] += 1
+            self._records.append({
+                'type': 'slow_query',
+                'time': _now(),
+                'command': frame['command'],
+                'seconds': round(seconds, 6),
+                'statement': statement[:MAX_STATEMENT_LENGTH],
+                'executemany': executemany,
+            })
+
+    @contextmanager
+    def command(self, name):
+        """Time one command invocation; commands may nest (menu, batch)."""
+        frame = {'command': name, 'statements': 0, 'sql_seconds': 0.0, 'slow_queries': 0}
+        self._commands.append(frame)
+        started = time.perf_counter()
+        error = False
+        try:
+            yield frame
+        except click.exceptions.Exit as e:
+            error = e.exit_code != 0
+            raise
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self._commands.pop()
+            self._records.append(dict(
+                frame, type='command', time=_now(), error=error,
+                seconds=round(time.perf_counter() - started, 6), sql_seconds=round(frame['sql_seconds'], 6),
+            ))
+            if not self._commands:
+                self.flush()
+
+    def flush(self):
+        if not self._records:
+            return
+        lines = "".join(json.dumps(record) + "\n" for record in self._records)
+        self._records = []
+        # One append per process keeps concurrent writers' lines whole.
+        with open(self.path, 'a') as f:
+            f.write(lines)
+
+_recorder = None
+
+def recorder():
+    """The process-wide Recorder, installed on first use."""
+    global _recorder
+    if _recorder is None:
+        _recorder = Recorder(METRICS_FILE)
+        _recorder.install()
+    return _recorder
+
+def read_records(path):
+    try:
+        with open(path) as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue  # a line cut short by a crash
+    except FileNotFoundError:
+        return
+
+def summarize(records, slowest=20):
+    """Totals per command and the slowest logged statements."""
+    commands = defaultdict(lambda: {
+        'invocations': 0, 'errors': 0, 'seconds_total': 0.0, 'seconds_max': 0.0,
+        'statements_total': 0, 'sql_seconds_total': 0.0, 'slow_queries': 0,
+        'buckets': dict.fromkeys(map(str, BUCKETS), 0),
+    })
+    slow = []
+    for record in records:
+        if record.get('type') == 'slow_query':
+            slow.append(record)
+            continue
+        totals = commands[record['command']]
+        totals['invocations'] += 1
+        totals['errors'] += record['error']
+        totals['seconds_total'] += record['seconds']
+        totals['seconds_max'] = max(totals['seconds_max'], record['seconds'])
+        totals['statements_total'] += record['statements']
+        totals['sql_seconds_total'] += record['sql_seconds']
+        totals['slow_queries'] += record['slow_queries']
+        for bound in BUCKETS:
+            if record['seconds'] <= bound:
+                totals['buckets'][str(bound)] += 1
+    for totals in commands.values():
+        totals['seconds_total'] = round(totals['seconds_total'], 6)
+        totals['sql_seconds_total'] = round(totals['sql_seconds_total'], 6)
+        totals['seconds_mean'] = round(totals['seconds_total'] / totals['invocations'], 6)
+    slow.sort(key=lambda record: record['seconds'], reverse=True)
+    return {'commands': dict(sorted(commands.items())), 'slow_queries': slow[:slowest]}
+
+def _label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def prometheus_text(summary):
+    """The summary in the Prometheus text exposition format."""
+    lines = []
+    def metric(name, kind, help, samples):
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(samples)
+
+    commands = summary['commands']
+    def per_command(key):
+        return [f'{{command="{_label(name)}"}} {totals[key]}' for name, totals in commands.items()]
+
+    histogram = []
+    for name, totals in commands.items():
+        label = _label(name)
+        # summarize() counts each command in every bucket it fits, so the
+        # counts are already cumulative as Prometheus expects.
+        for bound, count in totals['buckets'].items():
+            histogram.append(f'veterinary_command_duration_seconds_bucket{{command="{label}",le="{bound}"}} {count}')
+        histogram.append(f'veterinary_command_duration_seconds_bucket{{command="{label}",le="+Inf"}} {totals["invocations"]}')
+        histogram.append(f'veterinary_command_duration_seconds_sum{{command="{label}"}} {totals["seconds_total"]}')
+        histogram.append(f'veterinary_command_duration_seconds_count{{command="{label}"}} {totals["invocations"]}')
+    metric('veterinary_command_duration_seconds', 'histogram', "Wall time of CLI commands.", histogram)
+
+    for name, key, help in (
+        ('veterinary_command_errors_total', 'errors', "CLI commands that failed."),
+        ('veterinary_sql_statements_total', 'statements_total', "SQL statements executed by CLI commands."),
+        ('veterinary_sql_duration_seconds_total', 'sql_seconds_total', "Time spent executing SQL statements."),
+        ('veterinary_slow_queries_total', 'slow_queries', "SQL statements slower than the slow-query threshold."),
+    ):
+        metric(name, 'counter', help, [name + sample for sample in per_command(key)])
+    return "\n".join(lines) + "\n"
@@ -1,12 +1,15 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Table, Date, Text
+import datetime
+from sqlalchemy import Column, Integer, Float, String, ForeignKey, Table, Date, DateTime, Time, Text, Index
 from sqlalchemy.orm import relationship
 from veterinary.db import Base
 
 # Association Table between Veterinarian and Specialization
 veterinarian_specialization = Table(
     'veterinarian_specialization', Base.metadata,
-    Column('veterinarian_id', Integer, ForeignKey('veterinarians.id'), primary_key=True),
-    Column('specialization_id', Integer, ForeignKey('specializations.id'), primary_key=True)
+    Column('veterinarian_id', Integer, ForeignKey('veterinarians.id', ondelete='CASCADE'), primary_key=True),
+    Column('specialization_id', Integer, ForeignKey('specializations.id', ondelete='CASCADE'), primary_key=True),
+    # The primary key covers lookups by veterinarian; this covers the reverse.
+    Index('ix_veterinarian_specialization_specialization_id', 'specialization_id')
 )
 
 class Client(Base):
@@ -15,8 +18,10 @@ class Client(Base):
     name = Column(String, nullable=False)
     email = Column(String, nullable=False, unique=True)
     phone = Column(String, nullable=False, unique=True)
-    animals = relationship("Animal", back_populates="owner")
-    appointments = relationship("Appointment", back_populates="client")
+    # Child rows are removed by the database's ON DELETE CASCADE rather than
+    # loaded and deleted one by one.
+    animals = relationship("Animal", back_populates="owner", cascade="all, delete", passive_deletes=True)
+    appointments = relationship("Appointment", back_populates="client", cascade="all, delete", passive_deletes=True)
 
 class Animal(Base):
     __tablename__ = 'animals'
@@ -25,40 +30,77 @@ class Animal(Base):
     species = Column(String, nullable=False)
     breed = Column(String)
     age = Column(Integer)
-    owner_id = Column(Integer, ForeignKey('clients.id'))
+    weight = Column(Float)  # kilograms, used to check per-kg doses
+    owner_id = Column(Integer, ForeignKey('clients.id', ondelete='CASCADE'), index=True)
     owner = relationship("Client", back_populates="animals")
-    prescriptions = relationship("Prescription", back_populates="animal")
-    appointments = relationship("Appointment", back_populates="animal")
+    prescriptions = relationship("Prescription", back_populates="animal", cascade="all, delete", passive_deletes=True)
+    appointments = relationship("Appointment", back_populates="animal", cascade="all, delete", passive_deletes=True)
 
 class Veterinarian(Base):
     __tablename__ = 'veterinarians'
     id = Column(Integer, primary_key=True)
     name = Column(String, nullable=False)
-    specializations = relationship('Specialization', secondary=veterinarian_specialization, back_populates='veterinarians')
-    appointments = relationship("Appointment", back_populates="veterinarian")
+    specializations = relationship('Specialization', secondary=veterinarian_specialization, back_populates='veterinarians', passive_deletes=True)
+    # A departed vet's appointments are kept, with veterinarian_id set to NULL.
+    appointments = relationship("Appointment", back_populates="veterinarian", passive_deletes=True)
 
 class Specialization(Base):
     __tablename__ = 'specializations'
     id = Column(Integer, primary_key=True)
     name = Column(String, nullable=False, unique=True)
-    veterinarians = relationship('Veterinarian', secondary=veterinarian_specialization, back_populates='specializations')
+    veterinarians = relationship('Veterinarian', secondary=veterinarian_specialization, back_populates='specializations', passive_deletes=True)
 
 class Appointment(Base):
     __tablename__ = 'appointments'
+    __table_args__ = (
+        Index('ix_appointments_veterinarian_id_date', 'veterinarian_id', 'date'),
+        Index('ix_appointments_animal_id_date', 'animal_id', 'date'),
+        # AUTOINCREMENT so the IDs of archived appointments are never handed out again.
+        {'sqlite_autoincrement': True},
+    )
     id = Column(Integer, primary_key=True)
-    date = Column(Date, nullable=False)
+    date = Column(Date, nullable=False, index=True)
+    start_time = Column(Time)
+    end_time = Column(Time)
     reason = Column(Text, nullable=False)
-    client_id = Column(Integer, ForeignKey('clients.id'))
+    client_id = Column(Integer, ForeignKey('clients.id', ondelete='CASCADE'), index=True)
     client = relationship("Client", back_populates="appointments")
-    animal_id = Column(Integer, ForeignKey('animals.id'))
+    animal_id = Column(Integer, ForeignKey('animals.id', ondelete='CASCADE'))
     animal = relationship("Animal", back_populates="appointments")
-    veterinarian_id = Column(Integer, ForeignKey('veterinarians.id'))
+    veterinarian_id = Column(Integer, ForeignKey('veterinarians.id', ondelete='SET NULL'))
     veterinarian = relationship("Veterinarian", back_populates="appointments")
 
 class Prescription(Base):
     __tablename__ = 'prescriptions'
+    # AUTOINCREMENT, as for appointments.
+    __table_args__ = {'sqlite_autoincrement': True}
     id = Column(Integer, primary_key=True)
     medication = Column(String, nullable=False)
     dosage = Column(String, nullable=False)
-    animal_id = Column(Integer, ForeignKey('animals.id'))
+    # Prescribed on; NULL for prescriptions recorded before dates were kept.
+    date = Column(Date, default=datetime.date.today, index=True)
+    animal_id = Column(Integer, ForeignKey('animals.id', ondelete='CASCADE'), index=True)
     animal = relationship("Animal", back_populates="prescriptions")
+
+class ReminderJob(Base):
+    """A reminder or follow-up waiting to be sent by `remind`.
+
+    Jobs are added by database triggers when appointments and prescriptions
+    are inserted (see veterinary/reminders.py) and deleted once sent.
+    """
+    __tablename__ = 'reminder_jobs'
+    __table_args__ = (
+        # The queue: the worker takes pending jobs in due_at order.
+        Index('ix_reminder_jobs_status_due_at', 'status', 'due_at'),
+        # One job of each kind per record; these also serve the cascades.
+        Index('ix_reminder_jobs_appointment_id_kind', 'appointment_id', 'kind', unique=True),
+        Index('ix_reminder_jobs_prescription_id_kind', 'prescription_id', 'kind', unique=True),
+    )
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)
+    due_at = Column(DateTime, nullable=False)
+    status = Column(String, nullable=False, default='pending')  # 'pending' or 'failed'
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text)
+    appointment_id = Column(Integer, ForeignKey('appointments.id', ondelete='CASCADE'))
+    prescription_id = Column(Integer, ForeignKey('prescriptions.id', ondelete='CASCADE'))
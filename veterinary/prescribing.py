@@ -0,0 +1,259 @@
+import json
+import os
+import re
+from collections import Counter, deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from functools import lru_cache
+from itertools import groupby
+from sqlalchemy import func, select
+from .models import Animal, Prescription
+
+# Checks for new and existing prescriptions: the dose against the species'
+# limit (per kg of body weight per day), the species against medications it
+# must not get, and the medication against the animal's other active
+# prescriptions for known interactions. The rules come from a JSON file
+# (prescription_rules.json here, or VETERINARY_PRESCRIPTION_RULES) and are
+# compiled once into dictionaries, so each check is a few lookups.
+
+RULES_FILE = os.environ.get(
+    "VETERINARY_PRESCRIPTION_RULES", os.path.join(os.path.dirname(__file__), "prescription_rules.json"))
+
+Dosage = namedtuple('Dosage', 'amount unit per_kg times_per_day')
+Finding = namedtuple('Finding', 'severity code message')
+
+# Blocking problems are errors; the rest are warnings.
+SEVERITIES = {'major': 'error', 'moderate': 'warning'}
+
+_AMOUNT = re.compile(
+    r"(\d+(?:\.\d+)?)\s*(mg|mcg|µg|ug|g|ml|iu|units?|tablets?|tabs?|capsules?|caps?|drops?)\b(\s*(?:/|per)\s*kg\b)?",
+    re.IGNORECASE)
+_UNITS = {
+    'mg': ('mg', 1), 'mcg': ('mg', 0.001), 'µg': ('mg', 0.001), 'ug': ('mg', 0.001), 'g': ('mg', 1000),
+    'ml': ('ml', 1), 'iu': ('iu', 1), 'unit': ('iu', 1), 'units': ('iu', 1),
+    'tablet': ('tablet', 1), 'tablets': ('tablet', 1), 'tab': ('tablet', 1), 'tabs': ('tablet', 1),
+    'capsule': ('capsule', 1), 'capsules': ('capsule', 1), 'cap': ('capsule', 1), 'caps': ('capsule', 1),
+    'drop': ('drop', 1), 'drops': ('drop', 1),
+}
+_FREQUENCIES = [
+    (re.compile(r"\b(?:once (?:a |per )?day|once daily|sid|q24h?)\b"), 1),
+    (re.compile(r"\b(?:twice (?:a |per )?day|twice daily|bid|q12h?)\b"), 2),
+    (re.compile(r"\b(?:three times (?:a |per )?day|three times daily|tid|q8h?)\b"), 3),
+    (re.compile(r"\b(?:four times (?:a |per )?day|four times daily|qid|q6h?)\b"), 4),
+    (re.compile(r"\b(?:every other day|eod)\b"), 0.5),
+    (re.compile(r"\b(?:once (?:a |per )?week|weekly)\b"), 1 / 7),
+]
+_EVERY_HOURS = re.compile(r"\b(?:every (\d+(?:\.\d+)?) hours?|q(\d+)h)\b")
+
+@lru_cache(maxsize=4096)
+def parse_dosage(text):
+    """Parse free-text dosage such as '0.1 mg/kg once daily' or '250 mg BID'.
+
+    Masses are converted to mg. `times_per_day` is None when no frequency is
+    given. Returns None if no amount and unit can be found.
+    """
+    match = _AMOUNT.search(text)
+    if match is None:
+        return None
+    amount, unit, per_kg = match.groups()
+    unit, factor = _UNITS[unit.lower()]
+    lowered = text.lower()
+    times_per_day = None
+    for pattern, times in _FREQUENCIES:
+        if pattern.search(lowered):
+            times_per_day = times
+            break
+    else:
+        every = _EVERY_HOURS.search(lowered)
+        if every:
+            hours = float(every.group(1) or every.group(2))
+            times_per_day = 24 / hours if hours else None
+    return Dosage(float(amount) * factor, unit, per_kg is not None, times_per_day)
+
+def daily_mg_per_kg(dosage, weight=None):
+    """The dose in mg per kg per day, or None if it can't be worked out."""
+    if dosage is None or dosage.unit != 'mg':
+        return None
+    if dosage.per_kg:
+        per_kg = dosage.amount
+    elif weight:
+        per_kg = dosage.amount / weight
+    else:
+        return None
+    return per_kg * (dosage.times_per_day or 1)
+
+def _key(name):
+    return " ".join(name.lower().split())
+
+class Rules:
+    """A rule set compiled into lookup tables."""
+
+    def __init__(self, data):
+        self.active_days = data.get('active_days', 30)
+        self.names = {}           # name or alias -> medication
+        self.contraindicated = {}  # medication -> species
+        self.limits = {}          # (medication, species) -> max mg/kg/day
+        classes = {}
+        for name, medication in data['medications'].items():
+            name = _key(name)
+            for alias in [name] + [_key(alias) for alias in medication.get('aliases', [])]:
+                self.names[alias] = name
+            classes[name] = {name} | set(medication.get('classes', []))
+            self.contraindicated[name] = frozenset(medication.get('contraindicated', []))
+            for species, limit in medication.get('limits', {}).items():
+                self.limits[name, species] = limit['max_mg_per_kg_per_day']
+        # Every pair of medications with an interaction, both ways round.
+        # Rules may name a class or a medication; the most severe rule wins.
+        by_tags = {}
+        for rule in data.get('interactions', []):
+            first, second = rule['between']
+            by_tags[first, second] = by_tags[second, first] = (rule['severity'], rule['message'])
+        self.interactions = {}
+        for a in classes:
+            for b in classes:
+                found = [by_tags[x, y] for x in classes[a] for y in classes[b] if (x, y) in by_tags]
+                if found:
+                    self.interactions[a, b] = min(found, key=lambda rule: list(SEVERITIES).index(rule[0]))
+
+    def medication(self, name):
+        """The rule set's name for a medication, or None if it has no rules."""
+        key = _key(name)
+        found = self.names.get(key)
+        if found is None and ' ' in key:
+            found = self.names.get(key.split(' ', 1)[0])  # 'Meloxicam oral suspension'
+        return found
+
+    def check(self, medication, dosage, species, weight=None, active=()):
+        """Findings for prescribing `medication` at `dosage` to an animal.
+
+        `active` holds the medication names of the animal's other active
+        prescriptions.
+        """
+        findings = []
+        name = self.medication(medication)
+        species = _key(species or '')
+        parsed = parse_dosage(dosage)
+        if parsed is None and name is not None:
+            findings.append(Finding('warning', 'unparsed-dosage', f"could not read an amount and unit in '{dosage}'"))
+        if name is not None:
+            if species in self.contraindicated[name]:
+                findings.append(Finding('error', 'contraindicated', f"{medication} must not be given to a {species}"))
+            limit = self.limits.get((name, species))
+            if limit is not None and parsed is not None and parsed.unit == 'mg':
+                dose = daily_mg_per_kg(parsed, weight)
+                if dose is None:
+                    findings.append(Finding('warning', 'no-weight', f"no weight recorded, so the {medication} dose can't be checked"))
+                elif dose > limit * 1.0001:
+                    findings.append(Finding('error', 'dose-too-high',
+                                            f"{dose:.3g} mg/kg/day of {medication} is over the {species} limit of {limit:g}"))
+        seen = set()
+        for other in active:
+            other_name = self.medication(other)
+            if other_name is None or other_name in seen:
+                continue
+            seen.add(other_name)
+            if other_name == name:
+                findings.append(Finding('warning', 'duplicate', f"already has an active prescription for {other}"))
+                continue
+            if name is None:
+                continue
+            interaction = self.interactions.get((name, other_name))
+            if interaction:
+                severity, message = interaction
+                findings.append(Finding(SEVERITIES[severity], 'interaction', f"{medication} with {other}: {message}"))
+        return findings
+
+@lru_cache(maxsize=None)
+def load_rules(path=None):
+    with open(path or RULES_FILE, encoding='utf-8') as f:
+        return Rules(json.load(f))
+
+def _active_medications(connection, animal_id, on, days, exclude_id=None):
+    # Served by ix_prescriptions_animal_id.
+    query = select(Prescription.medication).where(
+        Prescription.animal_id == animal_id,
+        Prescription.date > on - timedelta(days=days),
+        Prescription.date <= on,
+    )
+    if exclude_id is not None:
+        query = query.where(Prescription.id != exclude_id)
+    return connection.execute(query).scalars().all()
+
+def check_prescription(connection, animal_id, medication, dosage, on=None, rules=None):
+    """Findings for a new prescription for `animal_id`, dated `on` (default: today)."""
+    rules = rules or load_rules()
+    animal = connection.execute(select(Animal.species, Animal.weight).where(Animal.id == animal_id)).first()
+    if animal is None:
+        return []
+    active = _active_medications(connection, animal_id, on or date.today(), rules.active_days)
+    return rules.check(medication, dosage, animal.species, animal.weight, active)
+
+# Re-validating every prescription. Animals are split into ID ranges and each
+# range is checked in its own process; a range's prescriptions are read in
+# one pass ordered by animal and date, keeping a sliding window of each
+# animal's active prescriptions.
+
+_worker_engine = None
+
+def _start_worker(url):
+    global _worker_engine
+    from .db import create_db_engine
+    _worker_engine = create_db_engine(url)
+
+def _check_rows(rows, rules):
+    window = timedelta(days=rules.active_days)
+    checked = 0
+    problems = []
+    for _, prescriptions in groupby(rows, key=lambda row: row.animal_id):
+        active = deque()
+        for row in prescriptions:
+            if row.date is not None:
+                while active and active[0][0] <= row.date - window:
+                    active.popleft()
+            checked += 1
+            findings = rules.check(row.medication, row.dosage, row.species, row.weight,
+                                   [medication for _, medication in active] if row.date is not None else ())
+            if findings:
+                problems.append((row.id, row.animal_id, row.medication, row.dosage, findings))
+            if row.date is not None:
+                active.append((row.date, row.medication))
+    return checked, problems
+
+def _check_range(first_animal, last_animal, rules_path=None):
+    p, a = Prescription.__table__, Animal.__table__
+    query = (select(p.c.id, p.c.animal_id, p.c.date, p.c.medication, p.c.dosage, a.c.species, a.c.weight)
+             .join(a, a.c.id == p.c.animal_id)
+             .where(p.c.animal_id.between(first_animal, last_animal))
+             .order_by(p.c.animal_id, p.c.date, p.c.id))
+    with _worker_engine.connect() as connection:
+        return _check_rows(connection.execute(query), load_rules(rules_path))
+
+def validate_prescriptions(url, workers=None, rules_path=None, ranges_per_worker=4):
+    """Check every prescription in the database at `url` across `workers` processes.
+
+    Returns (prescriptions checked, [(id, animal_id, medication, dosage, findings)]),
+    the problems in prescription order.
+    """
+    from .db import create_db_engine
+    workers = workers or os.cpu_count() or 1
+    engine = create_db_engine(url)
+    with engine.connect() as connection:
+        low, high = connection.execute(select(func.min(Prescription.animal_id), func.max(Prescription.animal_id))).first()
+    engine.dispose()
+    if low is None:
+        return 0, []
+    step = max(1, -(-(high - low + 1) // (workers * ranges_per_worker)))
+    ranges = [(start, min(start + step - 1, high)) for start in range(low, high + 1, step)]
+    if workers == 1:
+        _start_worker(url)
+        results = [_check_range(first, last, rules_path) for first, last in ranges]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_start_worker, initargs=(url,)) as pool:
+            results = list(pool.map(_check_range, *zip(*ranges), [rules_path] * len(ranges)))
+    checked = sum(count for count, _ in results)
+    problems = sorted((problem for _, found in results for problem in found), key=lambda problem: problem[0])
+    return checked, problems
+
+def summarize_findings(problems):
+    """Counts of findings by (severity, code)."""
+    return Counter((finding.severity, finding.code) for *_, findings in problems for finding in findings)
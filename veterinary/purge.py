@@ -0,0 +1,77 @@
+from sqlalchemy import func, or_, select
+from .archive import tables_for
+from .models import Client, Animal, Appointment, Prescription
+
+# Set-based bulk deletes. Each chunk is one `DELETE ... WHERE id IN (SELECT
+# id ... LIMIT n)` in its own short transaction, so the write lock is only
+# held for one chunk at a time and other processes can write in between.
+
+clients = Client.__table__
+animals = Animal.__table__
+appointments = Appointment.__table__
+prescriptions = Prescription.__table__
+
+def count_rows(connection, table, *conditions):
+    return connection.execute(select(func.count()).select_from(table).where(*conditions)).scalar()
+
+def delete_in_chunks(engine, table, *conditions, chunk_size=5000, progress=None):
+    """Delete the rows of `table` matching `conditions`; returns how many were deleted.
+
+    `progress`, if given, is called with the running total after each chunk.
+    """
+    chunk = select(table.c.id).where(*conditions).limit(chunk_size)
+    total = 0
+    while True:
+        with engine.begin() as connection:
+            deleted = connection.execute(table.delete().where(table.c.id.in_(chunk))).rowcount
+        total += deleted
+        if progress and deleted:
+            progress(total)
+        if deleted < chunk_size:
+            return total
+
+def appointments_before_conditions(connection, before):
+    """(table, conditions) for the appointments dated before `before`, archived ones included."""
+    return [(table, [table.c.date < before]) for table in tables_for(connection, 'appointments', end=before)]
+
+def purge_appointments_before(engine, before, chunk_size=5000, progress=None):
+    """Delete every appointment dated before `before`, from the live and archive tables."""
+    with engine.connect() as connection:
+        record_conditions = appointments_before_conditions(connection, before)
+    total = 0
+    for table, conditions in record_conditions:
+        done = total
+        total += delete_in_chunks(engine, table, *conditions, chunk_size=chunk_size,
+                                  progress=progress and (lambda deleted: progress(done + deleted)))
+    return total
+
+def client_record_conditions(connection, client_id):
+    """(table, conditions) for every row belonging to a client, children first.
+
+    Archived appointments and prescriptions are included; the database
+    doesn't cascade into archive tables.
+    """
+    owned_animals = select(animals.c.id).where(animals.c.owner_id == client_id)
+    conditions = []
+    for table in tables_for(connection, 'appointments'):
+        conditions.append((table, [or_(table.c.client_id == client_id, table.c.animal_id.in_(owned_animals))]))
+    for table in tables_for(connection, 'prescriptions'):
+        conditions.append((table, [table.c.animal_id.in_(owned_animals)]))
+    return conditions + [
+        (animals, [animals.c.owner_id == client_id]),
+        (clients, [clients.c.id == client_id]),
+    ]
+
+def purge_client(engine, client_id, chunk_size=5000, progress=None):
+    """Delete a client and everything that references them, in chunks.
+
+    Children go first, so no single chunk has to cascade through years of
+    history. If interrupted, running it again finishes the job. Returns the
+    number of rows deleted per table.
+    """
+    with engine.connect() as connection:
+        record_conditions = client_record_conditions(connection, client_id)
+    return {
+        table.name: delete_in_chunks(engine, table, *conditions, chunk_size=chunk_size, progress=progress)
+        for table, conditions in record_conditions
+    }
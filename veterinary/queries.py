@@ -0,0 +1,77 @@
+from datetime import date, timedelta
+from .models import Client, Veterinarian, Specialization, Animal, Appointment, Prescription, veterinarian_specialization
+
+# Row projections shared by the list commands and anything else that reads the
+# tables in bulk. Each returns an unordered query; callers add ordering/paging.
+
+def client_rows(session):
+    return session.query(Client.id, Client.name, Client.email, Client.phone)
+
+def veterinarian_rows(session):
+    return session.query(Veterinarian.id, Veterinarian.name)
+
+def specialization_rows(session):
+    return session.query(Specialization.id, Specialization.name)
+
+def animal_rows(session):
+    return (
+        session.query(Animal.id, Animal.name, Animal.species, Animal.breed, Animal.age, Client.name)
+        .outerjoin(Client, Animal.owner_id == Client.id)
+    )
+
+# `source` is the appointments/prescriptions table by default, or a
+# selectable with the same columns from archive.source_for().
+
+def appointment_rows(session, source=None):
+    # Project the related names in one joined query instead of lazy-loading
+    # the client, animal and veterinarian of every appointment.
+    source = Appointment.__table__ if source is None else source
+    return (
+        session.query(
+            source.c.id, source.c.date, source.c.start_time, source.c.end_time, source.c.reason,
+            Client.name, Animal.name, Veterinarian.name
+        )
+        .outerjoin(Client, source.c.client_id == Client.id)
+        .outerjoin(Animal, source.c.animal_id == Animal.id)
+        .outerjoin(Veterinarian, source.c.veterinarian_id == Veterinarian.id)
+    )
+
+def prescription_rows(session, source=None):
+    source = Prescription.__table__ if source is None else source
+    return (
+        session.query(source.c.id, source.c.date, Animal.name, source.c.medication, source.c.dosage)
+        .outerjoin(Animal, source.c.animal_id == Animal.id)
+    )
+
+# Queries shown by the `explain` command, keyed by name. The lookups use
+# placeholder IDs; only the plan matters.
+
+def explain_queries(session):
+    today = date.today()
+    return {
+        'list-clients': client_rows(session).order_by(Client.id),
+        'list-veterinarians': veterinarian_rows(session).order_by(Veterinarian.id),
+        'list-specializations': specialization_rows(session).order_by(Specialization.id),
+        'list-animals': animal_rows(session).order_by(Animal.id),
+        'list-appointments': appointment_rows(session).order_by(Appointment.id),
+        'list-prescriptions': prescription_rows(session).order_by(Prescription.id),
+        'animals-for-client': session.query(Animal).filter(Animal.owner_id == 1),
+        'appointments-for-vet': (
+            session.query(Appointment)
+            .filter(Appointment.veterinarian_id == 1,
+                    Appointment.date >= today,
+                    Appointment.date < today + timedelta(days=7))
+            .order_by(Appointment.date)
+        ),
+        'appointments-for-animal': (
+            session.query(Appointment)
+            .filter(Appointment.animal_id == 1)
+            .order_by(Appointment.date)
+        ),
+        'appointments-on-date': session.query(Appointment).filter(Appointment.date == today),
+        'prescriptions-for-animal': session.query(Prescription).filter(Prescription.animal_id == 1),
+        'veterinarians-for-specialization': (
+            session.query(veterinarian_specialization.c.veterinarian_id)
+            .filter(veterinarian_specialization.c.specialization_id == 1)
+        ),
+    }
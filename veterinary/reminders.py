@@ -0,0 +1,329 @@
+import importlib
+import json
+import sys
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import bindparam, case, delete, func, inspect, select, text, update
+from .models import Animal, Appointment, Client, Prescription, ReminderJob, Veterinarian
+
+# Appointment reminders, follow-ups and prescription refill reminders. Each
+# one is a row in reminder_jobs, added by SQLite triggers when an appointment
+# or prescription is inserted (so bulk Core inserts get jobs too) and moved
+# when an appointment is rescheduled. The table is the queue: the index on
+# (status, due_at) keeps the jobs in due order, so taking the next due ones
+# is an index range scan however many appointments there are.
+#
+# `remind` claims a batch of due jobs by pushing their due_at a lease into
+# the future, sends them from a thread pool and deletes the ones that went
+# out. A failed job is retried later with exponential backoff until it has
+# had max_attempts tries; a worker that dies mid-batch leaves its jobs to be
+# picked up again when the lease runs out. Delivery is at least once.
+
+REMINDER_HOURS = 24      # appointment reminders go out this long before the start
+FOLLOW_UP_DAYS = 3       # follow-ups, at FOLLOW_UP_TIME this many days after the visit
+FOLLOW_UP_TIME = '10:00:00'
+REFILL_DAYS = 25         # refill reminders, this many days after the prescription
+REFILL_TIME = '09:00:00'
+DEFAULT_TIME = '09:00:00'  # for appointments without a start time
+
+LEASE = timedelta(minutes=5)
+MAX_RETRY_DELAY = timedelta(hours=1)
+
+# How SQLAlchemy stores DateTime values on SQLite, so that the triggers'
+# values sort and compare correctly against the worker's.
+_FORMAT = '%Y-%m-%d %H:%M:%S.000000'
+
+def _moment(*args):
+    return f"strftime('{_FORMAT}', {', '.join(args)})"
+
+_NOW = _moment("'now'", "'localtime'")
+
+def _start(row):
+    return f"{row}.date || ' ' || coalesce(substr({row}.start_time, 1, 8), '{DEFAULT_TIME}')"
+
+# kind -> (table, job column, due time, what must still be in the future for
+# the job to be added), as SQL expressions of a row of the table.
+KINDS = {
+    'appointment-reminder': ('appointments', 'appointment_id',
+                             lambda row: _moment(_start(row), f"'-{REMINDER_HOURS} hours'"),
+                             lambda row: _moment(_start(row))),
+    'follow-up': ('appointments', 'appointment_id',
+                  lambda row: _moment(f"{row}.date || ' {FOLLOW_UP_TIME}'", f"'+{FOLLOW_UP_DAYS} days'"),
+                  None),
+    'refill': ('prescriptions', 'prescription_id',
+               lambda row: _moment(f"{row}.date || ' {REFILL_TIME}'", f"'+{REFILL_DAYS} days'"),
+               None),
+}
+
+# Columns whose change reschedules a record's jobs.
+_UPDATE_COLUMNS = {'appointments': "date, start_time", 'prescriptions': "date"}
+
+def _insert_jobs(table, row, source='', conditions=()):
+    statements = []
+    for kind, (kind_table, column, due, deadline) in KINDS.items():
+        if kind_table != table:
+            continue
+        where = " AND ".join([*conditions, f"{(deadline or due)(row)} > {_NOW}"])
+        # A reminder whose time has passed but whose appointment hasn't goes out at once.
+        statements.append(
+            f"INSERT OR IGNORE INTO reminder_jobs (kind, due_at, status, attempts, {column}) "
+            f"SELECT '{kind}', max({due(row)}, {_NOW}), 'pending', 0, {row}.id{source} "
+            f"WHERE {where}"
+        )
+    return statements
+
+def reminder_trigger_ddl(table):
+    """Statements creating the triggers that add and reschedule `table`'s jobs."""
+    column = 'appointment_id' if table == 'appointments' else 'prescription_id'
+    inserts = "; ".join(_insert_jobs(table, 'new')) + ";"
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {table}_reminders_insert AFTER INSERT ON {table} "
+        f"BEGIN {inserts} END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_reminders_update AFTER UPDATE OF {_UPDATE_COLUMNS[table]} ON {table} "
+        # "+status" keeps SQLite from picking the (status, due_at) index, which
+        # would scan every pending job, over the one on the record ID.
+        f"BEGIN DELETE FROM reminder_jobs WHERE {column} = new.id AND +status = 'pending'; {inserts} END",
+    ]
+
+def has_reminders(connection):
+    return inspect(connection).has_table('reminder_jobs')
+
+def create_reminder_triggers(connection):
+    for table in _UPDATE_COLUMNS:
+        for statement in reminder_trigger_ddl(table):
+            connection.execute(text(statement))
+
+def drop_reminder_triggers(connection):
+    for table in _UPDATE_COLUMNS:
+        for event in ('insert', 'update'):
+            connection.execute(text(f"DROP TRIGGER IF EXISTS {table}_reminders_{event}"))
+
+def backfill_reminders(connection, table=None, after=None):
+    """Add the jobs still to come for existing records; ones already queued are kept.
+
+    With `after`, only the rows of `table` (or of both tables) past that rowid are considered.
+    """
+    lookback = max(FOLLOW_UP_DAYS, REFILL_DAYS) + 1
+    for name in [table] if table else _UPDATE_COLUMNS:
+        if after is None:
+            # Only recent and future records can have jobs to come; served by the date index.
+            condition = f"t.date >= date('now', 'localtime', '-{lookback} days')"
+        else:
+            condition = f"t.rowid > {int(after)}"
+        for statement in _insert_jobs(name, 't', f" FROM {name} AS t", [condition]):
+            connection.execute(text(statement))
+
+# The queue.
+
+_jobs = ReminderJob.__table__
+
+def retry_delay(attempts):
+    """How long to wait before trying a job again after its `attempts`th failure."""
+    return min(timedelta(minutes=1) * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+
+def claim_jobs(connection, now, limit, lease=LEASE):
+    """Take up to `limit` jobs due by `now`, earliest first, for `lease`.
+
+    Returns (id, kind, attempts, appointment_id, prescription_id) rows, with
+    attempts counting this one.
+    """
+    due = (select(_jobs.c.id).where(_jobs.c.status == 'pending', _jobs.c.due_at <= now)
+           .order_by(_jobs.c.due_at).limit(limit).scalar_subquery())
+    return connection.execute(
+        update(_jobs).where(_jobs.c.id.in_(due))
+        .values(due_at=now + lease, attempts=_jobs.c.attempts + 1)
+        .returning(_jobs.c.id, _jobs.c.kind, _jobs.c.attempts, _jobs.c.appointment_id, _jobs.c.prescription_id)
+    ).all()
+
+def finish_jobs(connection, now, done, failures, max_attempts):
+    """Delete the `done` job IDs; reschedule or give up on `failures`, (job, error) pairs."""
+    if done:
+        connection.execute(delete(_jobs).where(_jobs.c.id.in_(done)))
+    if failures:
+        connection.execute(
+            update(_jobs).where(_jobs.c.id == bindparam('job_id'))
+            .values(status=bindparam('new_status'), due_at=bindparam('retry_at'), last_error=bindparam('error')),
+            [{'job_id': job.id,
+              'new_status': 'failed' if job.attempts >= max_attempts else 'pending',
+              'retry_at': now + retry_delay(job.attempts),
+              'error': error[:1000]} for job, error in failures],
+        )
+
+def next_due(connection):
+    return connection.execute(select(func.min(_jobs.c.due_at)).where(_jobs.c.status == 'pending')).scalar()
+
+def queue_status(connection, now):
+    """(kind, status, jobs, due by now, earliest due_at) for each kind and status."""
+    return connection.execute(
+        select(_jobs.c.kind, _jobs.c.status, func.count(),
+               func.sum(case((_jobs.c.due_at <= now, 1), else_=0)), func.min(_jobs.c.due_at))
+        .group_by(_jobs.c.kind, _jobs.c.status).order_by(_jobs.c.kind, _jobs.c.status)
+    ).all()
+
+def retry_failed(connection, now):
+    """Queue every failed job again; returns how many there were."""
+    return connection.execute(
+        update(_jobs).where(_jobs.c.status == 'failed').values(status='pending', attempts=0, due_at=now)
+    ).rowcount
+
+# Messages.
+
+def _appointment_details(connection, ids):
+    rows = connection.execute(
+        select(Appointment.id, Appointment.date, Appointment.start_time, Appointment.reason,
+               Client.name.label('client'), Client.email, Client.phone,
+               Animal.name.label('animal'), Veterinarian.name.label('veterinarian'))
+        .outerjoin(Client, Client.id == Appointment.client_id)
+        .outerjoin(Animal, Animal.id == Appointment.animal_id)
+        .outerjoin(Veterinarian, Veterinarian.id == Appointment.veterinarian_id)
+        .where(Appointment.id.in_(ids))
+    )
+    return {row.id: row for row in rows}
+
+def _prescription_details(connection, ids):
+    rows = connection.execute(
+        select(Prescription.id, Prescription.date, Prescription.medication,
+               Client.name.label('client'), Client.email, Client.phone, Animal.name.label('animal'))
+        .join(Animal, Animal.id == Prescription.animal_id)
+        .outerjoin(Client, Client.id == Animal.owner_id)
+        .where(Prescription.id.in_(ids))
+    )
+    return {row.id: row for row in rows}
+
+def _text(kind, row):
+    animal = row.animal or "your animal"
+    if kind == 'appointment-reminder':
+        when = row.date.strftime('%A %d %B %Y')
+        if row.start_time is not None:
+            when += f" at {row.start_time:%H:%M}"
+        vet = f" with {row.veterinarian}" if row.veterinarian else ""
+        return f"Reminder: {animal} has an appointment ({row.reason}){vet} on {when}."
+    if kind == 'follow-up':
+        return f"How is {animal} doing after the visit on {row.date:%d %B %Y}? Let us know if you have any concerns."
+    return f"{animal}'s {row.medication} prescribed on {row.date:%d %B %Y} may be running low; contact us for a refill."
+
+def build_messages(connection, jobs):
+    """{job ID: message dict} for claimed jobs; jobs whose client is gone are left out."""
+    appointments = _appointment_details(connection, [job.appointment_id for job in jobs if job.appointment_id])
+    prescriptions = _prescription_details(connection, [job.prescription_id for job in jobs if job.prescription_id])
+    messages = {}
+    for job in jobs:
+        if job.appointment_id:
+            row, record = appointments.get(job.appointment_id), {'appointment_id': job.appointment_id}
+        else:
+            row, record = prescriptions.get(job.prescription_id), {'prescription_id': job.prescription_id}
+        if row is None or row.client is None:
+            continue
+        messages[job.id] = {
+            'job_id': job.id, 'kind': job.kind, **record,
+            'client': row.client, 'email': row.email, 'phone': row.phone,
+            'text': _text(job.kind, row),
+        }
+    return messages
+
+# Sinks: anything with a send(message) method that raises if the message
+# didn't go out, and optionally close().
+
+class StdoutSink:
+    """Prints each message, standing in for an email or SMS gateway."""
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+        self._lock = threading.Lock()
+
+    def send(self, message):
+        with self._lock:
+            self.stream.write(f"[{message['kind']}] to {message['client']} <{message['email']}>: {message['text']}\n")
+            self.stream.flush()
+
+class FileSink:
+    """Appends each message to a file as a JSON line."""
+
+    def __init__(self, path):
+        self._file = open(path, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def send(self, message):
+        line = json.dumps(message, default=str) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+def open_sink(spec):
+    """A sink from 'stdout', 'file:PATH' or 'module:factory' (called with no arguments)."""
+    if spec == 'stdout':
+        return StdoutSink()
+    if spec.startswith('file:'):
+        return FileSink(spec[len('file:'):])
+    module, _, name = spec.partition(':')
+    if not name:
+        raise ValueError(f"unknown sink '{spec}': use stdout, file:PATH or module:factory")
+    return getattr(importlib.import_module(module), name)()
+
+# The worker.
+
+def _send(sink, message):
+    try:
+        sink.send(message)
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+    return None
+
+def process_batch(engine, sink, pool, now, batch_size, max_attempts, lease=LEASE):
+    """Claim, send and settle one batch of due jobs; returns a Counter of outcomes."""
+    with engine.begin() as connection:
+        jobs = claim_jobs(connection, now, batch_size, lease)
+    if not jobs:
+        return Counter()
+    with engine.connect() as connection:
+        messages = build_messages(connection, jobs)
+    futures = {job_id: pool.submit(_send, sink, message) for job_id, message in messages.items()}
+    done, failures, outcomes = [], [], Counter()
+    for job in jobs:
+        if job.id not in futures:
+            done.append(job.id)
+            outcomes['dropped'] += 1
+            continue
+        error = futures[job.id].result()
+        if error is None:
+            done.append(job.id)
+            outcomes['sent'] += 1
+        else:
+            failures.append((job, error))
+            outcomes['failed' if job.attempts >= max_attempts else 'retrying'] += 1
+    with engine.begin() as connection:
+        finish_jobs(connection, datetime.now(), done, failures, max_attempts)
+    return outcomes
+
+def run_worker(engine, sink, workers=4, batch_size=200, poll=5.0, max_attempts=5, once=False,
+               stop=None, report=None):
+    """Send due jobs until `stop` is set, or with `once` until none are due.
+
+    Sends go through a pool of `workers` threads, at most `batch_size` at a
+    time. `report` is called with each batch's Counter of outcomes ('sent',
+    'retrying', 'failed', 'dropped'). Returns the totals.
+    """
+    stop = stop or threading.Event()
+    totals = Counter()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='remind') as pool:
+        while not stop.is_set():
+            now = datetime.now()
+            outcomes = process_batch(engine, sink, pool, now, batch_size, max_attempts)
+            if outcomes:
+                totals.update(outcomes)
+                if report:
+                    report(outcomes)
+                continue
+            if once:
+                break
+            # Nothing due: sleep until the next job, checking for new ones every `poll` seconds.
+            with engine.connect() as connection:
+                upcoming = next_due(connection)
+            wait = poll if upcoming is None else min(poll, max(0.0, (upcoming - now).total_seconds()))
+            stop.wait(wait)
+    return totals
@@ -0,0 +1,125 @@
+from datetime import datetime, timedelta, time
+from sqlalchemy import select, insert
+from .models import Appointment, Veterinarian, Specialization, veterinarian_specialization
+
+OPENING_TIME = time(8, 0)
+CLOSING_TIME = time(18, 0)
+
+appointments = Appointment.__table__
+
+class BookingConflict(Exception):
+    """Raised when an appointment would overlap one of the vet's other bookings."""
+
+    def __init__(self, conflicts):
+        self.conflicts = conflicts
+        slots = ", ".join(f"{start:%H:%M}-{end:%H:%M}" for _, start, end in conflicts)
+        super().__init__(f"Veterinarian is already booked at {slots}.")
+
+def add_minutes(t, minutes):
+    return (datetime.combine(datetime.min, t) + timedelta(minutes=minutes)).time()
+
+def _overlapping(veterinarian_id, date, start, end):
+    # Served by ix_appointments_veterinarian_id_date: only the vet's bookings
+    # for that one day are read, however large the table is.
+    return select(appointments.c.id, appointments.c.start_time, appointments.c.end_time).where(
+        appointments.c.veterinarian_id == veterinarian_id,
+        appointments.c.date == date,
+        appointments.c.start_time < end,
+        appointments.c.end_time > start,
+    )
+
+def find_conflicts(connection, veterinarian_id, date, start, end):
+    return connection.execute(_overlapping(veterinarian_id, date, start, end)).all()
+
+def book(connection, date, start_time, end_time, veterinarian_id, **fields):
+    """Insert an appointment unless it overlaps the vet's other bookings.
+
+    Runs in the connection's current transaction; the caller commits. The
+    row is inserted before the overlap check, so when this is the first
+    statement of the transaction it already holds SQLite's write lock while
+    checking: a concurrent booking for the same slot waits for this one to
+    commit or roll back and then sees it. On a conflict the row is deleted
+    again and BookingConflict is raised. Returns the new appointment ID.
+    """
+    if end_time <= start_time:
+        raise ValueError("Appointment must end after it starts.")
+    appointment_id = connection.execute(
+        insert(appointments).values(
+            date=date, start_time=start_time, end_time=end_time,
+            veterinarian_id=veterinarian_id, **fields
+        )
+    ).inserted_primary_key[0]
+    conflicts = [
+        row for row in find_conflicts(connection, veterinarian_id, date, start_time, end_time)
+        if row.id != appointment_id
+    ]
+    if conflicts:
+        connection.execute(appointments.delete().where(appointments.c.id == appointment_id))
+        raise BookingConflict(conflicts)
+    return appointment_id
+
+def vets_with_specialization(connection, specialization):
+    """IDs and names of vets with a specialization, given by ID or name."""
+    query = (
+        select(Veterinarian.id, Veterinarian.name)
+        .join(veterinarian_specialization, veterinarian_specialization.c.veterinarian_id == Veterinarian.id)
+        .join(Specialization, Specialization.id == veterinarian_specialization.c.specialization_id)
+        .order_by(Veterinarian.id)
+    )
+    if str(specialization).isdigit():
+        query = query.where(Specialization.id == int(specialization))
+    else:
+        query = query.where(Specialization.name == specialization)
+    return connection.execute(query).all()
+
+def _fits(start, limit, duration):
+    return datetime.combine(datetime.min, start) + timedelta(minutes=duration) <= datetime.combine(datetime.min, limit)
+
+def first_gap(bookings, duration, earliest, opening=OPENING_TIME, closing=CLOSING_TIME):
+    """Start of the first gap of `duration` minutes in one vet's sorted bookings for a day."""
+    cursor = max(opening, earliest)
+    for start, end in bookings:
+        if end <= cursor:
+            continue
+        if _fits(cursor, start, duration):
+            return cursor
+        cursor = end
+    return cursor if _fits(cursor, closing, duration) else None
+
+def next_free_slot(connection, specialization, date, duration=30, after=None, days=7,
+                   opening=OPENING_TIME, closing=CLOSING_TIME):
+    """Earliest (vet_id, vet_name, date, start, end) for a vet with the specialization.
+
+    Each day costs one indexed range query over the matching vets' bookings
+    for that day; the gap search itself is a linear pass over those rows.
+    """
+    vets = vets_with_specialization(connection, specialization)
+    if not vets:
+        return None
+    vet_ids = [vet.id for vet in vets]
+
+    for offset in range(days):
+        day = date + timedelta(days=offset)
+        earliest = after if (after and offset == 0) else opening
+        bookings = {vet_id: [] for vet_id in vet_ids}
+        rows = connection.execute(
+            select(appointments.c.veterinarian_id, appointments.c.start_time, appointments.c.end_time)
+            .where(
+                appointments.c.veterinarian_id.in_(vet_ids),
+                appointments.c.date == day,
+                appointments.c.start_time.is_not(None),
+                appointments.c.end_time.is_not(None),
+            )
+            .order_by(appointments.c.veterinarian_id, appointments.c.start_time)
+        )
+        for vet_id, start, end in rows:
+            bookings[vet_id].append((start, end))
+
+        best = None
+        for vet in vets:
+            start = first_gap(bookings[vet.id], duration, earliest, opening, closing)
+            if start is not None and (best is None or start < best[3]):
+                best = (vet.id, vet.name, day, start, add_minutes(start, duration))
+        if best:
+            return best
+    return None
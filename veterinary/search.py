@@ -0,0 +1,140 @@
+import re
+from difflib import SequenceMatcher
+from sqlalchemy import text
+
+# Full-text search over clients, animals and appointment reasons, backed by
+# two SQLite FTS5 tables kept in sync by triggers (so bulk Core inserts are
+# indexed too):
+#
+#   search_index     word index over every searchable field, ranked by bm25
+#   search_trigrams  trigram index over client and animal names, used to find
+#                    candidates for misspelled names
+#
+# An entry's rowid encodes what it points at: id * 4 + kind code.
+
+KINDS = {'client': 1, 'animal': 2, 'appointment': 3}
+KIND_NAMES = {code: kind for kind, code in KINDS.items()}
+
+# (table, kind, title expression, body expression) for each indexed table.
+_SOURCES = [
+    ('clients', 'client', "{row}.name", "{row}.email || ' ' || {row}.phone"),
+    ('animals', 'animal', "{row}.name", "{row}.species || ' ' || coalesce({row}.breed, '')"),
+    ('appointments', 'appointment', "{row}.reason", "''"),
+]
+_FUZZY_SOURCES = ('clients', 'animals')
+
+def _ddl():
+    statements = [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(title, body, tokenize='unicode61 remove_diacritics 2')",
+        "CREATE VIRTUAL TABLE IF NOT EXISTS search_trigrams USING fts5(name, tokenize='trigram')",
+    ]
+    for table, kind, title, body in _SOURCES:
+        code = KINDS[kind]
+        new_rowid, old_rowid = f"new.id * 4 + {code}", f"old.id * 4 + {code}"
+        insert = (f"INSERT INTO search_index (rowid, title, body) "
+                  f"VALUES ({new_rowid}, {title.format(row='new')}, {body.format(row='new')});")
+        delete = f"DELETE FROM search_index WHERE rowid = {old_rowid};"
+        if table in _FUZZY_SOURCES:
+            insert += f" INSERT INTO search_trigrams (rowid, name) VALUES ({new_rowid}, new.name);"
+            delete += f" DELETE FROM search_trigrams WHERE rowid = {old_rowid};"
+        statements += [
+            f"CREATE TRIGGER IF NOT EXISTS {table}_search_insert AFTER INSERT ON {table} BEGIN {insert} END",
+            f"CREATE TRIGGER IF NOT EXISTS {table}_search_update AFTER UPDATE ON {table} BEGIN {delete} {insert} END",
+            f"CREATE TRIGGER IF NOT EXISTS {table}_search_delete AFTER DELETE ON {table} BEGIN {delete} END",
+        ]
+    return statements
+
+def create_search_index(connection):
+    """Create the FTS tables and sync triggers if missing (SQLite only)."""
+    for statement in _ddl():
+        connection.execute(text(statement))
+
+def drop_search_index(connection):
+    for table, _, _, _ in _SOURCES:
+        for event in ('insert', 'update', 'delete'):
+            connection.execute(text(f"DROP TRIGGER IF EXISTS {table}_search_{event}"))
+    connection.execute(text("DROP TABLE IF EXISTS search_trigrams"))
+    connection.execute(text("DROP TABLE IF EXISTS search_index"))
+
+def index_rows(connection, table, after=0):
+    """Add the rows of source table `table` past rowid `after` to the FTS tables, set-based."""
+    for name, kind, title, body in _SOURCES:
+        if name != table:
+            continue
+        code = KINDS[kind]
+        connection.execute(text(
+            f"INSERT INTO search_index (rowid, title, body) "
+            f"SELECT t.id * 4 + {code}, {title.format(row='t')}, {body.format(row='t')} FROM {table} AS t "
+            f"WHERE t.rowid > :after"
+        ), {'after': after})
+        if table in _FUZZY_SOURCES:
+            connection.execute(text(
+                f"INSERT INTO search_trigrams (rowid, name) SELECT t.id * 4 + {code}, t.name FROM {table} AS t "
+                f"WHERE t.rowid > :after"
+            ), {'after': after})
+
+def rebuild_search_index(connection):
+    """Repopulate both FTS tables from the source tables with set-based inserts."""
+    connection.execute(text("DELETE FROM search_index"))
+    connection.execute(text("DELETE FROM search_trigrams"))
+    for table, _, _, _ in _SOURCES:
+        index_rows(connection, table)
+
+def _match_expression(query):
+    # Quote every word so FTS5 syntax in user input is taken literally, and
+    # prefix-match it so "sco" finds "scooby".
+    words = re.findall(r"\w+", query)
+    return " ".join(f'"{word}"*' for word in words)
+
+def _kind_filter(kinds):
+    if not kinds:
+        return ""
+    codes = ", ".join(str(KINDS[kind]) for kind in kinds)
+    return f" AND rowid % 4 IN ({codes})"
+
+def search(connection, query, kinds=None, limit=20):
+    """Ranked exact/prefix matches as (kind, id, score) tuples, best first."""
+    expression = _match_expression(query)
+    if not expression:
+        return []
+    rows = connection.execute(
+        text(
+            "SELECT rowid, bm25(search_index, 10.0, 1.0) AS score FROM search_index "
+            f"WHERE search_index MATCH :expression{_kind_filter(kinds)} ORDER BY score LIMIT :limit"
+        ),
+        {"expression": expression, "limit": limit},
+    )
+    return [(KIND_NAMES[rowid % 4], rowid // 4, score) for rowid, score in rows]
+
+def _distance(a, b):
+    """Edit-distance-like dissimilarity in [0, 1]; 0 means identical."""
+    return 1.0 - SequenceMatcher(None, a, b).ratio()
+
+def fuzzy_search(connection, query, kinds=None, limit=20, max_distance=0.34, candidates=200):
+    """Names close to `query` despite misspellings, as (kind, id, distance) tuples.
+
+    The trigram index narrows a large table down to the `candidates` names
+    sharing the most trigrams with the query; only those are compared with
+    the query in Python.
+    """
+    term = query.strip().lower()
+    trigrams = {term[i:i + 3] for i in range(len(term) - 2)}
+    trigrams = [t for t in trigrams if '"' not in t]
+    kinds = [kind for kind in (kinds or KINDS) if kind != 'appointment']
+    if not trigrams or not kinds:
+        return []
+    rows = connection.execute(
+        text(
+            "SELECT rowid, name FROM search_trigrams "
+            f"WHERE search_trigrams MATCH :expression{_kind_filter(kinds)} ORDER BY rank LIMIT :candidates"
+        ),
+        {"expression": " OR ".join(f'"{t}"' for t in trigrams), "candidates": candidates},
+    )
+    matches = []
+    for rowid, name in rows:
+        name = name.lower()
+        distance = min([_distance(term, name)] + [_distance(term, word) for word in name.split()])
+        if distance <= max_distance:
+            matches.append((KIND_NAMES[rowid % 4], rowid // 4, distance))
+    matches.sort(key=lambda match: match[2])
+    return matches[:limit]
@@ -0,0 +1,262 @@
+import random
+from datetime import date, time, timedelta
+from sqlalchemy import func, select, text
+from .models import Client, Veterinarian, Specialization, Animal, Appointment, Prescription, veterinarian_specialization
+from .search import create_search_index, drop_search_index, rebuild_search_index
+from .stats import create_stats_triggers, drop_stats_triggers, has_stats, rebuild_stats
+from .reminders import backfill_reminders, create_reminder_triggers, drop_reminder_triggers, has_reminders
+from .changes import create_change_triggers, drop_change_triggers, has_change_log, last_rowids, log_rows
+
+# Reproducible synthetic data: the same `seed` and `appointments` always
+# produce the same rows. Every other table is sized from the appointment
+# count, roughly as in a busy clinic.
+
+FIRST_NAMES = ['Alice', 'Brian', 'Chloe', 'David', 'Emma', 'Felix', 'Grace', 'Hassan', 'Ines', 'James',
+               'Kofi', 'Laura', 'Mohamed', 'Nina', 'Omar', 'Priya', 'Quinn', 'Rosa', 'Sam', 'Wanjiru']
+LAST_NAMES = ['Smith', 'Otieno', 'Garcia', 'Chen', 'Kamau', 'Muller', 'Okafor', 'Rossi', 'Kim', 'Patel',
+              'Brown', 'Njoroge', 'Silva', 'Novak', 'Haddad', 'Jensen']
+PET_NAMES = ['Bella', 'Max', 'Luna', 'Charlie', 'Simba', 'Coco', 'Rocky', 'Milo', 'Daisy', 'Scooby',
+             'Nala', 'Oscar', 'Pepper', 'Zuri', 'Toby', 'Kiwi']
+SPECIES_BREEDS = {
+    'dog': ['Labrador', 'German Shepherd', 'Beagle', 'Poodle', None],
+    'cat': ['Siamese', 'Persian', 'Maine Coon', None],
+    'rabbit': ['Lop', 'Rex', None],
+    'bird': ['Parrot', 'Canary', None],
+    'horse': ['Arabian', 'Thoroughbred'],
+}
+SPECIALIZATIONS = ['General Practice', 'Surgery', 'Dentistry', 'Dermatology', 'Cardiology', 'Oncology',
+                   'Ophthalmology', 'Exotics', 'Equine', 'Emergency', 'Radiology', 'Nutrition']
+REASONS = ['Annual checkup', 'Vaccination', 'Dental cleaning', 'Skin rash', 'Limping', 'Vomiting',
+           'Ear infection', 'Spay/neuter', 'Follow-up visit', 'Weight loss', 'Eye discharge', 'X-ray']
+MEDICATIONS = [('Amoxicillin', '15 mg/kg twice daily'), ('Carprofen', '2.2 mg/kg twice daily'),
+               ('Meloxicam', '0.1 mg/kg once daily'), ('Prednisolone', '1 mg/kg once daily'),
+               ('Metronidazole', '15 mg/kg twice daily'), ('Gabapentin', '10 mg/kg twice daily'),
+               ('Apoquel', '0.5 mg/kg twice daily'), ('Furosemide', '2 mg/kg twice daily')]
+# Typical adult weights in kg.
+SPECIES_WEIGHTS = {'dog': (5, 45), 'cat': (3, 6.5), 'rabbit': (1, 5), 'bird': (0.05, 1.2), 'horse': (350, 600)}
+
+OPENING_HOUR = 8
+SLOTS_PER_DAY = 20  # half-hour slots from 08:00 to 18:00
+
+def counts_for(appointments):
+    """Row counts for each table given the number of appointments."""
+    clients = max(10, appointments // 10)
+    return {
+        'specializations': len(SPECIALIZATIONS),
+        # About two years of bookings per vet, whatever the scale.
+        'veterinarians': max(5, appointments // 10000),
+        'clients': clients,
+        'animals': clients * 3 // 2,
+        'appointments': appointments,
+        'prescriptions': appointments // 2,
+    }
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _next_id(connection, table):
+    highest = connection.execute(select(func.max(table.c.id))).scalar() or 0
+    if table.dialect_options['sqlite']['autoincrement'] and connection.dialect.name == 'sqlite':
+        # IDs up to the sequence may belong to archived rows.
+        used = connection.execute(text("SELECT seq FROM sqlite_sequence WHERE name = :name"), {'name': table.name})
+        highest = max(highest, used.scalar() or 0)
+    return highest + 1
+
+def _person(rng):
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+
+class Seeder:
+    """Generates rows for every table and bulk-inserts them in chunks.
+
+    New rows get IDs after the current maximum of each table, so seeding an
+    existing database adds to it rather than failing on duplicate keys.
+    """
+
+    def __init__(self, connection, appointments=1000, seed=0, start_date=date(2020, 1, 1), chunk_size=20000):
+        self.connection = connection
+        self.counts = counts_for(appointments)
+        self.rng = random.Random(seed)
+        self.start_date = start_date
+        self.chunk_size = chunk_size
+        self.days = 1  # days covered by the generated appointments
+
+    def insert(self, table, rows):
+        count = 0
+        for chunk in _chunks(rows, self.chunk_size):
+            self.connection.execute(table.insert(), chunk)
+            count += len(chunk)
+        return count
+
+    def specializations(self, first_id):
+        existing = set(self.connection.execute(select(Specialization.name)).scalars())
+        return [{'id': first_id + i, 'name': name}
+                for i, name in enumerate(name for name in SPECIALIZATIONS if name not in existing)]
+
+    def veterinarians(self, first_id):
+        for i in range(self.counts['veterinarians']):
+            yield {'id': first_id + i, 'name': f"Dr. {_person(self.rng)}"}
+
+    def veterinarian_specializations(self, vet_ids, spec_ids):
+        for vet_id in vet_ids:
+            for spec_id in self.rng.sample(spec_ids, k=min(len(spec_ids), self.rng.randint(1, 3))):
+                yield {'veterinarian_id': vet_id, 'specialization_id': spec_id}
+
+    def clients(self, first_id):
+        for i in range(self.counts['clients']):
+            id = first_id + i
+            name = _person(self.rng)
+            yield {
+                'id': id,
+                'name': name,
+                'email': f"{name.lower().replace(' ', '.')}.{id}@example.com",
+                'phone': f"+2547{id:08d}",
+            }
+
+    def animals(self, first_id, client_ids):
+        species = list(SPECIES_BREEDS)
+        for i in range(self.counts['animals']):
+            kind = self.rng.choices(species, weights=[50, 35, 7, 6, 2])[0]
+            yield {
+                'id': first_id + i,
+                'name': self.rng.choice(PET_NAMES),
+                'species': kind,
+                'breed': self.rng.choice(SPECIES_BREEDS[kind]),
+                'age': self.rng.randint(0, 18),
+                'weight': round(self.rng.uniform(*SPECIES_WEIGHTS[kind]), 2),
+                # The first len(client_ids) animals give every client one pet.
+                'owner_id': client_ids[i] if i < len(client_ids) else self.rng.choice(client_ids),
+            }
+
+    def appointments(self, first_id, vet_ids, animal_owners):
+        # Each vet fills their diary slot by slot, leaving about a third of
+        # the slots free, so bookings never overlap.
+        slots = [0] * len(vet_ids)
+        for i in range(self.counts['appointments']):
+            vet = i % len(vet_ids)
+            slots[vet] += 1 + (self.rng.random() < 0.3)
+            day, slot = divmod(slots[vet], SLOTS_PER_DAY)
+            self.days = max(self.days, day + 1)
+            start = OPENING_HOUR * 60 + slot * 30
+            animal_id, owner_id = self.rng.choice(animal_owners)
+            yield {
+                'id': first_id + i,
+                'date': self.start_date + timedelta(days=day),
+                'start_time': time(start // 60, start % 60),
+                'end_time': time((start + 30) // 60, (start + 30) % 60),
+                'reason': self.rng.choice(REASONS),
+                'client_id': owner_id,
+                'animal_id': animal_id,
+                'veterinarian_id': vet_ids[vet],
+            }
+
+    def prescriptions(self, first_id, animal_ids):
+        for i in range(self.counts['prescriptions']):
+            medication, dosage = self.rng.choice(MEDICATIONS)
+            yield {
+                'id': first_id + i,
+                'medication': medication,
+                'dosage': dosage,
+                'date': self.start_date + timedelta(days=self.rng.randrange(self.days)),
+                'animal_id': self.rng.choice(animal_ids),
+            }
+
+    def run(self):
+        """Insert every table in dependency order; returns rows inserted per table."""
+        connection = self.connection
+        tables = {model.__tablename__: model.__table__ for model in
+                  (Specialization, Veterinarian, Client, Animal, Appointment, Prescription)}
+        first = {name: _next_id(connection, table) for name, table in tables.items()}
+        inserted = {}
+
+        specializations = self.specializations(first['specializations'])
+        inserted['specializations'] = self.insert(tables['specializations'], specializations)
+        spec_ids = list(connection.execute(select(Specialization.id)).scalars())
+
+        vet_ids = list(range(first['veterinarians'], first['veterinarians'] + self.counts['veterinarians']))
+        inserted['veterinarians'] = self.insert(tables['veterinarians'], self.veterinarians(first['veterinarians']))
+        inserted['veterinarian_specialization'] = self.insert(
+            veterinarian_specialization, self.veterinarian_specializations(vet_ids, spec_ids))
+
+        client_ids = list(range(first['clients'], first['clients'] + self.counts['clients']))
+        inserted['clients'] = self.insert(tables['clients'], self.clients(first['clients']))
+
+        # Owners are kept alongside animal IDs so each appointment's client
+        # owns its animal.
+        animal_owners = []
+        def animals():
+            for row in self.animals(first['animals'], client_ids):
+                animal_owners.append((row['id'], row['owner_id']))
+                yield row
+        inserted['animals'] = self.insert(tables['animals'], animals())
+        animal_ids = [id for id, _ in animal_owners]
+
+        inserted['appointments'] = self.insert(
+            tables['appointments'], self.appointments(first['appointments'], vet_ids, animal_owners))
+        inserted['prescriptions'] = self.insert(tables['prescriptions'], self.prescriptions(first['prescriptions'], animal_ids))
+        return inserted
+
+def _has_search_index(connection):
+    return connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'search_index'")
+    ).first() is not None
+
+def seed_database(engine, appointments=1000, seed=0, start_date=date(2020, 1, 1), chunk_size=20000):
+    """Fill the database with synthetic rows in one transaction.
+
+    Per-row search index, summary, reminder and change log triggers are
+    dropped while inserting and each is caught up in one pass at the end,
+    which is much faster for large runs.
+    Foreign key checks are skipped too: the generated rows only reference
+    rows generated before them.
+    """
+    sqlite = engine.dialect.name == 'sqlite'
+    with engine.connect() as connection:
+        if sqlite:
+            # Only takes effect outside a transaction.
+            connection.exec_driver_sql("PRAGMA foreign_keys=OFF")
+            connection.commit()
+        try:
+            with connection.begin():
+                # pysqlite only opens a transaction itself before DML, and
+                # would commit the drops below on their own, leaving the
+                # database without its triggers if seeding then failed.
+                if sqlite and not connection.connection.driver_connection.in_transaction:
+                    connection.exec_driver_sql("BEGIN IMMEDIATE")
+                search_index = sqlite and _has_search_index(connection)
+                stats = sqlite and has_stats(connection)
+                reminders = sqlite and has_reminders(connection)
+                changes = sqlite and has_change_log(connection)
+                if search_index:
+                    drop_search_index(connection)
+                if stats:
+                    drop_stats_triggers(connection)
+                if reminders:
+                    drop_reminder_triggers(connection)
+                if changes:
+                    logged = last_rowids(connection)
+                    drop_change_triggers(connection)
+                inserted = Seeder(connection, appointments, seed, start_date, chunk_size).run()
+                if search_index:
+                    create_search_index(connection)
+                    rebuild_search_index(connection)
+                if stats:
+                    create_stats_triggers(connection)
+                    rebuild_stats(connection)
+                if reminders:
+                    create_reminder_triggers(connection)
+                    backfill_reminders(connection)
+                if changes:
+                    create_change_triggers(connection)
+                    log_rows(connection, after=logged)
+        finally:
+            if sqlite:
+                connection.exec_driver_sql("PRAGMA foreign_keys=ON")
+                connection.commit()
+    return inserted
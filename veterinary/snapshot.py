@@ -0,0 +1,349 @@
+import json
+import os
+from collections import Counter
+from datetime import date, timedelta
+import numpy as np
+from sqlalchemy import Integer, cast, func, select
+from .archive import source_for, tables_for
+from .models import Animal, Appointment, Prescription
+
+# A read-only columnar copy of the appointments, prescriptions and animals
+# tables for analytics, archived appointments and prescriptions included. Each column is a NumPy array stored in its own file
+# and memory-mapped on load, about 30 bytes per appointment instead of the
+# kilobytes an ORM object takes. Strings with few distinct values (reason,
+# medication, species) are dictionary-encoded as int32 codes. Dates are days
+# since 1970-01-01 and times are minutes since midnight; NULL is -1, or NaN
+# for floats.
+#
+# refresh_snapshot() appends only the rows with an ID above the snapshot's
+# maximum. If rows were deleted it rebuilds the table instead (archiving
+# keeps a row's ID, so it doesn't count); edits to existing rows are only
+# picked up by a rebuild.
+
+NULL = -1
+FORMAT_VERSION = 1
+EPOCH = date(1970, 1, 1)
+
+def _days(column):
+    return func.coalesce(cast(func.julianday(column) - 2440587.5, Integer), NULL)
+
+def _minutes(column):
+    return func.coalesce(
+        cast(func.substr(column, 1, 2), Integer) * 60 + cast(func.substr(column, 4, 2), Integer), NULL)
+
+def _int(column):
+    return func.coalesce(column, NULL)
+
+# table -> (model, [(column name, kind, SQL conversion or None)]). Kinds:
+# 'int', 'date' and 'time' are int32/int32/int16, 'float' is float32,
+# 'category' is an int32 code into the column's dictionary.
+TABLES = {
+    'animals': (Animal, [
+        ('id', 'int', None),
+        ('species', 'category', None),
+        ('age', 'int', _int),
+        ('weight', 'float', None),
+        ('owner_id', 'int', _int),
+    ]),
+    'appointments': (Appointment, [
+        ('id', 'int', None),
+        ('date', 'date', _days),
+        ('start_time', 'time', _minutes),
+        ('end_time', 'time', _minutes),
+        ('reason', 'category', None),
+        ('client_id', 'int', _int),
+        ('animal_id', 'int', _int),
+        ('veterinarian_id', 'int', _int),
+    ]),
+    'prescriptions': (Prescription, [
+        ('id', 'int', None),
+        ('date', 'date', _days),
+        ('medication', 'category', None),
+        ('animal_id', 'int', _int),
+    ]),
+}
+
+def _source(connection, name):
+    """The table's rows to snapshot: appointments and prescriptions include the archive tables."""
+    if name == 'animals':
+        return Animal.__table__
+    return source_for(connection, name)
+
+DTYPES = {'int': np.int32, 'date': np.int32, 'time': np.int16, 'float': np.float32, 'category': np.int32}
+
+def default_directory(url):
+    """The snapshot directory for a database: next to a SQLite file, else ./snapshot."""
+    if url.startswith('sqlite:///') and url != 'sqlite://':
+        return url[len('sqlite:///'):] + '.snapshot'
+    return 'snapshot'
+
+def to_day(value):
+    """The snapshot's encoding of a date."""
+    return (value - EPOCH).days
+
+def from_day(day):
+    return EPOCH + timedelta(days=int(day))
+
+class TableSnapshot:
+    """The columns of one table: `columns[name]` is an array, `dictionaries[name]` a category's values."""
+
+    def __init__(self, name, rows, max_id, columns, dictionaries):
+        self.name = name
+        self.rows = rows
+        self.max_id = max_id
+        self.columns = columns
+        self.dictionaries = dictionaries
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __len__(self):
+        return self.rows
+
+    def code(self, column, value):
+        """The code of `value` in a category column, or None if it never occurs."""
+        try:
+            return self.dictionaries[column].index(value)
+        except ValueError:
+            return None
+
+    def nbytes(self):
+        return sum(array.nbytes for array in self.columns.values())
+
+class Snapshot:
+    def __init__(self, directory, tables):
+        self.directory = directory
+        self.tables = tables
+
+    def __getitem__(self, name):
+        return self.tables[name]
+
+def _column_path(directory, table, column):
+    return os.path.join(directory, f"{table}.{column}.bin")
+
+def _meta_path(directory):
+    return os.path.join(directory, 'meta.json')
+
+def _read_meta(directory):
+    try:
+        with open(_meta_path(directory)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _write_meta(directory, meta):
+    # Written last, after the column files, and replaced atomically: bytes
+    # appended to a column file beyond the row count it records are ignored
+    # and truncated by the next refresh.
+    path = _meta_path(directory)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(meta, f)
+    os.replace(path + '.tmp', path)
+
+def load_snapshot(directory):
+    """Memory-map a snapshot written by refresh_snapshot(); None if there isn't one."""
+    meta = _read_meta(directory)
+    if meta is None or meta.get('version') != FORMAT_VERSION:
+        return None
+    tables = {}
+    for name, table in meta['tables'].items():
+        columns = {}
+        for column, kind in table['columns'].items():
+            dtype = DTYPES[kind]
+            if table['rows']:
+                columns[column] = np.memmap(_column_path(directory, name, column), dtype=dtype, mode='r', shape=(table['rows'],))
+            else:
+                columns[column] = np.empty(0, dtype=dtype)
+        tables[name] = TableSnapshot(name, table['rows'], table['max_id'], columns, table['dictionaries'])
+    return Snapshot(directory, tables)
+
+def _encode(values, dictionary, index):
+    codes = []
+    for value in values:
+        code = index.get(value)
+        if code is None:
+            if value is None:
+                code = NULL
+            else:
+                code = index[value] = len(dictionary)
+                dictionary.append(value)
+        codes.append(code)
+    return codes
+
+def _append_rows(connection, directory, name, table, source, batch_size):
+    _, columns = TABLES[name]
+    dictionaries = table['dictionaries']
+    indexes = {column: {value: code for code, value in enumerate(values)} for column, values in dictionaries.items()}
+    query = (select(*(convert(source.c[column]) if convert else source.c[column] for column, _, convert in columns))
+             .where(source.c.id > table['max_id']).order_by(source.c.id))
+    files = {column: open(_column_path(directory, name, column), 'ab') for column, _, _ in columns}
+    added = 0
+    try:
+        result = connection.execution_options(yield_per=batch_size).execute(query)
+        for batch in result.partitions():
+            for (column, kind, _), values in zip(columns, zip(*batch)):
+                if kind == 'category':
+                    values = _encode(values, dictionaries[column], indexes[column])
+                files[column].write(np.array(values, dtype=DTYPES[kind]).tobytes())
+            added += len(batch)
+            table['max_id'] = batch[-1][0]
+    finally:
+        for f in files.values():
+            f.close()
+    table['rows'] += added
+    return added
+
+def _empty_table(name):
+    _, columns = TABLES[name]
+    return {
+        'rows': 0, 'max_id': 0,
+        'columns': {column: kind for column, kind, _ in columns},
+        'dictionaries': {column: [] for column, kind, _ in columns if kind == 'category'},
+    }
+
+def refresh_snapshot(engine, directory=None, rebuild=False, batch_size=50000):
+    """Bring the snapshot in `directory` up to date with the database.
+
+    Returns {table: (rows added, rebuilt)}.
+    """
+    url = engine.url.render_as_string(hide_password=True)
+    directory = directory or default_directory(url)
+    os.makedirs(directory, exist_ok=True)
+    meta = _read_meta(directory)
+    if rebuild or meta is None or meta.get('version') != FORMAT_VERSION or meta.get('database') != url:
+        meta = {'version': FORMAT_VERSION, 'database': url, 'tables': {}}
+    changes = {}
+    with engine.connect() as connection:
+        for name in TABLES:
+            table = meta['tables'].get(name)
+            source = _source(connection, name)
+            # Fewer rows up to max_id than the snapshot holds means some were
+            # deleted; the snapshot can't drop rows, so start this table again.
+            if table is not None and table['rows'] != connection.execute(
+                    select(func.count()).select_from(source).where(source.c.id <= table['max_id'])).scalar():
+                table = None
+            rebuilt = table is None
+            if rebuilt:
+                table = meta['tables'][name] = _empty_table(name)
+            for column in table['columns']:
+                path = _column_path(directory, name, column)
+                with open(path, 'ab') as f:
+                    f.truncate(table['rows'] * np.dtype(DTYPES[table['columns'][column]]).itemsize)
+            changes[name] = (_append_rows(connection, directory, name, table, source, batch_size), rebuilt)
+    _write_meta(directory, meta)
+    return changes
+
+# Vectorized queries.
+
+def date_mask(table, start=None, end=None):
+    """A boolean mask of the rows dated in [start, end); undated rows are excluded."""
+    days = table['date']
+    mask = days != NULL
+    if start is not None:
+        mask &= days >= to_day(start)
+    if end is not None:
+        mask &= days < to_day(end)
+    return mask
+
+def count_codes(codes, values, top=None):
+    """{value: count} for an array of dictionary codes, most common first."""
+    codes = codes[codes != NULL]
+    counts = np.bincount(codes, minlength=len(values))
+    order = np.argsort(-counts, kind='stable')
+    if top:
+        order = order[:top]
+    return {values[code]: int(counts[code]) for code in order if counts[code]}
+
+def count_ids(ids, top=None):
+    """{id: count} for an array of IDs, most common first."""
+    ids = ids[ids != NULL]
+    if not len(ids):
+        return {}
+    counts = np.bincount(ids)
+    order = np.argsort(-counts, kind='stable')
+    if top:
+        order = order[:top]
+    return {int(id): int(counts[id]) for id in order if counts[id]}
+
+def appointment_species(snapshot):
+    """The species code of each appointment's animal (NULL if unknown)."""
+    animals, appointments = snapshot['animals'], snapshot['appointments']
+    lookup = np.full(max(animals.max_id, int(appointments['animal_id'].max(initial=0))) + 1, NULL, dtype=np.int32)
+    lookup[animals['id']] = animals['species']
+    animal_ids = np.asarray(appointments['animal_id'])
+    return np.where(animal_ids == NULL, NULL, lookup[np.maximum(animal_ids, 0)])
+
+def summarize(snapshot, start=None, end=None, top=10):
+    """Appointment and prescription counts in [start, end), grouped several ways."""
+    appointments, prescriptions = snapshot['appointments'], snapshot['prescriptions']
+    in_range = date_mask(appointments, start, end)
+    days = np.asarray(appointments['date'])[in_range]
+    months = Counter()
+    if len(days):
+        # Group by month through the distinct days, which are few.
+        unique_days, counts = np.unique(days, return_counts=True)
+        for day, count in zip(unique_days, counts):
+            months[from_day(day).strftime('%Y-%m')] += int(count)
+    return {
+        'appointments': int(in_range.sum()),
+        'appointments_by_month': dict(sorted(months.items())),
+        'appointments_by_reason': count_codes(np.asarray(appointments['reason'])[in_range],
+                                              appointments.dictionaries['reason'], top),
+        'appointments_by_species': count_codes(appointment_species(snapshot)[in_range],
+                                               snapshot['animals'].dictionaries['species'], top),
+        'appointments_by_veterinarian': count_ids(np.asarray(appointments['veterinarian_id'])[in_range], top),
+        'prescriptions_by_medication': count_codes(
+            np.asarray(prescriptions['medication'])[date_mask(prescriptions, start, end)],
+            prescriptions.dictionaries['medication'], top),
+    }
+
+def summarize_with_orm(session, start=None, end=None, top=10):
+    """summarize() the slow way, by iterating ORM objects (and archived rows); for comparison."""
+    from sqlalchemy.orm import joinedload
+    reasons, species, vets, months, medications = Counter(), Counter(), Counter(), Counter(), Counter()
+    total = 0
+
+    def count_appointment(day, reason, animal_species, veterinarian_id):
+        nonlocal total
+        total += 1
+        months[day.strftime('%Y-%m')] += 1
+        reasons[reason] += 1
+        if animal_species is not None:
+            species[animal_species] += 1
+        if veterinarian_id is not None:
+            vets[veterinarian_id] += 1
+
+    def in_range(query, column):
+        if start is not None:
+            query = query.filter(column >= start)
+        if end is not None:
+            query = query.filter(column < end)
+        return query
+
+    connection = session.connection()
+    query = in_range(session.query(Appointment).options(joinedload(Appointment.animal)), Appointment.date)
+    for appointment in query.yield_per(1000):
+        count_appointment(appointment.date, appointment.reason,
+                          appointment.animal.species if appointment.animal is not None else None,
+                          appointment.veterinarian_id)
+    # Archive tables aren't mapped; their rows are read one by one too.
+    for table in tables_for(connection, 'appointments', start, end)[1:]:
+        query = in_range(session.query(table.c.date, table.c.reason, Animal.species, table.c.veterinarian_id)
+                         .outerjoin(Animal, Animal.id == table.c.animal_id), table.c.date)
+        for row in query.yield_per(1000):
+            count_appointment(*row)
+    query = in_range(session.query(Prescription).filter(Prescription.date.is_not(None)), Prescription.date)
+    for prescription in query.yield_per(1000):
+        medications[prescription.medication] += 1
+    for table in tables_for(connection, 'prescriptions', start, end)[1:]:
+        for (medication,) in in_range(session.query(table.c.medication).filter(table.c.date.is_not(None)),
+                                      table.c.date).yield_per(1000):
+            medications[medication] += 1
+    return {
+        'appointments': total,
+        'appointments_by_month': dict(sorted(months.items())),
+        'appointments_by_reason': dict(reasons.most_common(top)),
+        'appointments_by_species': dict(species.most_common(top)),
+        'appointments_by_veterinarian': dict(vets.most_common(top)),
+        'prescriptions_by_medication': dict(medications.most_common(top)),
+    }
@@ -0,0 +1,224 @@
+from sqlalchemy import Column, Integer, MetaData, String, Table, PrimaryKeyConstraint, func, inspect, select, text
+from .models import Animal, Veterinarian, Specialization, veterinarian_specialization
+
+# Clinic statistics. Appointment and prescription counts are read from two
+# summary tables with one row per day (per vet, per medication), kept up to
+# date by SQLite triggers on the live and archive tables, so a report costs
+# O(days) however many appointments there are:
+#
+#   appointment_daily_stats   day, veterinarian_id (0: none), appointments, minutes booked
+#   prescription_daily_stats  day ('' when undated), medication, prescriptions
+
+stats_metadata = MetaData()
+
+appointment_daily_stats = Table(
+    'appointment_daily_stats', stats_metadata,
+    Column('day', String, nullable=False),
+    Column('veterinarian_id', Integer, nullable=False),
+    Column('appointments', Integer, nullable=False),
+    Column('minutes', Integer, nullable=False),
+    PrimaryKeyConstraint('day', 'veterinarian_id'),
+)
+
+prescription_daily_stats = Table(
+    'prescription_daily_stats', stats_metadata,
+    Column('day', String, nullable=False),
+    Column('medication', String, nullable=False),
+    Column('prescriptions', Integer, nullable=False),
+    PrimaryKeyConstraint('day', 'medication'),
+)
+
+STATS_TABLES = tuple(stats_metadata.tables)
+
+WORKING_MINUTES_PER_DAY = 10 * 60  # 08:00 to 18:00
+
+def _appointment_key(row):
+    return f"{row}.date", f"coalesce({row}.veterinarian_id, 0)"
+
+def _minutes(row):
+    return f"coalesce(round((julianday({row}.end_time) - julianday({row}.start_time)) * 1440), 0)"
+
+def _appointment_statements(row, sign):
+    day, vet = _appointment_key(row)
+    if sign > 0:
+        return (
+            f"INSERT INTO appointment_daily_stats (day, veterinarian_id, appointments, minutes) "
+            f"VALUES ({day}, {vet}, 1, {_minutes(row)}) "
+            f"ON CONFLICT (day, veterinarian_id) DO UPDATE SET "
+            f"appointments = appointments + 1, minutes = minutes + excluded.minutes;"
+        )
+    return (
+        f"UPDATE appointment_daily_stats SET appointments = appointments - 1, minutes = minutes - {_minutes(row)} "
+        f"WHERE day = {day} AND veterinarian_id = {vet}; "
+        f"DELETE FROM appointment_daily_stats WHERE day = {day} AND veterinarian_id = {vet} AND appointments <= 0;"
+    )
+
+def _prescription_statements(row, sign):
+    day = f"coalesce({row}.date, '')"
+    if sign > 0:
+        return (
+            f"INSERT INTO prescription_daily_stats (day, medication, prescriptions) "
+            f"VALUES ({day}, {row}.medication, 1) "
+            f"ON CONFLICT (day, medication) DO UPDATE SET prescriptions = prescriptions + 1;"
+        )
+    return (
+        f"UPDATE prescription_daily_stats SET prescriptions = prescriptions - 1 "
+        f"WHERE day = {day} AND medication = {row}.medication; "
+        f"DELETE FROM prescription_daily_stats WHERE day = {day} AND medication = {row}.medication AND prescriptions <= 0;"
+    )
+
+_STATEMENTS = {'appointments': _appointment_statements, 'prescriptions': _prescription_statements}
+_UPDATE_COLUMNS = {'appointments': "date, veterinarian_id, start_time, end_time", 'prescriptions': "date, medication"}
+
+def trigger_ddl(table_name, kind):
+    """Statements creating the triggers that keep the summaries in step with a table.
+
+    `kind` is 'appointments' or 'prescriptions'; `table_name` is the live
+    table or one of its archive tables.
+    """
+    statements = _STATEMENTS[kind]
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {table_name}_stats_insert AFTER INSERT ON {table_name} "
+        f"BEGIN {statements('new', 1)} END",
+        f"CREATE TRIGGER IF NOT EXISTS {table_name}_stats_delete AFTER DELETE ON {table_name} "
+        f"BEGIN {statements('old', -1)} END",
+        f"CREATE TRIGGER IF NOT EXISTS {table_name}_stats_update AFTER UPDATE OF {_UPDATE_COLUMNS[kind]} ON {table_name} "
+        f"BEGIN {statements('old', -1)} {statements('new', 1)} END",
+    ]
+
+def _source_tables(connection):
+    from .archive import ARCHIVED, archived_years, archive_table_name
+    for kind in ARCHIVED:
+        yield kind, kind
+        for year in archived_years(connection, kind):
+            yield archive_table_name(kind, year), kind
+
+def has_stats(connection):
+    return inspect(connection).has_table('appointment_daily_stats')
+
+def create_stats_triggers(connection, table_name=None, kind=None):
+    """Create the summary triggers on one table, or on every source table."""
+    tables = [(table_name, kind)] if table_name else list(_source_tables(connection))
+    for name, table_kind in tables:
+        for statement in trigger_ddl(name, table_kind):
+            connection.execute(text(statement))
+
+def drop_stats_triggers(connection):
+    for name, _ in _source_tables(connection):
+        for event in ('insert', 'delete', 'update'):
+            connection.execute(text(f"DROP TRIGGER IF EXISTS {name}_stats_{event}"))
+
+def create_stats(connection):
+    """Create the summary tables and triggers if missing (SQLite only)."""
+    stats_metadata.create_all(connection)
+    create_stats_triggers(connection)
+
+def drop_stats(connection):
+    drop_stats_triggers(connection)
+    stats_metadata.drop_all(connection)
+
+def add_to_stats(connection, table_name, kind, after=0):
+    """Count the rows of a source table past rowid `after` into the summaries with GROUP BY."""
+    if kind == 'appointments':
+        day, vet = _appointment_key('t')
+        connection.execute(text(
+            f"INSERT INTO appointment_daily_stats (day, veterinarian_id, appointments, minutes) "
+            f"SELECT {day}, {vet}, count(*), sum({_minutes('t')}) FROM {table_name} AS t WHERE t.rowid > :after GROUP BY 1, 2 "
+            f"ON CONFLICT (day, veterinarian_id) DO UPDATE SET "
+            f"appointments = appointments + excluded.appointments, minutes = minutes + excluded.minutes"
+        ), {'after': after})
+    else:
+        connection.execute(text(
+            f"INSERT INTO prescription_daily_stats (day, medication, prescriptions) "
+            f"SELECT coalesce(t.date, ''), t.medication, count(*) FROM {table_name} AS t WHERE t.rowid > :after GROUP BY 1, 2 "
+            f"ON CONFLICT (day, medication) DO UPDATE SET prescriptions = prescriptions + excluded.prescriptions"
+        ), {'after': after})
+
+def rebuild_stats(connection):
+    """Recompute both summaries from the live and archive tables with GROUP BY."""
+    connection.execute(appointment_daily_stats.delete())
+    connection.execute(prescription_daily_stats.delete())
+    for name, kind in _source_tables(connection):
+        add_to_stats(connection, name, kind)
+
+def _in_range(column, start, end):
+    conditions = []
+    if start is not None:
+        conditions.append(column >= start.isoformat())
+    if end is not None:
+        conditions.append(column < end.isoformat())
+    return conditions
+
+def clinic_stats(connection, start=None, end=None, top=10):
+    """Statistics for appointments and prescriptions dated in [start, end), as a dict."""
+    a, p = appointment_daily_stats, prescription_daily_stats
+    in_range = _in_range(a.c.day, start, end)
+
+    per_day = connection.execute(
+        select(a.c.day, func.sum(a.c.appointments)).where(*in_range).group_by(a.c.day).order_by(a.c.day)
+    ).all()
+    total = sum(count for _, count in per_day)
+
+    vet_names = dict(connection.execute(select(Veterinarian.id, Veterinarian.name)).all())
+    vets = []
+    for vet_id, appointments, minutes, days in connection.execute(
+        select(a.c.veterinarian_id, func.sum(a.c.appointments), func.sum(a.c.minutes), func.count())
+        .where(*in_range).group_by(a.c.veterinarian_id).order_by(func.sum(a.c.appointments).desc())
+    ):
+        vets.append({
+            'veterinarian_id': vet_id or None,
+            'name': vet_names.get(vet_id),
+            'appointments': appointments,
+            'minutes_booked': minutes,
+            'days_worked': days,
+            # Share of opening hours booked on the days the vet had appointments.
+            'utilization': round(minutes / (days * WORKING_MINUTES_PER_DAY), 3) if vet_id else None,
+        })
+
+    per_vet = select(a.c.veterinarian_id, func.sum(a.c.appointments).label('appointments')) \
+        .where(*in_range).group_by(a.c.veterinarian_id).subquery()
+    vs = veterinarian_specialization
+    specializations = [
+        {'specialization': name, 'veterinarians': vet_count, 'appointments': appointments or 0}
+        for name, vet_count, appointments in connection.execute(
+            select(Specialization.name, func.count(vs.c.veterinarian_id), func.sum(per_vet.c.appointments))
+            .select_from(Specialization)
+            .outerjoin(vs, vs.c.specialization_id == Specialization.id)
+            .outerjoin(per_vet, per_vet.c.veterinarian_id == vs.c.veterinarian_id)
+            .group_by(Specialization.id)
+            .order_by(func.sum(per_vet.c.appointments).desc().nulls_last(), Specialization.name)
+        )
+    ]
+
+    species = [
+        {'species': name, 'animals': count}
+        for name, count in connection.execute(
+            select(Animal.species, func.count()).group_by(Animal.species).order_by(func.count().desc()).limit(top)
+        )
+    ]
+
+    medications = [
+        {'medication': name, 'prescriptions': count}
+        for name, count in connection.execute(
+            select(p.c.medication, func.sum(p.c.prescriptions))
+            .where(*_in_range(p.c.day, start, end))
+            .group_by(p.c.medication).order_by(func.sum(p.c.prescriptions).desc()).limit(top)
+        )
+    ]
+
+    busiest = max(per_day, key=lambda row: row[1], default=None)
+    return {
+        'from': start.isoformat() if start else None,
+        'to_exclusive': end.isoformat() if end else None,
+        'appointments': {
+            'total': total,
+            'days': len(per_day),
+            'average_per_day': round(total / len(per_day), 2) if per_day else 0,
+            'busiest_day': {'day': busiest[0], 'appointments': busiest[1]} if busiest else None,
+            'per_day': [{'day': day, 'appointments': count} for day, count in per_day],
+        },
+        'veterinarians': vets,
+        'specializations': specializations,
+        'top_species': species,
+        'top_medications': medications,
+    }
@@ -0,0 +1,75 @@
+import threading
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from .models import Veterinarian, Specialization, veterinarian_specialization
+
+class SpecializationIndex:
+    """In-memory map from specialization to the set of vets that hold it.
+
+    Loaded with two queries on first use and kept until invalidated; any
+    flush that adds, changes or deletes a Veterinarian or Specialization
+    invalidates it. Matching vets is then a set intersection with no
+    database work.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = None
+
+    def invalidate(self):
+        self._data = None
+
+    def _load(self, session):
+        spec_ids = {name: id for id, name in session.query(Specialization.id, Specialization.name)}
+        vets_by_spec = {id: set() for id in spec_ids.values()}
+        for vet_id, spec_id in session.query(veterinarian_specialization.c.veterinarian_id,
+                                             veterinarian_specialization.c.specialization_id):
+            vets_by_spec.setdefault(spec_id, set()).add(vet_id)
+        return spec_ids, {id: frozenset(vets) for id, vets in vets_by_spec.items()}
+
+    def data(self, session):
+        data = self._data
+        if data is None:
+            with self._lock:
+                data = self._data
+                if data is None:
+                    data = self._data = self._load(session)
+        return data
+
+    def specialization_id(self, session, specialization):
+        """Resolve a specialization given by ID or name; None if unknown."""
+        spec_ids, vets_by_spec = self.data(session)
+        if str(specialization).isdigit() and int(specialization) in vets_by_spec:
+            return int(specialization)
+        return spec_ids.get(specialization)
+
+    def vets_for(self, session, *specializations):
+        """IDs of vets holding every one of the given specializations."""
+        _, vets_by_spec = self.data(session)
+        result = None
+        for specialization in specializations:
+            spec_id = self.specialization_id(session, specialization)
+            vets = vets_by_spec.get(spec_id, frozenset())
+            result = vets if result is None else result & vets
+        return result or frozenset()
+
+specialization_index = SpecializationIndex()
+
+@event.listens_for(Session, "after_flush")
+def _invalidate_on_flush(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, (Veterinarian, Specialization)):
+            specialization_index.invalidate()
+            # Reloading before commit would see uncommitted rows; drop the
+            # index again if this transaction ends up rolled back.
+            session.info['specialization_index_dirty'] = True
+            return
+
+@event.listens_for(Session, "after_rollback")
+def _invalidate_on_rollback(session):
+    if session.info.pop('specialization_index_dirty', False):
+        specialization_index.invalidate()
+
+@event.listens_for(Session, "after_commit")
+def _clear_dirty_flag(session):
+    session.info.pop('specialization_index_dirty', None)